@@ -0,0 +1,59 @@
+"""
+基准测试的运行环境。
+
+不启动机器人, 只初始化 nonebot 配置并以独立包的形式导入 PCR 的服务模块,
+数据与资源目录指向临时目录, 不会改动仓库中的文件。
+"""
+
+import shutil
+import sys
+import tempfile
+import types
+from pathlib import Path
+from typing import Optional
+
+import nonebot
+
+ROOT = Path(__file__).resolve().parent.parent
+PCR_PATH = ROOT / "src" / "plugins" / "pcr"
+
+
+def prepare(resources: tuple[str, ...], workdir: Optional[Path] = None) -> Path:
+    """
+    复制所需的资源到工作目录, 未指定时新建临时目录, 返回工作目录。
+    """
+    if workdir is None:
+        workdir = Path(tempfile.mkdtemp(prefix="pcr_bench_"))
+    for name in resources:
+        shutil.copytree(
+            PCR_PATH / "resources" / name,
+            workdir / "resources" / name,
+            dirs_exist_ok=True,
+        )
+    return workdir
+
+
+def bootstrap(
+    resources: tuple[str, ...] = ("priconne/gadget", "sign"),
+    workdir: Optional[Path] = None,
+    **config,
+) -> Path:
+    """
+    初始化环境, 复制所需的资源到临时目录, 返回临时目录。
+    指定 workdir 时改用该目录, 例如 generate.py 生成的数据集。
+    config 会作为额外配置传给 nonebot。
+
+    之后可通过 `import pcr.services.xxx` 导入服务模块。
+    """
+    workdir = prepare(resources, workdir)
+    nonebot.init(
+        driver="~none",
+        pcr_data_path=workdir / "data",
+        pcr_resources_path=workdir / "resources",
+        **config,
+    )
+    # 跳过 pcr/__init__.py 中的插件加载, 只暴露包路径
+    pkg = types.ModuleType("pcr")
+    pkg.__path__ = [str(PCR_PATH)]  # type: ignore
+    sys.modules["pcr"] = pkg
+    return workdir
@@ -0,0 +1,172 @@
+"""
+基准测试的固定数据。
+
+生成角色花名册、档案、卡池、头像以及B站/gamewith日程表的原始文本,
+内容由固定种子生成, 每次运行完全相同, 不需要联网。
+"""
+
+import datetime
+import json
+import random
+import shutil
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+FIRST_ID = 1001
+"""第一个角色ID, 与 CharaDataService.is_npc 的可玩角色范围一致"""
+
+SYLLABLES = "佩可可萝凯露优衣真步镜华香织宫子美冬璃乃伊绪纺希望茜千歌栞初音"
+
+
+def chara_names(num: int, seed: int = 0) -> dict[str, list[str]]:
+    """
+    生成 num 个角色, 每个角色有一个正式名与两个别名。
+    """
+    rng = random.Random(seed)
+    names: dict[str, list[str]] = {}
+    used = set()
+    for i in range(num):
+        while True:
+            name = "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+            if name not in used:
+                break
+        used.add(name)
+        alias = [f"{name}(夏日)", f"{name[:2]}{i}"]
+        names[str(FIRST_ID + i)] = [name, *alias]
+    return names
+
+
+def chara_profiles(names: dict[str, list[str]]) -> dict[str, dict]:
+    return {
+        id_: {
+            "名字": n[0],
+            "公会": "美食殿堂",
+            "生日": f"{int(id_) % 12 + 1}月{int(id_) % 28 + 1}日",
+            "年龄": str(int(id_) % 10 + 12),
+            "身高": str(int(id_) % 30 + 140),
+            "体重": str(int(id_) % 20 + 38),
+            "血型": "ABO"[int(id_) % 3],
+            "种族": "人类",
+            "喜好": "料理",
+            "声优": "未知",
+        }
+        for id_, n in names.items()
+    }
+
+
+def local_pool(names: dict[str, list[str]]) -> dict[str, dict]:
+    formal = [n[0] for n in names.values()]
+    pool = {
+        "up_prob": 7,
+        "s3_prob": 25,
+        "s2_prob": 180,
+        "up": formal[:1],
+        "star3": formal[1 : len(formal) // 3],
+        "star2": formal[len(formal) // 3 : 2 * len(formal) // 3],
+        "star1": formal[2 * len(formal) // 3 :],
+    }
+    return {server: pool for server in ("BL", "TW", "JP", "MIX")}
+
+
+def write_icons(path: Path, ids: list[str], stars=(1, 3, 6)) -> None:
+    """
+    为每个角色的各星级生成 128x128 的纯色渐变头像。
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    gradient = np.linspace(0, 96, 128, dtype=np.uint8)[None, :, None]
+    for id_ in ids:
+        rng = np.random.default_rng(int(id_))
+        for star in stars:
+            base = rng.integers(64, 160, 3, dtype=np.uint8)
+            pixels = np.empty((128, 128, 4), dtype=np.uint8)
+            pixels[..., :3] = base + gradient
+            pixels[..., 3] = 255
+            Image.fromarray(pixels).save(path / f"icon_unit_{id_}{star}1.png")
+
+
+def write_data(workdir: Path, num_charas: int = 120) -> dict[str, list[str]]:
+    """
+    在数据与资源目录中写入固定数据, 返回花名册。
+    """
+    data_path = workdir / "data"
+    data_path.mkdir(parents=True, exist_ok=True)
+    names = chara_names(num_charas)
+    files = {
+        "chara_name": names,
+        "chara_profile": chara_profiles(names),
+        # 空数据会被视为缺失而联网更新, 放一个不存在的角色
+        "unavailable_chara": [FIRST_ID + num_charas],
+        "local_pool": local_pool(names),
+        "local_pool_ver": {"ver": "20240101"},
+    }
+    for key, value in files.items():
+        (data_path / f"{key}.json").write_text(
+            json.dumps(value, ensure_ascii=False), encoding="utf-8"
+        )
+    res_path = workdir / "resources"
+    write_icons(res_path / "priconne" / "icon", list(names))
+    # 日程表与运势的部分字体未随仓库提供, 用签到字体代替
+    for font in ("calendar/wqy-microhei.ttc", "portune/font/sakura.ttf"):
+        target = res_path / font
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(res_path / "sign" / "STHUPO.TTF", target)
+    return names
+
+
+def bilibili_calendar_js(today: datetime.date, events: int = 12) -> str:
+    """
+    与 static.biligame.com/pcr/gw/calendar.js 格式相同的日程表, 覆盖当月与下月。
+    """
+    rng = random.Random(1)
+    months = []
+    first = today.replace(day=1)
+    next_month = (first + datetime.timedelta(days=32)).replace(day=1)
+    spans = []
+    for i in range(events):
+        start = rng.randint(-10, 20)
+        spans.append((f"活动{i}", start, start + rng.randint(3, 14)))
+    for month_start in (first, next_month):
+        days = []
+        d = month_start
+        while d.month == month_start.month:
+            offset = (d - today).days
+            content = {"qdhd": "", "tdz": "", "tbhd": "", "jqhd": "", "jssr": ""}
+            for i, (name, start, end) in enumerate(spans):
+                if start <= offset <= end:
+                    key = ("qdhd", "tbhd", "jqhd", "tdz")[i % 4]
+                    content[key] += f'<div class="cl-t">{name}</div>'
+            if not any(content.values()):
+                content["tbhd"] = '<div class="cl-t">日常</div>'
+            body = ", ".join(f"{k}: '{v}'" for k, v in content.items())
+            days.append(f"'{d.day}': {{{body}}}")
+            d += datetime.timedelta(days=1)
+        months.append(
+            f"{{year: '{month_start.year}', month: '{month_start.month}', "
+            f"day: {{{', '.join(days)}}}}}"
+        )
+    return f"var data = [{', '.join(months)}];\nexport default data;\n"
+
+
+def gamewith_calendar_html(today: datetime.date, events: int = 40) -> str:
+    """
+    与 gamewith.jp/pricone-re/ 首页日程表格式相同的 HTML 片段。
+    """
+    rng = random.Random(2)
+    base = datetime.datetime.combine(today, datetime.time(5))
+    items = []
+    for i in range(events):
+        start = base + datetime.timedelta(days=rng.randint(-10, 10))
+        end = start + datetime.timedelta(days=rng.randint(1, 14), hours=-1)
+        data = {
+            "id": i,
+            "event_name": f"ノーマル{i}倍ダンジョン",
+            "start_time": int(start.timestamp()),
+            "end_time": int(end.timestamp()),
+            "color_id": rng.randint(1, 5),
+        }
+        attr = json.dumps(data, ensure_ascii=False)
+        items.append(f"<div class=\"_event\" data-calendar='{attr}'></div>")
+    return "<html><body>" + "\n".join(items) + "</body></html>"
@@ -0,0 +1,242 @@
+"""
+外部数据源的本地替身。
+
+在本机启动一个 HTTP 服务, 按原始域名与路径返回与上游格式相同的数据,
+并将 httpx 与 aiohttp 发出的请求改写到该服务, 使负载测试完全离线运行。
+"""
+
+import asyncio
+import datetime
+import json
+import random
+import threading
+from collections import Counter
+from io import BytesIO
+from typing import Any, Optional
+
+import aiohttp
+import httpx
+import numpy as np
+from aiohttp import web
+from PIL import Image
+
+from _fixtures import (
+    bilibili_calendar_js,
+    chara_profiles,
+    gamewith_calendar_html,
+    local_pool,
+)
+
+LOCAL_HOSTS = {"127.0.0.1", "localhost"}
+BACKGROUND_URL = "https://tva1.sinaimg.cn/large/sign_background.jpg"
+HITOKOTO = ("今天也要元气满满", "美食殿堂开张啦", "下次一定", "这就是羁绊的力量")
+
+
+def image_bytes(size: tuple[int, int], seed: int, format: str) -> bytes:
+    rng = np.random.default_rng(seed)
+    pixels = np.empty((size[1], size[0], 3), dtype=np.uint8)
+    pixels[...] = rng.integers(48, 200, 3, dtype=np.uint8)
+    pixels[..., 0] += np.linspace(0, 55, size[0], dtype=np.uint8)[None, :]
+    out = BytesIO()
+    Image.fromarray(pixels).save(out, format)
+    return out.getvalue()
+
+
+def calendar_events(today: datetime.date, time_format: str, name_key: str) -> list:
+    """
+    pcrbot 与 pcredivewiki 的日程表 JSON。
+    """
+    rng = random.Random(3)
+    base = datetime.datetime.combine(today, datetime.time(5))
+    events = []
+    for i in range(30):
+        start = base + datetime.timedelta(days=rng.randint(-10, 10))
+        end = start + datetime.timedelta(days=rng.randint(1, 14), hours=-1)
+        name = ("N2倍掉落活动", "公会战", "剧情活动", "戰隊競賽")[i % 4] + str(i)
+        events.append(
+            {
+                name_key: name,
+                "start_time": start.strftime(time_format),
+                "end_time": end.strftime(time_format),
+            }
+        )
+    return events
+
+
+class Upstream:
+    """
+    外部数据源替身, 以 /原域名/原路径 的形式提供全部上游接口。
+    """
+
+    def __init__(self, names: dict[str, list[str]], delay: float = 0) -> None:
+        self.names = names
+        self.delay = delay
+        """每次请求附加的延迟(秒), 用于模拟网络耗时"""
+        self.requests: Counter[str] = Counter()
+        """各域名的请求次数"""
+        self.loop: asyncio.AbstractEventLoop
+        self.thread: threading.Thread
+        self.port = 0
+        self.runner: Optional[web.AppRunner] = None
+        self.patched: list[tuple[Any, str, Any]] = []
+        self.images: dict[str, bytes] = {}
+
+    # ------------------------------------------------------------ 数据
+
+    def online_pool(self) -> dict:
+        # 上游卡池以角色基础ID表示
+        id_of = {n[0]: int(id_) for id_, n in self.names.items()}
+        return {
+            server: {
+                key: (
+                    [id_of[name] for name in value]
+                    if isinstance(value, list)
+                    else value
+                )
+                for key, value in pool.items()
+            }
+            for server, pool in local_pool(self.names).items()
+        }
+
+    def image(self, key: str, size: tuple[int, int], format: str) -> bytes:
+        if key not in self.images:
+            seed = sum(key.encode())
+            self.images[key] = image_bytes(size, seed, format)
+        return self.images[key]
+
+    def respond(self, host: str, path: str) -> web.Response:
+        today = datetime.date.today()
+        if host == "api.redive.lolikon.icu":
+            if path.endswith("default_gacha.json"):
+                return web.json_response(self.online_pool())
+            if path.endswith("gacha_ver.json"):
+                return web.json_response({"ver": "20240101"})
+        elif host == "ghproxy.com":
+            if path.endswith("chara_name.json"):
+                return web.json_response(self.names)
+            if path.endswith("chara_profile.json"):
+                return web.json_response(chara_profiles(self.names))
+            if path.endswith("unavailable_chara.json"):
+                return web.json_response([])
+        elif host == "redive.estertion.win":
+            name = path.rsplit("/", 1)[-1]
+            if path.startswith("/icon/unit/"):
+                body = self.image(path, (128, 128), "WEBP")
+                return web.Response(body=body, content_type="image/webp")
+            if path.startswith("/card/full/"):
+                body = self.image(path, (1024, 576), "WEBP")
+                return web.Response(body=body, content_type="image/webp")
+            return web.Response(status=404, text=f"{name} not found")
+        elif host == "static.biligame.com":
+            return web.Response(
+                text=bilibili_calendar_js(today), content_type="text/javascript"
+            )
+        elif host in ("pcrbot.github.io", "cdn.jsdelivr.net"):
+            return web.json_response(
+                calendar_events(today, "%Y/%m/%d %H:%M:%S", "name")
+            )
+        elif host == "pcredivewiki.tw":
+            return web.json_response(
+                calendar_events(today, "%Y/%m/%d %H:%M", "campaign_name")
+            )
+        elif host == "gamewith.jp":
+            return web.Response(
+                text=gamewith_calendar_html(today), content_type="text/html"
+            )
+        elif host == "dev.iw233.cn":
+            return web.Response(text=json.dumps({"pic": [BACKGROUND_URL]}))
+        elif host == "tva1.sinaimg.cn":
+            body = self.image(path, (928, 1133), "JPEG")
+            return web.Response(body=body, content_type="image/jpeg")
+        elif host == "v1.hitokoto.cn":
+            return web.Response(text=random.choice(HITOKOTO))
+        elif host.endswith("qlogo.cn"):
+            body = self.image(path, (100, 100), "PNG")
+            return web.Response(body=body, content_type="image/png")
+        return web.Response(status=404, text=f"unknown upstream {host}{path}")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        host = request.match_info["host"]
+        self.requests[host] += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.respond(host, "/" + request.match_info["path"])
+
+    # ------------------------------------------------------------ 服务
+
+    def rewrite(self, url: str) -> str:
+        """
+        将上游地址改写为替身地址, 本机地址保持不变。
+        """
+        parsed = httpx.URL(url)
+        if parsed.host in LOCAL_HOSTS:
+            return url
+        path = parsed.raw_path.decode("ascii")
+        return f"http://127.0.0.1:{self.port}/{parsed.host}{path}"
+
+    def patch(self, owner: Any, name: str, value: Any) -> None:
+        self.patched.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, value)
+
+    def install(self) -> None:
+        """
+        改写 httpx 与 aiohttp 的请求地址。
+        """
+        upstream = self
+        async_send = httpx.AsyncHTTPTransport.handle_async_request
+        sync_send = httpx.HTTPTransport.handle_request
+        aiohttp_request = aiohttp.ClientSession._request
+
+        async def handle_async_request(transport, request: httpx.Request):
+            request.url = httpx.URL(upstream.rewrite(str(request.url)))
+            return await async_send(transport, request)
+
+        def handle_request(transport, request: httpx.Request):
+            request.url = httpx.URL(upstream.rewrite(str(request.url)))
+            return sync_send(transport, request)
+
+        async def _request(session, method, str_or_url, **kwargs):
+            return await aiohttp_request(
+                session, method, upstream.rewrite(str(str_or_url)), **kwargs
+            )
+
+        self.patch(
+            httpx.AsyncHTTPTransport, "handle_async_request", handle_async_request
+        )
+        self.patch(httpx.HTTPTransport, "handle_request", handle_request)
+        self.patch(aiohttp.ClientSession, "_request", _request)
+
+    def uninstall(self) -> None:
+        for owner, name, value in reversed(self.patched):
+            setattr(owner, name, value)
+        self.patched.clear()
+
+    async def serve(self, started: threading.Event) -> None:
+        app = web.Application()
+        app.router.add_get("/{host}/{path:.*}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]  # type: ignore
+        started.set()
+
+    def start(self) -> None:
+        """
+        在独立线程的事件循环中启动服务, 机器人代码中的同步请求也能得到响应,
+        替身自身的开销也不会计入机器人事件循环的延迟。
+        """
+        started = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.serve(started), self.loop)
+        started.wait()
+        self.install()
+
+    def stop(self) -> None:
+        self.uninstall()
+        if self.runner is not None:
+            asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
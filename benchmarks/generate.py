@@ -0,0 +1,327 @@
+"""
+生成大规模的模拟数据集, 用于容量与负载测试。
+
+输出目录的结构与插件的数据目录/资源目录相同:
+
+    OUT/data        -> pcr_data_path
+    OUT/resources   -> pcr_resources_path
+
+用法:
+    python benchmarks/generate.py OUT [--users 100000] [--groups 2000] [--charas 1000]
+
+之后可将 PCR_DATA_PATH/PCR_RESOURCES_PATH 指向输出目录启动机器人,
+或通过 `python benchmarks/run.py --dataset OUT` 在该数据集上运行基准测试。
+"""
+
+import argparse
+import datetime
+import json
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+from PIL import Image
+
+from _bootstrap import PCR_PATH
+from _fixtures import FIRST_ID, chara_names, chara_profiles, write_icons
+
+SERVERS = ("BL", "TW", "JP", "MIX")
+CALENDAR_SERVERS = ("cn", "tw", "jp")
+GUESS_DBS = ("pcr_avatar_guess.db", "pcr_card_guess.db", "pcr_desc_guess.db")
+STATIC_RESOURCES = (
+    "priconne/gadget",
+    "sign/image",
+    "sign/STHUPO.TTF",
+    "portune",
+    "query",
+    "rank",
+)
+"""随仓库提供、服务启动所需的静态资源"""
+
+
+def write_json(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+def write_sqlite(path: Path, schema: str, insert: str, rows: Iterator[tuple]) -> int:
+    """
+    以与插件相同的表结构写入数据库, 返回写入的行数。
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute(schema)
+            cursor = conn.executemany(insert, rows)
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+class ScaleDataset:
+    """
+    按固定种子生成的模拟数据集。
+
+    群规模服从长尾分布, 少数大群占据大部分用户, 约两成用户同时在多个群中。
+    """
+
+    def __init__(
+        self,
+        out: Path,
+        users: int,
+        groups: int,
+        charas: int,
+        stamps: int,
+        cards_per_user: float,
+        seed: int,
+    ) -> None:
+        self.out = out
+        self.data_path = out / "data"
+        self.res_path = out / "resources"
+        self.users = users
+        self.groups = groups
+        self.charas = charas
+        self.stamps = stamps
+        self.cards_per_user = cards_per_user
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.gids = [str(100000000 + i * 7919) for i in range(groups)]
+        self.uids = [str(1000000000 + i * 104729) for i in range(users)]
+        self.members = self.make_members()
+        """(群号下标, 用户下标) 数组"""
+
+    def make_members(self) -> np.ndarray:
+        weights = 1 / np.arange(1, self.groups + 1) ** 1.1
+        weights /= weights.sum()
+        first = self.rng.choice(self.groups, self.users, p=weights)
+        extra_users = np.flatnonzero(self.rng.random(self.users) < 0.2)
+        extra = self.rng.choice(self.groups, len(extra_users), p=weights)
+        pairs = np.concatenate(
+            [
+                np.stack([first, np.arange(self.users)], axis=1),
+                np.stack([extra, extra_users], axis=1),
+            ]
+        )
+        return np.unique(pairs, axis=0)
+
+    # ------------------------------------------------------------ 角色数据
+
+    def write_roster(self) -> dict[str, list[str]]:
+        names = chara_names(self.charas, self.seed)
+        formal = [n[0] for n in names.values()]
+        pools = {}
+        for i, server in enumerate(SERVERS):
+            # 各服务器的卡池内容与概率各不相同
+            order = np.random.default_rng(self.seed + i).permutation(len(formal))
+            shuffled = [formal[j] for j in order]
+            third = len(shuffled) // 3
+            pools[server] = {
+                "up_prob": 7 + i * 3,
+                "s3_prob": 25 + i * 5,
+                "s2_prob": 180,
+                "up": shuffled[: 1 + i],
+                "star3": shuffled[1 + i : third],
+                "star2": shuffled[third : 2 * third],
+                "star1": shuffled[2 * third :],
+            }
+        unavailable = [FIRST_ID + j for j in range(0, self.charas, 50)]
+        files = {
+            "chara_name": names,
+            "chara_profile": chara_profiles(names),
+            "unavailable_chara": unavailable,
+            "local_pool": pools,
+            "local_pool_ver": {"ver": datetime.date.today().strftime("%Y%m%d")},
+        }
+        for key, value in files.items():
+            write_json(self.data_path / f"{key}.json", value)
+        return names
+
+    # ------------------------------------------------------------ 资源
+
+    def write_resources(self, ids: list[str], stamp_size: int) -> None:
+        for name in STATIC_RESOURCES:
+            source = PCR_PATH / "resources" / name
+            target = self.res_path / name
+            if source.is_dir():
+                shutil.copytree(source, target, dirs_exist_ok=True)
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy(source, target)
+        # 仓库中未提供的字体用签到字体代替
+        for font in ("calendar/wqy-microhei.ttc", "portune/font/sakura.ttf"):
+            target = self.res_path / font
+            if not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy(self.res_path / "sign" / "STHUPO.TTF", target)
+        write_icons(self.res_path / "priconne" / "icon", ids)
+        self.write_cards(ids)
+        self.write_stamps(stamp_size)
+
+    def write_cards(self, ids: list[str], stars=(3, 6)) -> None:
+        path = self.res_path / "priconne" / "card"
+        path.mkdir(parents=True, exist_ok=True)
+        gradient = np.linspace(0, 80, 1024, dtype=np.uint8)[None, :, None]
+        for id_ in ids:
+            rng = np.random.default_rng(int(id_))
+            for star in stars:
+                pixels = np.empty((576, 1024, 3), dtype=np.uint8)
+                pixels[...] = rng.integers(48, 170, 3, dtype=np.uint8) + gradient
+                Image.fromarray(pixels).save(path / f"card_full_{id_}{star}1.png")
+
+    def write_stamps(self, size: int) -> None:
+        path = self.res_path / "sign" / "stamp"
+        path.mkdir(parents=True, exist_ok=True)
+        yy, xx = np.mgrid[:size, :size]
+        inside = (yy - size / 2) ** 2 + (xx - size / 2) ** 2 < (size * 0.45) ** 2
+        for i in range(1, self.stamps + 1):
+            color = np.random.default_rng(i).integers(40, 220, 3, dtype=np.uint8)
+            pixels = np.full((size, size, 3), 255, dtype=np.uint8)
+            pixels[inside] = color
+            Image.fromarray(pixels).save(path / f"{i}.png")
+
+    # ------------------------------------------------------------ 用户数据
+
+    def write_sign(self) -> int:
+        """
+        写入好感数据与收集册, 返回收集到的印章总数。
+        """
+        today = datetime.date.today()
+        goodwill: dict[str, dict[str, list]] = {}
+        values = self.rng.integers(1, 3000, len(self.members))
+        days = self.rng.integers(0, 60, len(self.members))
+        for (g, u), value, day in zip(self.members, values, days):
+            d = today - datetime.timedelta(days=int(day))
+            goodwill.setdefault(self.gids[g], {})[self.uids[u]] = [
+                int(value),
+                f"{d.year}年{d.month}月{d.day}日",
+            ]
+        write_json(self.data_path / "sign" / "goodwill.json", goodwill)
+
+        counts = np.minimum(
+            self.rng.geometric(1 / self.cards_per_user, len(self.members)), self.stamps
+        )
+
+        def rows() -> Iterator[tuple]:
+            # 与插件相同的小端序位图, 第 cid 位表示印章 cid.png
+            for (g, u), count in zip(self.members, counts):
+                flags = np.zeros(self.stamps + 1, dtype=np.uint8)
+                flags[self.rng.choice(self.stamps, count, replace=False) + 1] = 1
+                bits = np.packbits(flags, bitorder="little").tobytes()
+                yield self.gids[g], self.uids[u], bits, int(count)
+
+        write_sqlite(
+            self.data_path / "sign" / "pcr_stamp.db",
+            "CREATE TABLE IF NOT EXISTS card_bitmap"
+            "(gid TEXT NOT NULL, uid TEXT NOT NULL, bits BLOB NOT NULL,"
+            " num INT NOT NULL, PRIMARY KEY(gid, uid))",
+            "INSERT INTO card_bitmap (gid, uid, bits, num) VALUES (?, ?, ?, ?)",
+            rows(),
+        )
+        return int(counts.sum())
+
+    def write_guess(self) -> int:
+        total = 0
+        for name in GUESS_DBS:
+            players = self.members[self.rng.random(len(self.members)) < 0.3]
+            wins = self.rng.geometric(0.05, len(players))
+            total += write_sqlite(
+                self.data_path / "guess_games" / name,
+                "CREATE TABLE IF NOT EXISTS win_record "
+                "(gid TEXT NOT NULL, uid TEXT NOT NULL, count INT NOT NULL,"
+                " PRIMARY KEY(gid, uid))",
+                "INSERT INTO win_record (gid, uid, count) VALUES (?, ?, ?)",
+                (
+                    (self.gids[g], self.uids[u], int(n))
+                    for (g, u), n in zip(players, wins)
+                ),
+            )
+        return total
+
+    def write_gacha(self) -> int:
+        chosen = self.rng.random(self.groups) < 0.5
+        return write_sqlite(
+            self.data_path / "gacha_game" / "pcr_gacha_gid.db",
+            "CREATE TABLE IF NOT EXISTS gid_pool "
+            "(gid TEXT NOT NULL PRIMARY KEY, pool TEXT )",
+            "INSERT INTO gid_pool (gid, pool) VALUES (?, ?)",
+            (
+                (gid, SERVERS[i % len(SERVERS)])
+                for i, gid in enumerate(self.gids)
+                if chosen[i]
+            ),
+        )
+
+    def write_calendar(self) -> int:
+        """
+        写入日程推送订阅, 目标与 nonebot_plugin_saa 的 TargetQQGroup 序列化格式相同。
+        """
+        gid_data = {}
+        for i in np.flatnonzero(self.rng.random(self.groups) < 0.4):
+            gid = self.gids[i]
+            k = int(self.rng.integers(1, len(CALENDAR_SERVERS) + 1))
+            servers = self.rng.choice(CALENDAR_SERVERS, k, replace=False)
+            gid_data[gid] = {
+                "server_list": [str(s) for s in servers],
+                "hour": int(self.rng.integers(0, 24)),
+                "minute": int(self.rng.choice([0, 15, 30, 45])),
+                "target": {"platform_type": "QQ Group", "group_id": int(gid)},
+            }
+        write_json(self.data_path / "calendar" / "pcr_data.json", gid_data)
+        return len(gid_data)
+
+    def generate(self, stamp_size: int) -> dict:
+        start = time.perf_counter()
+        names = self.write_roster()
+        self.write_resources(list(names), stamp_size)
+        summary = {
+            "seed": self.seed,
+            "users": self.users,
+            "groups": self.groups,
+            "members": len(self.members),
+            "charas": self.charas,
+            "stamps": self.stamps,
+            "card_records": self.write_sign(),
+            "guess_records": self.write_guess(),
+            "gacha_pools": self.write_gacha(),
+            "calendar_subscriptions": self.write_calendar(),
+        }
+        summary["seconds"] = round(time.perf_counter() - start, 1)
+        write_json(self.out / "dataset.json", summary)
+        return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("out", type=Path, help="输出目录")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--groups", type=int, default=2000)
+    parser.add_argument("--charas", type=int, default=1000)
+    parser.add_argument("--stamps", type=int, default=500)
+    parser.add_argument("--stamp-size", type=int, default=1000, help="印章边长")
+    parser.add_argument(
+        "--cards-per-user", type=float, default=20, help="每人平均收集的印章数"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    dataset = ScaleDataset(
+        args.out,
+        users=args.users,
+        groups=args.groups,
+        charas=args.charas,
+        stamps=args.stamps,
+        cards_per_user=args.cards_per_user,
+        seed=args.seed,
+    )
+    print(json.dumps(dataset.generate(args.stamp_size), indent=2))
+    print(f"PCR_DATA_PATH={dataset.data_path.resolve()}")
+    print(f"PCR_RESOURCES_PATH={dataset.res_path.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
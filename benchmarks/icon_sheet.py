@@ -0,0 +1,106 @@
+"""
+抽卡结果拼图基准: 逐张 PIL 粘贴(gen_team_pic + concat_pic) 与图块数组拼接
+(compose_team_sheet) 对比, 结果以 JSON 输出。
+
+用法: python benchmarks/icon_sheet.py [-r 重复次数]
+"""
+
+import argparse
+import json
+import random
+import time
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from _bootstrap import bootstrap
+from PIL import Image
+
+
+def make_icons(path: Path, num: int) -> list[str]:
+    """
+    生成随机噪声头像, 返回角色ID列表。
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(0)
+    ids = []
+    for i in range(num):
+        id_ = str(1001 + i)
+        pixels = rng.integers(0, 256, (128, 128, 4), dtype=np.uint8)
+        pixels[..., 3] = 255
+        Image.fromarray(pixels).save(path / f"icon_unit_{id_}31.png")
+        ids.append(id_)
+    return ids
+
+
+def best_of(func, repeat: int) -> float:
+    """
+    重复执行取最短耗时(毫秒)。
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = bootstrap()
+    ids = make_icons(workdir / "resources" / "priconne" / "icon", 200)
+
+    from pcr.models import Chara
+    from pcr.services.gacha_service import (
+        compose_team_sheet,
+        concat_pic,
+        gen_team_pic,
+    )
+    from pcr.services.icon_tensor_service import icon_tensor_service
+
+    icon_path = workdir / "resources" / "priconne" / "icon"
+    start = time.perf_counter()
+    icon_tensor_service.preload("icon", 64)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    def charas(num: int) -> list[Chara]:
+        result = []
+        for id_ in random.Random(num).sample(ids, num):
+            c = Chara(id_, 3, 0, name=id_)
+            c.icon = BytesIO((icon_path / f"icon_unit_{id_}31.png").read_bytes())
+            result.append(c)
+        return result
+
+    def pil_loop(c_list: list[Chara]) -> Image.Image:
+        for c in c_list:
+            c.icon.seek(0)  # type: ignore
+        pics = [
+            gen_team_pic(c_list[i : i + 5], star_slot_verbose=False)
+            for i in range(0, len(c_list), 5)
+        ]
+        return concat_pic(pics)
+
+    report = {"build_ms": round(build_ms, 2), "cases": {}}
+    for num in (1, 3, 10, 50, 200):
+        c_list = charas(num)
+        old = np.asarray(pil_loop(c_list).convert("RGB"), dtype=np.int16)
+        new = np.asarray(compose_team_sheet(c_list), dtype=np.int16)
+        pil_ms = best_of(lambda: pil_loop(c_list), args.repeat)
+        numpy_ms = best_of(lambda: compose_team_sheet(c_list), args.repeat)
+        report["cases"][f"sheet_{num}"] = {
+            "pil_ms": round(pil_ms, 3),
+            "numpy_ms": round(numpy_ms, 3),
+            "speedup": round(pil_ms / numpy_ms, 2),
+            "same_size": old.shape == new.shape,
+            "max_pixel_diff": (
+                int(np.abs(old - new).max()) if old.shape == new.shape else None
+            ),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+端到端的消息洪峰负载测试。
+
+加载完整的 PCR 插件, 由伪造的 OneBot V11 适配器向事件处理流程投递群消息,
+按设定的比例混合抽卡、签到、收集册、查角色、日程表与猜谜游戏等指令,
+统计吞吐量、各指令的 p50/p99 延迟、事件循环延迟与内存峰值, 结果以 JSON 输出。
+外部数据源由本地替身提供, 全程离线。
+
+用法:
+    python benchmarks/load.py [--groups 50] [--rate 20] [--duration 30]
+    python benchmarks/load.py --mix 十连=5,签到=5,闲聊=10 -o 结果.json
+    python benchmarks/load.py --dataset 数据集目录
+
+需要安装 pyproject.toml 中的全部依赖与 nonebot-adapter-onebot。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Optional
+
+import nonebot
+from nonebot.adapters.onebot.v11 import (
+    Adapter,
+    Bot,
+    GroupMessageEvent,
+    Message,
+)
+from nonebot.adapters.onebot.v11.event import Sender
+from nonebot.message import handle_event
+
+from _bootstrap import ROOT, prepare
+from _fixtures import write_data
+from _upstream import Upstream
+
+SELF_ID = 10000
+RESOURCES = ("priconne/gadget", "sign", "portune", "query", "rank")
+PLUGINS = (
+    "nonebot_plugin_apscheduler",
+    "nonebot_plugin_session",
+    "nonebot_plugin_saa",
+    "nonebot_plugin_userinfo",
+)
+"""PCR插件依赖的插件, 与 pyproject.toml 一致"""
+
+DEFAULT_MIX = {
+    "十连": 3,
+    "来一井": 1,
+    "签到": 3,
+    "收集册": 1,
+    "是谁": 2,
+    "日历": 1,
+    "猜头像": 1,
+    "猜卡面": 0.5,
+    "猜角色": 0.5,
+    "闲聊": 6,
+}
+"""各类消息的默认比例, 闲聊为随机角色名, 会经过所有猜谜游戏的答题判断"""
+
+
+class LoadAdapter(Adapter):
+    """
+    不连接协议端的适配器, API调用在延迟后直接返回, 并按API名称计数。
+    """
+
+    def __init__(self, driver, api_delay: float = 0, **kwargs: Any) -> None:
+        super().__init__(driver, **kwargs)
+        self.api_delay = api_delay
+        self.api_calls: Counter[str] = Counter()
+        self.message_id = 0
+
+    async def _call_api(self, bot: Bot, api: str, **data: Any) -> Any:
+        self.api_calls[api] += 1
+        if self.api_delay:
+            await asyncio.sleep(self.api_delay)
+        if api in ("send_msg", "send_group_msg", "send_private_msg"):
+            self.message_id += 1
+            return {"message_id": self.message_id}
+        user_id = data.get("user_id", 0)
+        if api in ("get_group_member_info", "get_stranger_info"):
+            return {
+                "group_id": data.get("group_id", 0),
+                "user_id": user_id,
+                "nickname": f"用户{user_id}",
+                "card": "",
+                "sex": "unknown",
+                "age": 0,
+                "area": "",
+                "join_time": 0,
+                "last_sent_time": 0,
+                "level": "",
+                "role": "member",
+                "title": "",
+            }
+        if api == "get_group_info":
+            return {
+                "group_id": data.get("group_id", 0),
+                "group_name": f"群{data.get('group_id', 0)}",
+                "member_count": 0,
+                "max_member_count": 0,
+            }
+        if api == "get_login_info":
+            return {"user_id": SELF_ID, "nickname": "bot"}
+        return {}
+
+
+def percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """
+    耗时统计, 单位毫秒。
+    """
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+        "max_ms": round(max(samples, default=0) * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2) if samples else 0.0,
+    }
+
+
+class LagMonitor:
+    """
+    周期性休眠并记录实际唤醒的延后时间, 衡量事件循环被阻塞的程度。
+    """
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.samples: list[float] = []
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(time.perf_counter() - start - self.interval)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+
+
+class Flood:
+    """
+    按固定速率向多个模拟群投递消息, 每条消息的处理相互独立并发进行。
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        names: list[str],
+        groups: int,
+        users: int,
+        mix: dict[str, float],
+        seed: int,
+    ) -> None:
+        self.bot = bot
+        self.names = names
+        self.groups = groups
+        self.users = users
+        self.kinds = list(mix)
+        self.weights = list(mix.values())
+        self.rng = random.Random(seed)
+        self.message_id = 0
+        self.latency: dict[str, list[float]] = defaultdict(list)
+        self.errors: Counter[str] = Counter()
+
+    def text(self, kind: str) -> str:
+        if kind == "是谁":
+            return f"{self.rng.choice(self.names)}是谁"
+        if kind == "日历":
+            return self.rng.choice(("日历", "国服日历", "台服日历", "日服日历"))
+        if kind == "闲聊":
+            return self.rng.choice(self.names)
+        return kind
+
+    def make_event(self, kind: str) -> GroupMessageEvent:
+        group = self.rng.randrange(self.groups)
+        user_id = 20000000 + group * self.users + self.rng.randrange(self.users)
+        text = self.text(kind)
+        self.message_id += 1
+        return GroupMessageEvent(
+            time=int(time.time()),
+            self_id=SELF_ID,
+            post_type="message",
+            sub_type="normal",
+            user_id=user_id,
+            message_type="group",
+            message_id=self.message_id,
+            message=Message(text),
+            original_message=Message(text),
+            raw_message=text,
+            font=0,
+            sender=Sender(user_id=user_id, nickname=f"用户{user_id}", card=""),
+            to_me=False,
+            group_id=100000 + group,
+        )
+
+    async def deliver(self, kind: str, event: GroupMessageEvent) -> None:
+        start = time.perf_counter()
+        try:
+            await handle_event(self.bot, event)
+        except Exception:
+            self.errors[kind] += 1
+        self.latency[kind].append(time.perf_counter() - start)
+
+    async def run(self, rate: float, duration: float, drain: float) -> dict[str, Any]:
+        total = int(rate * duration)
+        tasks = []
+        start = time.perf_counter()
+        for i in range(total):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind = self.rng.choices(self.kinds, self.weights)[0]
+            tasks.append(asyncio.create_task(self.deliver(kind, self.make_event(kind))))
+        sent = time.perf_counter() - start
+        pending: set[asyncio.Task] = set()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=drain)
+        elapsed = time.perf_counter() - start
+        for task in pending:
+            task.cancel()
+        completed = total - len(pending)
+        return {
+            "offered": total,
+            "offered_rate": round(total / sent, 2) if sent else 0,
+            "completed": completed,
+            "unfinished": len(pending),
+            "throughput": round(completed / elapsed, 2) if elapsed else 0,
+            "elapsed_s": round(elapsed, 2),
+        }
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in DEFAULT_MIX:
+            raise SystemExit(f"未知的消息类型: {kind}, 可选: {', '.join(DEFAULT_MIX)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def setup(args: argparse.Namespace) -> list[str]:
+    """
+    准备数据, 初始化 nonebot 并加载插件, 返回全部角色名。
+    """
+    if args.dataset:
+        workdir = prepare((), args.dataset)
+    else:
+        workdir = prepare(RESOURCES)
+        write_data(workdir)
+    nonebot.init(
+        driver="~none",
+        command_start=["", "/"],
+        log_level=args.log_level,
+        pcr_data_path=workdir / "data",
+        pcr_resources_path=workdir / "resources",
+        pcr_avatar_one_turn_time=args.guess_time,
+        pcr_card_one_turn_time=args.guess_time,
+        pcr_desc_one_turn_time=args.guess_time,
+    )
+    for plugin in PLUGINS:
+        nonebot.load_plugin(plugin)
+    # 与正式运行相同, 在仓库根目录下加载, 子插件按相对路径解析模块名
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    if nonebot.load_plugin("src.plugins.pcr") is None:
+        raise SystemExit("PCR插件加载失败")
+    chara_name = json.loads(
+        (workdir / "data" / "chara_name.json").read_text(encoding="utf-8")
+    )
+    return chara_name
+
+
+async def run(args: argparse.Namespace, chara_name: dict[str, list[str]]) -> dict:
+    upstream = Upstream(chara_name, delay=args.upstream_delay)
+    upstream.start()
+    driver = nonebot.get_driver()
+    adapter = LoadAdapter(driver, api_delay=args.api_delay)
+    bot = Bot(adapter, str(SELF_ID))
+    monitor = LagMonitor()
+    try:
+        await driver._lifespan.startup()
+        driver._bot_connect(bot)
+        # 等待启动时的后台预加载
+        await asyncio.sleep(args.warmup)
+        monitor.start()
+        names = [n[0] for n in chara_name.values()]
+        flood = Flood(bot, names, args.groups, args.users, args.mix, args.seed)
+        result = await flood.run(args.rate, args.duration, args.drain)
+        monitor.stop()
+        driver._bot_disconnect(bot)
+        await driver._lifespan.shutdown()
+    finally:
+        upstream.stop()
+    all_latency = [t for samples in flood.latency.values() for t in samples]
+    from src.plugins.pcr.services.metrics_service import metrics_service
+
+    return {
+        "config": {
+            "groups": args.groups,
+            "users_per_group": args.users,
+            "rate": args.rate,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "api_delay_s": args.api_delay,
+            "upstream_delay_s": args.upstream_delay,
+        },
+        "result": result,
+        "latency": summarize(all_latency),
+        "latency_by_kind": {k: summarize(v) for k, v in sorted(flood.latency.items())},
+        "errors": dict(flood.errors),
+        "command_errors": {
+            dict(labels)["matcher"]: int(value)
+            for (name, labels), value in metrics_service.counters.items()
+            if name == "pcr_command_errors_total"
+        },
+        "loop_lag": summarize(monitor.samples),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        "api_calls": dict(adapter.api_calls),
+        "upstream_requests": dict(upstream.requests),
+        "pcr_metrics": metrics_service.report(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", type=int, default=50, help="模拟的群数量")
+    parser.add_argument("--users", type=int, default=20, help="每个群的发言人数")
+    parser.add_argument("--rate", type=float, default=20, help="每秒投递的消息数")
+    parser.add_argument("--duration", type=float, default=30, help="投递时长(秒)")
+    parser.add_argument(
+        "--drain", type=float, default=60, help="投递结束后最多等待(秒)"
+    )
+    parser.add_argument(
+        "--mix", type=parse_mix, default=dict(DEFAULT_MIX), help="如 十连=3,签到=2"
+    )
+    parser.add_argument("--api-delay", type=float, default=0.02, help="API调用延迟(秒)")
+    parser.add_argument(
+        "--upstream-delay", type=float, default=0.05, help="外部请求延迟(秒)"
+    )
+    parser.add_argument("--guess-time", type=int, default=5, help="猜谜每轮时长(秒)")
+    parser.add_argument("--warmup", type=float, default=5, help="启动后等待预加载(秒)")
+    parser.add_argument("--dataset", type=Path, help="使用 generate.py 生成的数据集")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("-o", "--output", type=Path, help="结果保存路径")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args, setup(args)))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
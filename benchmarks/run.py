@@ -0,0 +1,469 @@
+"""
+PCR 热点路径基准测试。
+
+在临时目录中生成固定数据后逐项计时, 结果以 JSON 输出, 可保存为基线并在之后对比。
+
+用法:
+    python benchmarks/run.py [-k 名称片段] [-r 轮数] [-o 结果.json]
+    python benchmarks/run.py --compare 基线.json [--threshold 0.1]
+    python benchmarks/run.py --dataset 数据集目录
+
+与基线对比时, 中位耗时变慢超过阈值的项目记为 regression, 存在时以状态码 1 退出。
+依赖缺失而无法导入的项目记为 skipped, 不影响其余项目。
+"""
+
+import argparse
+import asyncio
+import datetime
+import inspect
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from _bootstrap import ROOT, bootstrap
+from _fixtures import bilibili_calendar_js, gamewith_calendar_html, write_data
+
+Body = Callable[[], Any]
+"""被计时的函数, 可以是协程函数"""
+
+
+@dataclass
+class Case:
+    name: str
+    setup: Callable[[], Awaitable[Body]]
+    """准备数据并返回被计时的函数"""
+
+
+CASES: dict[str, Case] = {}
+
+
+def case(name: str):
+    """
+    注册一个基准项目, 被装饰的协程函数负责准备数据并返回被计时的函数。
+    """
+
+    def decorator(setup: Callable[[], Awaitable[Body]]):
+        CASES[name] = Case(name, setup)
+        return setup
+
+    return decorator
+
+
+# ---------------------------------------------------------------- 抽卡
+
+
+@case("gacha.gacha_one")
+async def _():
+    from pcr.services.gacha_service import Gacha
+
+    gacha = Gacha("BL")
+    return lambda: gacha.gacha_one(gacha.up_prob, gacha.s3_prob, gacha.s2_prob)
+
+
+@case("gacha.gacha_ten")
+async def _():
+    from pcr.services.gacha_service import Gacha
+
+    return Gacha("BL").gacha_ten
+
+
+@case("gacha.gacha_tenjou")
+async def _():
+    from pcr.services.gacha_service import Gacha
+
+    return Gacha("BL").gacha_tenjou
+
+
+# ---------------------------------------------------------------- 角色数据
+
+
+@case("data.match")
+async def _():
+    import random
+
+    from pcr.services.data_service import chara_data, pcr_data
+
+    names = list(pcr_data.CHARA_ROSTER)
+    rng = random.Random(0)
+    # 一半精确名称, 一半删去一个字的近似名称
+    queries = [
+        name if i % 2 else name[:-1] for i, name in enumerate(rng.sample(names, 20))
+    ]
+
+    def body():
+        for query in queries:
+            chara_data.match(query)
+
+    return body
+
+
+@case("data.name2id")
+async def _():
+    from pcr.services.data_service import chara_data, pcr_data
+
+    queries = list(pcr_data.CHARA_ROSTER)[:200] + ["不存在的角色"] * 20
+
+    def body():
+        for query in queries:
+            chara_data.name2id(query)
+
+    return body
+
+
+@case("data.get_chara_roster")
+async def _():
+    from pcr.services.data_service import pcr_data
+
+    return pcr_data.get_chara_roster
+
+
+@case("data.update_roster")
+async def _():
+    from pcr.services.data_service import pcr_data
+
+    id_ = next(iter(pcr_data.CHARA_NAME))
+    # 每日更新的典型变化: 给一个角色增删一个别名
+    added = {id_: ([], ["新增的别名"])}
+    removed = {id_: (["新增的别名"], [])}
+
+    def body():
+        pcr_data.update_roster(added)
+        pcr_data.update_roster(removed)
+
+    return body
+
+
+# ---------------------------------------------------------------- 绘图
+
+
+async def gacha_charas(num: int) -> list:
+    from pcr.services.data_service import chara_data, pcr_data
+
+    ids = list(pcr_data.CHARA_NAME)[:num]
+    return [
+        await chara_data.get_chara(id=id_, star=3, equip=i % 2, need_icon=True)
+        for i, id_ in enumerate(ids)
+    ]
+
+
+@case("render.render_icon")
+async def _():
+    from pcr.services.gacha_service import render_icon
+
+    c = (await gacha_charas(1))[0]
+
+    def body():
+        c.icon.seek(0)
+        render_icon(c, 64, False)
+
+    return body
+
+
+@case("render.draw_gacha")
+async def _():
+    from pcr.services.gacha_service import GachaService
+
+    c_list = await gacha_charas(10)
+    service = GachaService()
+    return lambda: service.draw_gacha(c_list)
+
+
+@case("sign.draw_card")
+async def _():
+    import pcr.services.sign_service as sign_module
+    from pcr.services.sign_service import SignService
+
+    async def get_user_info(**kwargs):
+        return None
+
+    async def get_yi_yan():
+        return "今天也是元气满满的一天"
+
+    # 替换网络请求, 只计绘制与编码
+    sign_module.get_user_info = get_user_info  # type: ignore
+    service = SignService()
+    service.get_yi_yan = get_yi_yan  # type: ignore
+    stamp = service.card_file_names_all[0]
+    return lambda: service.draw_card(
+        stamp, "1", "1", "来一发十连", "2024年1月1日", 5, None, None  # type: ignore
+    )
+
+
+@case("sign.draw_card_online")
+async def _():
+    import pcr.services.sign_service as sign_module
+    from pcr.services.sign_service import SignService
+    from pcr.services.sign_service.background import process_background
+
+    from _upstream import image_bytes
+
+    async def get_user_info(**kwargs):
+        return None
+
+    async def get_yi_yan():
+        return "今天也是元气满满的一天"
+
+    sign_module.get_user_info = get_user_info  # type: ignore
+    service = SignService()
+    service.bg_mode = 1
+    service.get_yi_yan = get_yi_yan  # type: ignore
+    pool = service.background_pool
+    pool.depth = 0
+    bg = process_background(image_bytes((1280, 720), 1, "JPEG"))
+    stamp = service.card_file_names_all[0]
+
+    # 背景池始终有背景可取, 只计签到时的绘制与编码
+    async def draw():
+        pool.backgrounds.append((pool.path / "missing.png", bg.copy()))
+        return await service.draw_card(
+            stamp, "1", "1", "来一发十连", "2024年1月1日", 5, None, None  # type: ignore
+        )
+
+    return draw
+
+
+async def collection_service():
+    from pcr.services.sign_service import SignService
+
+    service = SignService()
+    db = service.db
+    for name in service.card_file_names_all[::3]:
+        db.add_card("1", "1", int(Path(name).stem))
+    return service
+
+
+@case("sign.draw_collection")
+async def _():
+    service = await collection_service()
+
+    def body():
+        service.collection_cache.clear()
+        return service.draw_collection("1", "1")
+
+    return body
+
+
+@case("sign.draw_collection_cached")
+async def _():
+    service = await collection_service()
+    await service.draw_collection("1", "1")
+    return lambda: service.draw_collection("1", "1")
+
+
+@case("sign.draw_collection_repaint")
+async def _():
+    service = await collection_service()
+    await service.draw_collection("1", "1")
+    image = service.collection_cache.get(("1", "1"))
+    # 新增一张印章前的收集状态, 每次都只需重绘这一格
+    bits = image.bits
+    service.db.add_card("1", "1", int(Path(service.card_file_names_all[1]).stem))
+
+    def body():
+        image.bits = bits
+        return service.draw_collection("1", "1")
+
+    return body
+
+
+@case("portune.drawing_pic")
+async def _():
+    from pcr.services.portune_service import portune_service
+
+    return portune_service.drawing_pic
+
+
+# ---------------------------------------------------------------- 日程表
+
+
+@case("calendar.generate_day_schedule")
+async def _():
+    from pcr.services import calendar_service
+    from pcr.services.calendar_service import (
+        event_data,
+        event_updated,
+        generate_day_schedule,
+        get_pcr_now,
+        transform_gamewith_calendar,
+    )
+
+    # 与 load_event_gamewith 相同的转换, 并标记为今日已更新以跳过联网
+    today = datetime.date.today()
+    event_data["jp"] = [
+        {
+            "title": item["name"],
+            "start": datetime.datetime.strptime(
+                item["start_time"], "%Y/%m/%d %H:%M:%S"
+            ),
+            "end": datetime.datetime.strptime(item["end_time"], "%Y/%m/%d %H:%M:%S"),
+            "type": item["type"],
+        }
+        for item in transform_gamewith_calendar(gamewith_calendar_html(today))
+    ]
+    event_updated["jp"] = get_pcr_now(0).strftime("%y%m%d")
+    assert calendar_service.event_data["jp"]
+    return lambda: generate_day_schedule("jp")
+
+
+@case("calendar.parse_bilibili")
+async def _():
+    from pcr.services.calendar_service import transform_bilibili_calendar
+
+    text = bilibili_calendar_js(datetime.date.today())
+    assert transform_bilibili_calendar(text)
+    return lambda: transform_bilibili_calendar(text)
+
+
+@case("calendar.parse_gamewith")
+async def _():
+    from pcr.services.calendar_service import transform_gamewith_calendar
+
+    text = gamewith_calendar_html(datetime.date.today())
+    assert transform_gamewith_calendar(text)
+    return lambda: transform_gamewith_calendar(text)
+
+
+# ---------------------------------------------------------------- 运行
+
+
+async def call(body: Body) -> None:
+    result = body()
+    if inspect.isawaitable(result):
+        await result
+
+
+async def measure(body: Body, repeat: int, min_time: float) -> dict[str, Any]:
+    """
+    预热一次后估算每轮调用次数, 使每轮不短于 min_time 秒, 返回单次调用耗时的统计。
+    """
+    start = time.perf_counter()
+    await call(body)
+    first = time.perf_counter() - start
+    number = max(1, int(min_time / max(first, 1e-6)))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await call(body)
+        samples.append((time.perf_counter() - start) / number * 1000)
+    return {
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "stdev_ms": round(statistics.stdev(samples), 4) if repeat > 1 else 0.0,
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+    current: dict[str, Any], baseline: dict[str, Any], threshold: float
+) -> dict[str, Any]:
+    """
+    按中位耗时与基线对比, 返回每个项目的比值与结论。
+    """
+    result = {}
+    for name, stats in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if "median_ms" not in stats or not base or "median_ms" not in base:
+            continue
+        ratio = stats["median_ms"] / base["median_ms"]
+        if ratio > 1 + threshold:
+            verdict = "regression"
+        elif ratio < 1 - threshold:
+            verdict = "improvement"
+        else:
+            verdict = "unchanged"
+        result[name] = {
+            "baseline_ms": base["median_ms"],
+            "current_ms": stats["median_ms"],
+            "ratio": round(ratio, 3),
+            "verdict": verdict,
+        }
+    return result
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    if args.dataset:
+        # generate.py 生成的数据集已包含所需资源
+        bootstrap(resources=(), workdir=args.dataset, log_level="WARNING")
+    else:
+        workdir = bootstrap(
+            resources=("priconne/gadget", "sign", "portune"), log_level="WARNING"
+        )
+        write_data(workdir)
+    from pcr.services.data_service import pcr_data
+
+    await pcr_data.load_pcr_data()
+
+    cases: dict[str, Any] = {}
+    for name, item in CASES.items():
+        if args.keyword and not any(k in name for k in args.keyword):
+            continue
+        try:
+            body = await item.setup()
+        except ImportError as e:
+            cases[name] = {"skipped": f"{type(e).__name__}: {e}"}
+            continue
+        cases[name] = await measure(body, args.repeat, args.min_time)
+        print(f"{name}: {cases[name]['median_ms']} ms", file=sys.stderr)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "cases": cases,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-k", "--keyword", action="append", help="只运行名称包含该片段的项目"
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=7, help="计时轮数")
+    parser.add_argument("--min-time", type=float, default=0.05, help="每轮最短时长(秒)")
+    parser.add_argument("-o", "--output", type=Path, help="结果保存路径, 可作为基线")
+    parser.add_argument("--compare", type=Path, help="对比的基线结果")
+    parser.add_argument(
+        "--dataset", type=Path, help="在 generate.py 生成的数据集上运行, 而非固定数据"
+    )
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定变化的比例")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        report["baseline"] = baseline.get("meta", {})
+        report["comparison"] = compare(report, baseline, args.threshold)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    print(text)
+    if any(v["verdict"] == "regression" for v in report.get("comparison", {}).values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
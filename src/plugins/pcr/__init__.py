@@ -5,6 +5,9 @@ from nonebot.plugin import PluginMetadata
 
 from .config import Config
 from .services.data_service import pcr_data
+from .services.manifest_service import manifest_service
+from .services.watch_service import watch_service
+from .services.watchdog_service import watchdog_service
 
 __plugin_meta__ = PluginMetadata(
     name="PCR",
@@ -24,8 +27,20 @@ driver = get_driver()
 async def first_load():
     # 检查数据并补齐缺少的数据
     await pcr_data.load_pcr_data()
+    # 为旧版本保存的头像与卡面补全资源清单
+    manifest_service.scan_in_background()
+    # 监听资源与数据文件的变化
+    watch_service.start()
+    # 监测事件循环阻塞
+    watchdog_service.start()
     #print(type(pcr_data.CHARA_ROSTER.get("未知角色")))
     #print(pcr_data.CHARA_ROSTER.get("未知角色"))
 
 
+@driver.on_shutdown
+async def _():
+    watch_service.stop()
+    watchdog_service.stop()
+
+
 sub_plugins = load_plugins(str(Path(__file__).parent.joinpath("plugins").resolve()))
@@ -10,6 +10,36 @@ class Config(BaseModel, extra=Extra.ignore):
     # PCR 数据资源配置
     pcr_data_path: Path = Path(__file__).resolve().parent / "data"
     pcr_resources_path: Path = Path(__file__).resolve().parent / "resources"
+    pcr_asset_pack: bool = False
+    """头像、卡面与签到印章是否从资源包读写(需先使用 导入资源包 指令)"""
+    pcr_card_chat_width: int = 720
+    """发送卡面时使用的缩小图宽度"""
+    pcr_watch_backend: str = "auto"  # auto: 优先inotify poll: 扫描 off: 关闭
+    """资源与数据文件变化的监听方式, 变化后相关缓存自动失效"""
+    pcr_watch_poll_interval: float = 10
+    """定期扫描文件变化的间隔(秒)"""
+    pcr_cache_budget_mb: int = 256
+    """字体、图片等内存缓存共用的内存预算(MB), 超出时淘汰, 0为不限制"""
+    # PCR 性能统计配置
+    pcr_metrics: bool = True
+    """是否统计指令耗时、外部请求耗时与缓存命中"""
+    pcr_metrics_path: str = ""
+    """以 Prometheus 格式提供统计数据的HTTP路径(仅FastAPI驱动器), 该路径不做鉴权, 默认不提供"""
+    pcr_profile_interval: float = 0.01
+    """性能采样的间隔(秒)"""
+    pcr_profile_max_seconds: int = 300
+    """单次性能采样的最长时长(秒)"""
+    pcr_loop_watchdog: bool = True
+    """是否监测事件循环的调度延迟"""
+    pcr_loop_lag_threshold: float = 0.2
+    """事件循环阻塞超过该时长(秒)时记录阻塞位置"""
+    # PCR 限流配置
+    pcr_limiter_backend: str = "memory"  # memory: 进程内存 sqlite: 本地数据库
+    """每日次数计数后端, sqlite 重启后保留计数且可在多进程间共享"""
+    pcr_group_rate_limit: float = 0
+    """每个群图片类指令每秒恢复的次数, 0为不限制"""
+    pcr_group_rate_burst: int = 5
+    """每个群图片类指令可连续触发的次数"""
     # PCR 运势配置
     pcr_portune_limit: int = 1
     """每日限制次数"""
@@ -33,6 +63,8 @@ class Config(BaseModel, extra=Extra.ignore):
     # PCR GUESS配置
     pcr_guess_is_reply: bool = False
     """是否启用回复"""
+    pcr_guess_prefetch: int = 3
+    """猜头像/猜卡面预生成的题目数"""
     pcr_avatar_patch_size: int = 32
     """猜头像裁剪尺寸"""
     pcr_avatar_one_turn_time: int = 20
@@ -54,6 +86,10 @@ class Config(BaseModel, extra=Extra.ignore):
     """每行卡片数"""
     pcr_sign_bg_mode: int = 0  # 0: 下载好的背景 1: 随机网络背景
     """签到背景模式"""
+    pcr_sign_bg_api: str = "https://dev.iw233.cn/api.php?sort=mp&type=json"
+    """随机网络背景的图片接口"""
+    pcr_sign_bg_pool: int = 8
+    """随机网络背景预先下载并处理好的张数"""
 
 
 global_config = get_driver().config
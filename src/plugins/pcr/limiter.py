@@ -0,0 +1,333 @@
+import sqlite3
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional, Protocol
+
+import pytz
+from nonebot.matcher import Matcher
+from nonebot.params import Depends
+from nonebot_plugin_session import EventSession
+
+from .config import pcr_config
+from .services.metrics_service import metrics_service
+
+pcr_data_path: Path = pcr_config.pcr_data_path
+"""PCR数据存放路径"""
+
+
+class LimiterBackend(Protocol):
+    """每日计数存储后端"""
+
+    def get(self, namespace: str, day: int, key: str) -> int:
+        """获取计数"""
+        ...
+
+    def increase(self, namespace: str, day: int, key: str, num: int) -> int:
+        """增加计数, 返回增加后的计数"""
+        ...
+
+    def try_increase(
+        self, namespace: str, day: int, key: str, num: int, max_num: int
+    ) -> bool:
+        """原子地检查并增加计数, 增加后不超过上限时返回True"""
+        ...
+
+    def reset(self, namespace: str, day: int, key: str) -> None:
+        """重置计数"""
+        ...
+
+
+class MemoryLimiterBackend:
+    """进程内存后端, 仅保存当日非零计数"""
+
+    def __init__(self) -> None:
+        self.day: dict[str, int] = {}
+        self.count: dict[str, dict[str, int]] = {}
+
+    def _bucket(self, namespace: str, day: int) -> dict[str, int]:
+        # 跨日时直接丢弃旧桶
+        if self.day.get(namespace) != day:
+            self.day[namespace] = day
+            self.count[namespace] = {}
+        return self.count[namespace]
+
+    def get(self, namespace: str, day: int, key: str) -> int:
+        return self._bucket(namespace, day).get(key, 0)
+
+    def increase(self, namespace: str, day: int, key: str, num: int) -> int:
+        bucket = self._bucket(namespace, day)
+        bucket[key] = bucket.get(key, 0) + num
+        return bucket[key]
+
+    def try_increase(
+        self, namespace: str, day: int, key: str, num: int, max_num: int
+    ) -> bool:
+        bucket = self._bucket(namespace, day)
+        n = bucket.get(key, 0) + num
+        if n > max_num:
+            return False
+        bucket[key] = n
+        return True
+
+    def reset(self, namespace: str, day: int, key: str) -> None:
+        self._bucket(namespace, day).pop(key, None)
+
+
+class SQLiteLimiterBackend:
+    """SQLite后端, 重启后计数保留, 同一数据目录下的多个进程共享计数"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        db_path.touch()
+        self.expired_day = -1
+        self._create_table()
+
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _create_table(self):
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS daily_limit "
+                "(namespace TEXT NOT NULL, key TEXT NOT NULL, day INT NOT NULL, "
+                "count INT NOT NULL, PRIMARY KEY(namespace, key)) WITHOUT ROWID"
+            )
+
+    def _expire(self, conn: sqlite3.Connection, day: int) -> None:
+        # 每个进程每天清理一次过期的计数
+        if self.expired_day != day:
+            conn.execute("DELETE FROM daily_limit WHERE day < ?", (day,))
+            self.expired_day = day
+
+    def get(self, namespace: str, day: int, key: str) -> int:
+        with self.connect() as conn:
+            r = conn.execute(
+                "SELECT count FROM daily_limit WHERE namespace=? AND key=? AND day=?",
+                (namespace, key, day),
+            ).fetchone()
+        return r[0] if r else 0
+
+    def increase(self, namespace: str, day: int, key: str, num: int) -> int:
+        with self.connect() as conn:
+            self._expire(conn, day)
+            conn.execute(
+                "INSERT INTO daily_limit (namespace, key, day, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(namespace, key) DO UPDATE SET "
+                "count = CASE WHEN day = excluded.day "
+                "THEN count + excluded.count ELSE excluded.count END, "
+                "day = excluded.day",
+                (namespace, key, day, num),
+            )
+            r = conn.execute(
+                "SELECT count FROM daily_limit WHERE namespace=? AND key=?",
+                (namespace, key),
+            ).fetchone()
+        return r[0]
+
+    def try_increase(
+        self, namespace: str, day: int, key: str, num: int, max_num: int
+    ) -> bool:
+        if num > max_num:
+            return False
+        with self.connect() as conn:
+            self._expire(conn, day)
+            # 单条语句完成检查与增加, 超出上限时不更新任何行
+            cur = conn.execute(
+                "INSERT INTO daily_limit (namespace, key, day, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(namespace, key) DO UPDATE SET "
+                "count = CASE WHEN day = excluded.day "
+                "THEN count + excluded.count ELSE excluded.count END, "
+                "day = excluded.day "
+                "WHERE day != excluded.day OR count + excluded.count <= ?",
+                (namespace, key, day, num, max_num),
+            )
+        return cur.rowcount > 0
+
+    def reset(self, namespace: str, day: int, key: str) -> None:
+        with self.connect() as conn:
+            conn.execute(
+                "DELETE FROM daily_limit WHERE namespace=? AND key=?",
+                (namespace, key),
+            )
+
+
+_backends: dict[str, LimiterBackend] = {}
+
+
+def get_limiter_backend(name: Optional[str] = None) -> LimiterBackend:
+    """
+    获取计数后端, 默认使用配置 pcr_limiter_backend 指定的后端。
+    """
+    name = name or pcr_config.pcr_limiter_backend
+    if name not in _backends:
+        if name == "sqlite":
+            _backends[name] = SQLiteLimiterBackend(pcr_data_path / "limiter.db")
+        elif name == "memory":
+            _backends[name] = MemoryLimiterBackend()
+        else:
+            raise ValueError(f"未知的计数后端: {name}")
+    return _backends[name]
+
+
+class DailyNumberLimiter:
+    """每日次数限制器, 每天0点(Asia/Shanghai)重置"""
+
+    tz = pytz.timezone("Asia/Shanghai")
+
+    def __init__(
+        self,
+        max_num: int,
+        namespace: str = "default",
+        backend: Optional[LimiterBackend] = None,
+    ):
+        self.max = max_num
+        self.namespace = namespace
+        self.backend = backend or get_limiter_backend()
+
+    @property
+    def today(self) -> int:
+        return datetime.now(self.tz).date().toordinal()
+
+    def check(self, key) -> bool:
+        return self.get_num(key) < self.max
+
+    def get_num(self, key) -> int:
+        return self.backend.get(self.namespace, self.today, str(key))
+
+    def increase(self, key, num=1) -> int:
+        return self.backend.increase(self.namespace, self.today, str(key), num)
+
+    def try_increase(self, key, num=1) -> bool:
+        """
+        检查并增加次数, 未超出限制时返回True。
+
+        多个进程共享SQLite后端时, 检查与增加在同一条语句中完成, 不会超发。
+        """
+        return self.backend.try_increase(
+            self.namespace, self.today, str(key), num, self.max
+        )
+
+    def reset(self, key) -> None:
+        self.backend.reset(self.namespace, self.today, str(key))
+
+
+class TokenBucketLimiter:
+    """令牌桶限流器
+
+    桶按最后一次使用时间排序, 已回满的桶与不存在等价, 每次访问时从队首淘汰,
+    存储只保留近期活跃的key, 单次操作均摊O(1)。
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        """桶容量"""
+        self.rate = rate
+        """每秒恢复的令牌数"""
+        self.refill_time = capacity / rate
+        """空桶回满所需时间"""
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        """key -> (剩余令牌, 更新时间)"""
+
+    def _expire(self, now: float) -> None:
+        while self.buckets:
+            key, (tokens, updated) = next(iter(self.buckets.items()))
+            if now - updated < self.refill_time:
+                break
+            self.buckets.popitem(last=False)
+
+    def _tokens(self, key: str, now: float) -> float:
+        if key not in self.buckets:
+            return self.capacity
+        tokens, updated = self.buckets[key]
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def try_acquire(self, key: str, num: float = 1) -> bool:
+        """
+        尝试取出令牌, 令牌不足时返回False且不扣除。
+        """
+        now = time.monotonic()
+        self._expire(now)
+        tokens = self._tokens(key, now)
+        if tokens < num:
+            return False
+        self.buckets[key] = (tokens - num, now)
+        self.buckets.move_to_end(key)
+        return True
+
+    def wait_time(self, key: str, num: float = 1) -> float:
+        """
+        距离可以取出令牌还需等待的秒数。
+        """
+        return max(0.0, (num - self._tokens(key, time.monotonic())) / self.rate)
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+
+class FreqLimiter(TokenBucketLimiter):
+    """冷却时间限流器, 每个key每cd秒只能通过一次"""
+
+    def __init__(self, cd: float):
+        super().__init__(capacity=1, rate=1 / cd)
+
+
+group_limiter: Optional[TokenBucketLimiter] = (
+    TokenBucketLimiter(
+        capacity=pcr_config.pcr_group_rate_burst,
+        rate=pcr_config.pcr_group_rate_limit,
+    )
+    if pcr_config.pcr_group_rate_limit > 0
+    else None
+)
+"""群组共享的图片类指令令牌桶"""
+
+
+def RateLimit(
+    name: str,
+    cd: float = 0,
+    daily_limit: int = 0,
+    group: bool = True,
+    cd_notice: str = "您冲得太快了，请{wait}秒后再来~",
+    daily_notice: str = "您今天已经冲过{limit}次了，请明天再来！",
+    group_notice: str = "本群请求过于频繁，请稍后再试~",
+) -> Any:
+    """
+    限流依赖, 用于事件处理函数的参数。
+
+    参数:
+        name: 限流规则名称, 同时作为每日计数的命名空间
+        cd: 每个用户的冷却时间(秒), 0为不限制
+        daily_limit: 每个用户的每日次数, 0为不限制
+        group: 是否计入群组共享令牌桶
+    """
+    user_limiter = FreqLimiter(cd) if cd > 0 else None
+    daily_limiter = (
+        DailyNumberLimiter(daily_limit, namespace=name) if daily_limit > 0 else None
+    )
+
+    async def dependency(matcher: Matcher, session: EventSession) -> None:
+        uid = f"{session.platform}_{session.id1}"
+        gid = session.id3 or session.id2
+        gid = f"{session.platform}_{gid}" if group and gid else None
+        # 冷却与群组令牌桶只检查不取令牌, 全部检查通过后才取出,
+        # 被之后的检查拒绝时既不开始冷却也不消耗群组的次数
+        if user_limiter is not None and (wait := user_limiter.wait_time(uid)) > 0:
+            metrics_service.inc("pcr_rate_limited_total", rule=name, kind="cd")
+            await matcher.finish(cd_notice.format(wait=max(round(wait), 1)))
+        if group_limiter is not None and gid and group_limiter.wait_time(gid) > 0:
+            metrics_service.inc("pcr_rate_limited_total", rule=name, kind="group")
+            await matcher.finish(group_notice)
+        if daily_limiter is not None and not daily_limiter.try_increase(uid):
+            metrics_service.inc("pcr_rate_limited_total", rule=name, kind="daily")
+            await matcher.finish(daily_notice.format(limit=daily_limiter.max))
+        # 检查与取令牌之间没有 await, 不会被其他请求插入
+        if user_limiter is not None:
+            user_limiter.try_acquire(uid)
+        if group_limiter is not None and gid:
+            group_limiter.try_acquire(gid)
+
+    return Depends(dependency)
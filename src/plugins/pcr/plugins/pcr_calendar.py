@@ -18,7 +18,9 @@ from nonebot_plugin_saa import (
 from nonebot_plugin_session import EventSession
 
 from ..config import pcr_config
+from ..limiter import RateLimit
 from ..services.calendar_service import generate_day_schedule, logger
+from ..services.metrics_service import metrics_service
 
 enable_auto_select_bot()
 
@@ -42,7 +44,12 @@ matcher = on_regex(pattern=r"^/?([国台日])?服?日[历程](.*)")
 
 
 @matcher.handle()
-async def _(session: EventSession, target: SaaTarget, matched_groups=RegexGroup()):
+async def _(
+    session: EventSession,
+    target: SaaTarget,
+    matched_groups=RegexGroup(),
+    _limit: None = RateLimit("calendar"),
+):
     # 获取群组id and uid
     gid = session.id2
     if gid is None:
@@ -66,7 +73,8 @@ async def _(session: EventSession, target: SaaTarget, matched_groups=RegexGroup(
         im = await generate_day_schedule(server)
         bytes_io = BytesIO()
         # 将图像保存到 BytesIO 对象中
-        im.save(bytes_io, format="png")
+        with metrics_service.stage("encode", "calendar"):
+            im.save(bytes_io, format="png")
         # 将光标移动到字节流的起始位置
         bytes_io.seek(0)
         msg = Image(bytes_io)
@@ -140,7 +148,8 @@ async def send_calendar(gid):
         im = await generate_day_schedule(server)
         bytes_io = BytesIO()
         # 将图像保存到 BytesIO 对象中
-        im.save(bytes_io, format="png")
+        with metrics_service.stage("encode", "calendar"):
+            im.save(bytes_io, format="png")
         # 将光标移动到字节流的起始位置
         bytes_io.seek(0)
         msg = Image(bytes_io)
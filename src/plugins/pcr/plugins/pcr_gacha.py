@@ -1,4 +1,4 @@
-from nonebot import on_command
+from nonebot import get_driver, on_command
 from nonebot.adapters import Message
 from nonebot.matcher import Matcher
 from nonebot.params import ArgPlainText, CommandArg
@@ -6,7 +6,10 @@ from nonebot.plugin import PluginMetadata
 from nonebot_plugin_saa import Image, Mention, Text
 from nonebot_plugin_session import EventSession
 
+from ..config import pcr_config
+from ..limiter import RateLimit
 from ..services.gacha_service import Chara, Gacha, GachaService, chara_data, logger
+from ..services.icon_tensor_service import icon_tensor_service
 
 __plugin_meta__ = PluginMetadata(
     name="pcr_gacha",
@@ -14,6 +17,14 @@ __plugin_meta__ = PluginMetadata(
     usage="[单抽|十连|来一井|查看卡池|切换卡池]",
     config=None,
 )
+
+
+@get_driver().on_startup
+async def _():
+    # 生成抽卡结果使用的头像图块
+    icon_tensor_service.preload_in_background("icon", 64)
+
+
 gacha_1_aliases = [
     "单抽",
     "单抽！",
@@ -45,13 +56,17 @@ gacha_300_aliases = {"抽一井", "来一井", "来发井", "抽发井", "天井
 SUPER_LUCKY_LINE = 170
 
 gacha_service = GachaService()
+gacha_limit = RateLimit(
+    "gacha", cd=pcr_config.pcr_gacha_cd, daily_limit=pcr_config.pcr_gacha_limit
+)
+pool_limit = RateLimit("gacha_pool")
 
 
 matcher = on_command("单抽", aliases=set(gacha_1_aliases), priority=5)
 
 
 @matcher.handle()
-async def _(session: EventSession):
+async def _(session: EventSession, _limit: None = gacha_limit):
     # 获取群组id and uid
     uid = session.id1
     gid = session.id2
@@ -78,7 +93,7 @@ matcher = on_command("十连", aliases=set(gacha_10_aliases), priority=5)
 
 
 @matcher.handle()
-async def _(session: EventSession):
+async def _(session: EventSession, _limit: None = gacha_limit):
     # 获取群组id and uid
     uid = session.id1
     gid = session.id2
@@ -111,7 +126,7 @@ matcher = on_command("来一井", aliases=set(gacha_300_aliases), priority=5)
 
 
 @matcher.handle()
-async def _(session: EventSession):
+async def _(session: EventSession, _limit: None = gacha_limit):
     # 获取群组id and uid
     uid = session.id1
     gid = session.id2
@@ -190,7 +205,7 @@ matcher = on_command(
 
 
 @matcher.handle()
-async def _(session: EventSession):
+async def _(session: EventSession, _limit: None = pool_limit):
     # 获取群组id
     gid = session.id2
     if gid is None:
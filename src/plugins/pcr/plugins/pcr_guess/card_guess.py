@@ -1,13 +1,14 @@
-import asyncio
-from datetime import timedelta
-
+from nonebot import get_driver
 from nonebot.adapters import Bot, Event
 from nonebot.plugin import on_command, on_message
-from nonebot_plugin_saa import Image, Text
+from nonebot_plugin_saa import Image, SaaTarget, Text
 from nonebot_plugin_session import EventSession
 from nonebot_plugin_userinfo import get_user_info
 
 from ...config import pcr_config
+from ...limiter import RateLimit
+from ...models import GuessGame
+from ...services.data_service import chara_data
 from ...services.guess_service import GuessService, logger
 
 # BASE_WIN_COIN = 175
@@ -23,6 +24,14 @@ card_db_path = pcr_config.pcr_data_path / "guess_games" / "pcr_card_guess.db"
 guess_service = GuessService(card_db_path)
 
 
+@get_driver().on_startup
+async def _():
+    # 在后台预生成题目
+    guess_service.get_question_queue("card", pic_side_length).refill()
+    # 为全部卡面建立裁剪索引
+    guess_service.build_saliency_index("card", pic_side_length)
+
+
 matcher = on_command("猜卡面排名", aliases={"猜卡面排行榜", "猜卡面群排行"}, priority=5)
 
 
@@ -50,7 +59,12 @@ matcher = on_command("猜卡面", priority=5)
 
 
 @matcher.handle()
-async def card_guess(session: EventSession):
+async def card_guess(
+    bot: Bot,
+    session: EventSession,
+    target: SaaTarget,
+    _limit: None = RateLimit("guess"),
+):
     gid = session.id3 if session.id3 else (session.id2 if session.id2 else session.id1)
     assert gid
     platform = session.platform
@@ -58,73 +72,71 @@ async def card_guess(session: EventSession):
     # 如果游戏正在进行，则返回提示信息
     if guess_service.is_playing(gid):
         await matcher.finish("游戏仍在进行中…")
-    else:
-        # 否则，开始一个新的游戏
-        game = await guess_service.start_card_game(gid, blacklist_id, pic_side_length)
-        logger.debug(f"PCR猜卡面游戏 gid：{game.gid} 答案：{game.answer.name}")
-        # 构造题目消息
-        msg = Text(
-            f"猜猜这个图片是哪位角色卡面的一部分?({one_turn_time}s后公布答案)"
-        ) + Image(game.question)
-        # 发送题目
-        await msg.send()
-        # 创建事件对象
-        finish_event = asyncio.Event()
-
-        async def check_answer(event: Event) -> bool:
-            """
-            检查给定答案是否与游戏的答案匹配。
-            """
-            # 获取用户答案
-            user_answer = event.get_plaintext().strip()
-            if not game:
-                return False
-            return await guess_service.check_answer(user_answer, game)
-
-        # 创建临时事件响应器
-        checker = on_message(
-            rule=check_answer,
-            priority=5,
-            expire_time=timedelta(seconds=one_turn_time),
-            temp=True,
-        )
-
-        @checker.handle()
-        async def _(event: Event):
-            # 获取答对者id
-            game.winner = event.get_user_id()
-            # 获取答对次数
-            n = guess_service.record(game.gid, game.winner)
-            # 构造答对消息
-            txt = f"\n猜对了，真厉害！TA已经猜对{n}次了~\n正确答案是{game.answer.name}"
-            img = game.answer.card
-            assert img is not None
-            msg = Text(txt) + Image(img)
-            # 设置事件标识为True
-            finish_event.set()
-            # 发送答对消息
-            await msg.send(at_sender=True)
-
-        # 等待15秒或者收到指令
-        try:
-            await asyncio.wait_for(
-                finish_event.wait(), timeout=one_turn_time
-            )  # 等待15秒或者收到指令
-        except asyncio.TimeoutError:
-            # 如果超时，说明没有人答对
-            if game.winner:
-                return
-            # 构造答案消息
-            txt = f"正确答案是：{game.answer.name}"
-            txt2 = "\n很遗憾，没有人答对~"
-            img = game.answer.card
-            assert img is not None
-            msg = Text(txt) + Image(img) + Text(txt2)
-            # 发送答案
-            await msg.send()
-        finally:
-            # 清除事件
-            finish_event.clear()
-            # 结束游戏
-            guess_service.end_game(gid)
-            logger.debug(f"PCR猜卡面游戏 gid：{game.gid} 结束")
+    # 否则，开始一个新的游戏
+    game = await guess_service.start_card_game(gid, blacklist_id, pic_side_length)
+    logger.debug(f"PCR猜卡面游戏 gid：{game.gid} 答案：{game.answer.name}")
+    # 构造题目消息
+    msg = Text(
+        f"猜猜这个图片是哪位角色卡面的一部分?({one_turn_time}s后公布答案)"
+    ) + Image(game.question)
+    # 发送题目
+    await msg.send()
+    # 设置超时
+    guess_service.set_timeout(
+        gid, one_turn_time, lambda: announce_answer(game, bot, target)
+    )
+
+
+async def announce_answer(game: GuessGame, bot: Bot, target: SaaTarget):
+    """
+    超时公布答案。
+    """
+    # 游戏已被答对者结束
+    if guess_service.end_game(game.gid) is None:
+        return
+    logger.debug(f"PCR猜卡面游戏 gid：{game.gid} 结束")
+    # 构造答案消息
+    txt = f"正确答案是：{game.answer.name}"
+    txt2 = "\n很遗憾，没有人答对~"
+    img = await chara_data.get_chara_card(
+        game.answer.id, game.answer.star, variant="chat"
+    )
+    msg = Text(txt) + Image(img) + Text(txt2)
+    # 发送答案
+    await msg.send_to(target, bot)
+
+
+async def check_answer(event: Event, session: EventSession) -> bool:
+    """
+    检查消息是否答对了本群正在进行的游戏。
+    """
+    gid = session.id3 if session.id3 else (session.id2 if session.id2 else session.id1)
+    gid = f"{session.platform}_{gid}"
+    return await guess_service.check_message(gid, event.get_plaintext().strip())
+
+
+# 所有群共用的答题响应器
+checker = on_message(rule=check_answer, priority=5)
+
+
+@checker.handle()
+async def _(event: Event, session: EventSession):
+    gid = session.id3 if session.id3 else (session.id2 if session.id2 else session.id1)
+    gid = f"{session.platform}_{gid}"
+    game = guess_service.end_game(gid)
+    # 游戏已超时结束
+    if game is None:
+        return
+    # 获取答对者id
+    game.winner = event.get_user_id()
+    # 获取答对次数
+    n = guess_service.record(game.gid, game.winner)
+    logger.debug(f"PCR猜卡面游戏 gid：{game.gid} 结束")
+    # 构造答对消息
+    txt = f"\n猜对了，真厉害！TA已经猜对{n}次了~\n正确答案是{game.answer.name}"
+    img = await chara_data.get_chara_card(
+        game.answer.id, game.answer.star, variant="chat"
+    )
+    msg = Text(txt) + Image(img)
+    # 发送答对消息
+    await msg.send(at_sender=True)
@@ -0,0 +1,150 @@
+import time
+from typing import Any, Optional
+
+from nonebot import get_app, on_command, on_regex
+from nonebot.adapters import Bot
+from nonebot.matcher import Matcher
+from nonebot.message import run_postprocessor, run_preprocessor
+from nonebot.params import RegexGroup
+from nonebot.permission import SUPERUSER
+from nonebot.plugin import PluginMetadata
+
+from ..config import pcr_config
+from ..logger import PCRLogger
+from ..services.cache_service import cache_service
+from ..services.guess_service import report_question_queues
+from ..services.metrics_service import metrics_service
+from ..services.profiler_service import profiler_service
+
+__plugin_meta__ = PluginMetadata(
+    name="pcr_metrics",
+    description="统计PCR指令的耗时与缓存命中、占用情况",
+    usage="[PCR性能统计|重置PCR性能统计|PCR性能采样 30s]",
+    config=None,
+)
+
+logger = PCRLogger("PCR_METRICS")
+
+PACKAGE = __name__.rsplit(".plugins.", 1)[0]
+"""PCR插件包名, 只统计包内的指令"""
+START_KEY = "_pcr_metrics_start"
+
+API_TIMEOUT = 300
+"""超过该时间(秒)仍未结束的API调用不再计时"""
+
+api_started: dict[int, float] = {}
+"""API调用参数的id -> 开始时间, 按开始时间排列"""
+
+
+def matcher_label(matcher: Matcher) -> Optional[str]:
+    """
+    指令所在的模块名, 不属于PCR插件时返回None。
+    """
+    module = matcher.module_name
+    if not module or not module.startswith(PACKAGE):
+        return None
+    return module.rsplit(".", 1)[-1]
+
+
+@run_preprocessor
+async def _(matcher: Matcher):
+    if metrics_service.enabled and matcher_label(matcher) is not None:
+        matcher.state[START_KEY] = time.perf_counter()
+
+
+@run_postprocessor
+async def _(matcher: Matcher, exception: Optional[Exception]):
+    start = matcher.state.get(START_KEY)
+    label = matcher_label(matcher)
+    if start is None or label is None:
+        return
+    metrics_service.observe(
+        "pcr_command_seconds", time.perf_counter() - start, matcher=label
+    )
+    if exception is not None:
+        metrics_service.inc("pcr_command_errors_total", matcher=label)
+
+
+@Bot.on_calling_api
+async def _(bot: Bot, api: str, data: dict[str, Any]):
+    if not metrics_service.enabled:
+        return
+    now = time.perf_counter()
+    # 调用失败时可能没有 on_called_api, 从最早的记录开始清理
+    while api_started:
+        key = next(iter(api_started))
+        if now - api_started[key] < API_TIMEOUT:
+            break
+        del api_started[key]
+    api_started.pop(id(data), None)
+    api_started[id(data)] = now
+
+
+@Bot.on_called_api
+async def _(
+    bot: Bot, exception: Optional[Exception], api: str, data: dict[str, Any], result
+):
+    start = api_started.pop(id(data), None)
+    if start is not None:
+        metrics_service.observe("pcr_api_seconds", time.perf_counter() - start, api=api)
+
+
+if pcr_config.pcr_metrics_path:
+    try:
+        from fastapi import FastAPI
+        from fastapi.responses import PlainTextResponse
+
+        app = get_app()
+    except (AssertionError, ImportError, ValueError):
+        logger.debug("当前驱动器不支持HTTP, 仅可通过指令查看性能统计")
+    else:
+        if isinstance(app, FastAPI):
+
+            @app.get(pcr_config.pcr_metrics_path, response_class=PlainTextResponse)
+            async def _():
+                return PlainTextResponse(
+                    metrics_service.export(),
+                    media_type="text/plain; version=0.0.4",
+                )
+
+
+matcher = on_command(
+    "PCR性能统计", aliases={"pcr性能统计"}, permission=SUPERUSER, priority=5
+)
+
+
+@matcher.handle()
+async def _():
+    reports = [
+        metrics_service.report(),
+        cache_service.report(),
+        report_question_queues(),
+    ]
+    await matcher.finish("\n".join(r for r in reports if r))
+
+
+reset_matcher = on_command(
+    "重置PCR性能统计", aliases={"重置pcr性能统计"}, permission=SUPERUSER, priority=5
+)
+
+
+@reset_matcher.handle()
+async def _():
+    metrics_service.reset()
+    await reset_matcher.finish("已重置性能统计")
+
+
+profile_matcher = on_regex(
+    r"^(?:PCR|pcr)性能采样\s*(\d+)?\s*[sS秒]?$", permission=SUPERUSER, priority=5
+)
+
+
+@profile_matcher.handle()
+async def _(group: tuple = RegexGroup()):
+    seconds = int(group[0] or 30)
+    if profiler_service.running:
+        await profile_matcher.finish("已有性能采样正在进行")
+    seconds = min(seconds, profiler_service.max_seconds)
+    await profile_matcher.send(f"开始性能采样 {seconds}s")
+    profile = await profiler_service.profile(seconds)
+    await profile_matcher.finish(profile.report())
@@ -1,11 +1,12 @@
-from nonebot import on_command
+from nonebot import get_driver, on_command
 from nonebot.adapters import Event
 from nonebot.plugin import PluginMetadata
 from nonebot_plugin_saa import Image, Mention, Reply, Text
 from nonebot_plugin_saa.registries import get_message_id
 
 from ..config import pcr_config
-from ..services.portune_service import DailyNumberLimiter, portune_service
+from ..limiter import DailyNumberLimiter, RateLimit
+from ..services.portune_service import portune_service
 
 __plugin_meta__ = PluginMetadata(
     name="pcr_portune",
@@ -14,18 +15,23 @@ __plugin_meta__ = PluginMetadata(
 )
 
 is_reply = pcr_config.pcr_portune_is_reply
-lmt = DailyNumberLimiter(max_num=pcr_config.pcr_portune_limit)
+lmt = DailyNumberLimiter(max_num=pcr_config.pcr_portune_limit, namespace="portune")
+
+
+@get_driver().on_startup
+async def _():
+    # 早高峰前在后台预热底图与文字遮罩
+    portune_service.preload_in_background()
 
 
 pcr_portune = on_command("抽签", aliases={"人品", "运势"}, priority=5)
 
 
 @pcr_portune.handle()
-async def portune(event: Event):
-    if not lmt.check(event.get_user_id()):
+async def portune(event: Event, _limit: None = RateLimit("portune")):
+    if not lmt.try_increase(event.get_user_id()):
         msg = Mention(event.get_user_id()) + Text("你今天已经抽过签了，欢迎明天再来~")
     else:
-        lmt.increase(event.get_user_id())
         pic = portune_service.drawing_pic()
         id = get_message_id(event)
         if is_reply and id:
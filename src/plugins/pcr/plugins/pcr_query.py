@@ -1,13 +1,14 @@
-from nonebot import on_command
+from nonebot import on_command, on_regex
+from nonebot.params import RegexGroup
 from nonebot.plugin import PluginMetadata
 from nonebot_plugin_saa import Image, Text
 
-from ..services.query_service import QueryService
+from ..services.query_service import QueryService, RankServer
 
 __plugin_meta__ = PluginMetadata(
     name="pcr_query",
     description="PCR相关的查询",
-    usage=("[千里眼|rank表]"),
+    usage=("[千里眼|日rank|台rank|国rank]"),
     config=None,
 )
 query = QueryService()
@@ -21,21 +22,33 @@ async def _():
     text, image_list = await query.get_gocha()
     msg = Text(text)
     for image in image_list:
-        with open(image, "rb") as f:
-            img: bytes = f.read()
-        msg += Image(img)
+        msg += Image(image)
     # 发送消息
     await msg.send()
 
 
-"""
-matcher = on_command("rank表", priority=5)
+rank_servers: dict[str, RankServer] = {
+    "日": "jp",
+    "台": "tw",
+    "国": "cn",
+    "陆": "cn",
+    "b": "cn",
+    "B": "cn",
+}
 
+rank_matcher = on_regex(r"^(日|台|国|陆|b|B)?服?rank表?$", priority=5)
 
-@matcher.handle()
-async def _():
+
+@rank_matcher.handle()
+async def _(group: tuple = RegexGroup()):
+    server = rank_servers.get(group[0] or "日", "jp")
+    result = await query.get_rank(server)
+    if result is None:
+        await rank_matcher.finish("暂无该服务器的rank表")
+    text, image_list = result
     # 构造消息
-    msg = Text("【rank表】")
+    msg = Text(text or "【rank表】")
+    for image in image_list:
+        msg += Image(image)
     # 发送消息
     await msg.send(at_sender=True)
-"""
@@ -1,11 +1,13 @@
 from io import BytesIO
 
-from nonebot import on_command
+from nonebot import get_driver, on_command
 from nonebot.adapters import Bot, Event
 from nonebot.plugin import PluginMetadata
 from nonebot_plugin_saa import Image, Text
 from nonebot_plugin_session import EventSession
 
+from ..limiter import RateLimit
+from ..services.icon_tensor_service import icon_tensor_service
 from ..services.sign_service import sign_service as sign
 
 __plugin_meta__ = PluginMetadata(
@@ -16,11 +18,21 @@ __plugin_meta__ = PluginMetadata(
 )
 
 
+@get_driver().on_startup
+async def _():
+    # 生成收集册使用的印章图块
+    icon_tensor_service.preload_in_background("stamp", 80)
+    if sign.bg_mode == 1:
+        # 预先下载并处理网络背景
+        await sign.background_pool.start()
+
+
+sign_limit = RateLimit("sign")
 give_okodokai = on_command("盖章", aliases={"签到", "妈!"}, priority=30, block=True)
 
 
 @give_okodokai.handle()
-async def _(bot: Bot, event: Event, session: EventSession):
+async def _(bot: Bot, event: Event, session: EventSession, _limit: None = sign_limit):
     # 获取群组id and uid
     gid = session.id3 if session.id3 else (session.id2 if session.id2 else None)
     if gid is None:
@@ -49,7 +61,7 @@ storage = on_command(
 
 
 @storage.handle()
-async def _(bot: Bot, event: Event, session: EventSession):
+async def _(bot: Bot, event: Event, session: EventSession, _limit: None = sign_limit):
     # 获取群组id and uid
     gid = session.id3 if session.id3 else (session.id2 if session.id2 else None)
     assert gid
@@ -1,15 +1,20 @@
+import asyncio
+
 from nonebot import on_command
-from nonebot.adapters import Bot, Event
+from nonebot.adapters import Bot, Event, Message
+from nonebot.params import CommandArg
+from nonebot.permission import SUPERUSER
 from nonebot.plugin import PluginMetadata
 from nonebot_plugin_apscheduler import scheduler
 
 from ..config import pcr_config
+from ..services.pack_service import pack_service
 from ..services.update_service import UpdateService, logger
 
 __plugin_meta__ = PluginMetadata(
     name="pcr_update",
     description="用于查看以及更新本地PCR数据",
-    usage="[重载花名册|更新卡池|查看PCR数据]",
+    usage="[重载花名册|更新卡池|查看PCR数据|导入资源包|整理资源包]",
     config=None,
 )
 
@@ -53,6 +58,39 @@ async def _(bot: Bot, event: Event):
     await pcr_update.finish(result)
 
 
+pack_import = on_command("导入资源包", permission=SUPERUSER, priority=5)
+
+
+@pack_import.handle()
+async def _(args: Message = CommandArg()):
+    """
+    将头像、卡面、派生图与印章目录中的文件导入资源包, 参数为 删除原文件 时导入后删除原文件。
+    """
+    remove = args.extract_plain_text().strip() == "删除原文件"
+    result = []
+    for type_ in ("icon", "card", "variant", "stamp"):
+        count = await asyncio.to_thread(pack_service.import_dir, type_, remove)
+        result.append(
+            f"{type_}: 导入{count}个, 共{len(pack_service.get_pack(type_))}个"
+        )
+    await pack_import.finish("\n".join(result))
+
+
+pack_compact = on_command("整理资源包", permission=SUPERUSER, priority=5)
+
+
+@pack_compact.handle()
+async def _():
+    """
+    清除资源包中被覆盖的旧记录。
+    """
+    result = []
+    for type_ in ("icon", "card", "variant", "stamp"):
+        saved = await asyncio.to_thread(pack_service.compact, type_)
+        result.append(f"{type_}: 回收{saved // 1024}KB")
+    await pack_compact.finish("\n".join(result))
+
+
 if pcr_config.pcr_update_is_auto:
     logger.debug("定时更新PCR数据")
 
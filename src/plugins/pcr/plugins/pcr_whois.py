@@ -5,6 +5,7 @@ from nonebot_plugin_saa import Image, Mention, Reply, Text
 from nonebot_plugin_saa.registries import get_message_id
 
 from ..config import pcr_config
+from ..limiter import RateLimit
 from ..services.whois_service import WhoIsService
 
 __plugin_meta__ = PluginMetadata(
@@ -14,24 +15,24 @@ __plugin_meta__ = PluginMetadata(
 )
 
 whois_service = WhoIsService()
+whois_limit = RateLimit(
+    "whois",
+    cd=pcr_config.pcr_whois_cd,
+    group=False,
+    cd_notice="兰德索尔花名册冷却中(剩余 {wait}秒)",
+)
 
 
 whois_matcher = on_regex(r"^(.*)是谁([?？ ])?", priority=5)
 
 
 @whois_matcher.handle()
-async def _(event: Event):
+async def _(event: Event, _limit: None = whois_limit):
     """
     处理 MessageEvent 并从事件的消息中提取名字。
     根据匹配结果发送响应。
     """
-
-    # Add a TODO comment for 花名册cd
-    # TODO: Implement 花名册cd functionality
     user_id = event.get_user_id()
-    if pcr_config.pcr_whois_cd > 0:
-        pass
-
     name = event.get_plaintext().strip()
     name = name.split("是", 1)[0]
     print(name)
@@ -5,6 +5,7 @@ from nonebot.params import ArgPlainText, CommandArg
 from nonebot.plugin import PluginMetadata
 from nonebot_plugin_saa import Image, Text
 
+from ..limiter import RateLimit
 from ..services.wiki_service import WikiService
 
 __plugin_meta__ = PluginMetadata(
@@ -14,6 +15,7 @@ __plugin_meta__ = PluginMetadata(
     config=None,
 )
 wiki = WikiService()
+wiki_limit = RateLimit("wiki")
 
 
 matcher_chara = on_command("查角色", aliases={"查别名"}, priority=5)
@@ -51,7 +53,7 @@ async def _(matcher: Matcher, args: Message = CommandArg()):
 
 
 @matcher_icon.got("name", prompt="请输入角色名")
-async def icon_got_func(name: str = ArgPlainText()):
+async def icon_got_func(name: str = ArgPlainText(), _limit: None = wiki_limit):
     # 获取指定角色对象
     c = await wiki.get_chara(name)
     # 构造消息
@@ -77,7 +79,7 @@ async def _(matcher: Matcher, args: Message = CommandArg()):
 
 
 @matcher_card.got("name", prompt="请输入角色名")
-async def card_got_func(name: str = ArgPlainText()):
+async def card_got_func(name: str = ArgPlainText(), _limit: None = wiki_limit):
     # 获取指定角色对象
     c = await wiki.get_chara(name)
     # 构造消息
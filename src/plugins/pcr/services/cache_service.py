@@ -0,0 +1,288 @@
+import heapq
+import sys
+import threading
+import time
+from collections.abc import Hashable
+from dataclasses import dataclass
+from itertools import count
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+import numpy as np
+from PIL import Image
+
+from ..config import pcr_config
+from ..logger import PCRLogger
+from .metrics_service import metrics_service
+
+logger = PCRLogger("PCR_CACHE")
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def sizeof(value: Any) -> int:
+    """
+    估算缓存值占用的内存(字节), 图像与数组按像素数据计算。
+    """
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in vars(value).values())
+    return sys.getsizeof(value)
+
+
+class Entry:
+    """缓存条目"""
+
+    __slots__ = ("value", "size", "cost", "priority", "version")
+
+    def __init__(self, value: Any, size: int, cost: float) -> None:
+        self.value = value
+        self.size = size
+        self.cost = cost
+        """重新生成该条目的耗时(秒)"""
+        self.priority = 0.0
+        """淘汰优先级, 越小越先淘汰"""
+        self.version = 0
+        """每次访问时更新, 用于识别堆中过期的记录"""
+
+
+@dataclass
+class CacheStats:
+    """单个缓存的统计"""
+
+    name: str
+    weight: float
+    entries: int
+    size: int
+    hits: int
+    misses: int
+    evictions: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class Cache(Generic[K, V]):
+    """
+    注册到缓存服务的单个缓存, 用法与字典相近, 超出总预算时由缓存服务统一淘汰。
+    """
+
+    def __init__(
+        self,
+        service: "CacheService",
+        name: str,
+        weight: float,
+        sizeof: Callable[[V], int],
+    ) -> None:
+        self.service = service
+        self.name = name
+        self.weight = weight
+        """重要程度, 越大越不容易被淘汰"""
+        self.sizeof = sizeof
+        self.entries: dict[K, Entry] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def keys(self) -> list[K]:
+        with self.service.lock:
+            return list(self.entries)
+
+    def get(self, key: K) -> Optional[V]:
+        """
+        查询缓存并记录命中情况, 不存在时返回None。
+        """
+        with self.service.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.service.touch(self, key, entry)
+        metrics_service.cache(self.name, entry is not None)
+        return None if entry is None else entry.value
+
+    def put(self, key: K, value: V, cost: float = 0) -> V:
+        """
+        放入缓存, cost 为生成该值的耗时(秒), 生成代价越高越不容易被淘汰。
+        """
+        entry = Entry(value, self.sizeof(value), cost)
+        with self.service.lock:
+            self.remove(key)
+            self.entries[key] = entry
+            self.size += entry.size
+            self.service.admit(self, key, entry)
+        return value
+
+    def load(self, key: K, factory: Callable[[], V]) -> V:
+        """
+        查询缓存, 不存在时调用 factory 生成并放入缓存, 同时记录生成耗时。
+        """
+        value = self.get(key)
+        if value is None:
+            start = time.perf_counter()
+            value = factory()
+            self.put(key, value, time.perf_counter() - start)
+        return value
+
+    def remove(self, key: K) -> bool:
+        with self.service.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return False
+            self.size -= entry.size
+            self.service.size -= entry.size
+            return True
+
+    def pop(self, key: K) -> Optional[V]:
+        with self.service.lock:
+            entry = self.entries.get(key)
+            self.remove(key)
+        return None if entry is None else entry.value
+
+    def discard(self, predicate: Callable[[K], bool]) -> int:
+        """
+        移除键满足条件的条目, 返回移除的数量。
+        """
+        with self.service.lock:
+            keys = [key for key in self.entries if predicate(key)]
+            for key in keys:
+                self.remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self.service.lock:
+            for key in list(self.entries):
+                self.remove(key)
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            self.name,
+            self.weight,
+            len(self.entries),
+            self.size,
+            self.hits,
+            self.misses,
+            self.evictions,
+        )
+
+
+class CacheService:
+    """缓存服务
+
+    插件内的内存缓存都注册到这里, 共用一个总的内存预算。
+    超出预算时按 GreedyDual-Size 算法淘汰: 条目的优先级为
+    时钟 + 重要程度 x 生成耗时 / 占用大小, 每次访问刷新,
+    淘汰优先级最低的条目并将时钟推进到该优先级,
+    生成代价低、占用大且久未使用的条目先被淘汰。
+    """
+
+    budget: int = pcr_config.pcr_cache_budget_mb * 1024 * 1024
+    """所有缓存的内存预算(字节), 0为不限制"""
+
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.caches: dict[str, Cache] = {}
+        self.size = 0
+        """所有缓存占用的内存(字节)"""
+        self.clock = 0.0
+        self.heap: list[tuple[float, int, Cache, Any]] = []
+        """(优先级, 版本, 缓存, 键), 版本与条目不一致的记录已过期"""
+        self.versions = count()
+
+    def register(
+        self, name: str, weight: float = 1, sizeof: Callable[[Any], int] = sizeof
+    ) -> Cache:
+        """
+        注册缓存, 名称同时用作缓存命中统计的标签, 同名缓存只注册一次。
+        """
+        with self.lock:
+            if name not in self.caches:
+                self.caches[name] = Cache(self, name, weight, sizeof)
+            return self.caches[name]
+
+    def touch(self, cache: Cache, key: Any, entry: Entry) -> None:
+        entry.priority = self.clock + cache.weight * max(entry.cost, 1e-6) / max(
+            entry.size, 1
+        )
+        entry.version = next(self.versions)
+        heapq.heappush(self.heap, (entry.priority, entry.version, cache, key))
+
+    def admit(self, cache: Cache, key: Any, entry: Entry) -> None:
+        self.size += entry.size
+        self.touch(cache, key, entry)
+        self.evict()
+        if len(self.heap) > 4 * sum(len(c) for c in self.caches.values()) + 64:
+            self.compact()
+
+    def evict(self) -> None:
+        """
+        淘汰条目直至不超过预算。
+        """
+        while self.budget and self.size > self.budget and self.heap:
+            priority, version, cache, key = heapq.heappop(self.heap)
+            entry = cache.entries.get(key)
+            if entry is None or entry.version != version:
+                continue
+            self.clock = priority
+            cache.remove(key)
+            cache.evictions += 1
+            logger.debug(f"淘汰缓存 {cache.name} {key!r} ({entry.size}B)")
+            metrics_service.inc("pcr_cache_evictions_total", cache=cache.name)
+
+    def compact(self) -> None:
+        """
+        清理堆中过期的记录。
+        """
+        self.heap = [
+            item
+            for item in self.heap
+            if (entry := item[2].entries.get(item[3])) is not None
+            and entry.version == item[1]
+        ]
+        heapq.heapify(self.heap)
+
+    def stats(self) -> list[CacheStats]:
+        with self.lock:
+            return [cache.stats() for cache in self.caches.values()]
+
+    def report(self) -> str:
+        lines = [
+            f"[缓存占用] {self.size / 1024 / 1024:.1f}MB"
+            + (f" / {self.budget / 1024 / 1024:.0f}MB" if self.budget else "")
+        ]
+        for stat in sorted(self.stats(), key=lambda s: s.size, reverse=True):
+            lines.append(
+                f"  {stat.name}: {stat.entries}项 {stat.size / 1024 / 1024:.1f}MB"
+                f" 命中{stat.hit_rate:.0%} 淘汰{stat.evictions}次"
+            )
+        return "\n".join(lines)
+
+    def collect(self) -> list[tuple[str, dict[str, str], float]]:
+        gauges: list[tuple[str, dict[str, str], float]] = [
+            ("pcr_cache_budget_bytes", {}, self.budget)
+        ]
+        for stat in self.stats():
+            gauges.append(("pcr_cache_bytes", {"cache": stat.name}, stat.size))
+            gauges.append(("pcr_cache_entries", {"cache": stat.name}, stat.entries))
+        return gauges
+
+
+cache_service = CacheService()
+metrics_service.collector(cache_service.collect)
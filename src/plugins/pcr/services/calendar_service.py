@@ -10,10 +10,12 @@ from io import BytesIO
 from pathlib import Path
 
 import aiohttp
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 
 from ..config import pcr_config
 from ..logger import PCRLogger as Logger
+from .font_service import font_service
+from .metrics_service import metrics_service
 
 logger = Logger("PCR-Calendar")
 
@@ -21,8 +23,7 @@ item_height = 45
 pcr_res_path: Path = pcr_config.pcr_resources_path
 """PCR资源存放路径"""
 font_path = pcr_res_path / "calendar" / "wqy-microhei.ttc"
-font = ImageFont.truetype(font_path, int(item_height * 0.67))
-item_height = 45
+font_size = int(item_height * 0.67)
 
 color = [
     {"front": "black", "back": "white"},
@@ -39,8 +40,8 @@ def create_image(item_number, title_len):
     return im
 
 
-def draw_rec(im, color, x, y, w, h, r):
-    draw = ImageDraw.Draw(im)
+def draw_rec(im, color, x, y, w, h, r, draw=None):
+    draw = draw or ImageDraw.Draw(im)
     draw.rectangle((x + r, y, x + w - r, y + h), fill=color)
     draw.rectangle((x, y + r, x + w, y + h - r), fill=color)
     r = r * 2
@@ -50,10 +51,10 @@ def draw_rec(im, color, x, y, w, h, r):
     draw.ellipse((x + w - r, y + h - r, x + w, y + h), fill=color)
 
 
-def draw_text(im, x, y, w, h, text, align, color):
-    draw = ImageDraw.Draw(im)
-    # tw, th = draw.textlength(text, font=font)
-    _, _, tw, th = draw.textbbox((0, 0), text, font=font)
+def draw_text(im, x, y, w, h, text, align, color, draw=None):
+    draw = draw or ImageDraw.Draw(im)
+    font = font_service.get_font(font_path, font_size)
+    _, _, tw, th = font_service.get_bbox(font_path, font_size, text)
     y = y + (h - th) / 2
     if align == 0:  # 居中
         x = x + (w - tw) / 2
@@ -72,10 +73,11 @@ def draw_item(im, n, t, text, days):
 
     width = im.width
     height = int(item_height * 0.95)
+    draw = ImageDraw.Draw(im)
 
-    draw_rec(im, color[t]["back"], x, y, width, height, int(item_height * 0.1))
+    draw_rec(im, color[t]["back"], x, y, width, height, int(item_height * 0.1), draw)
 
-    draw_text(im, x, y, width, height, text, 1, color[t]["front"])
+    draw_text(im, x, y, width, height, text, 1, color[t]["front"], draw)
 
     if days > 0:
         text1 = f"{days}天后结束"
@@ -83,7 +85,7 @@ def draw_item(im, n, t, text, days):
         text1 = f"{-days}天后开始"
     else:
         text1 = "即将结束"
-    draw_text(im, x, y, width, height, text1, 2, color[t]["front"])
+    draw_text(im, x, y, width, height, text1, 2, color[t]["front"], draw)
 
 
 def draw_title(im, n, left=None, middle=None, right=None):
@@ -91,14 +93,15 @@ def draw_title(im, n, left=None, middle=None, right=None):
     y = n * item_height
     width = im.width
     height = int(item_height * 0.95)
+    draw = ImageDraw.Draw(im)
 
-    draw_rec(im, color[0]["back"], x, y, width, height, int(item_height * 0.1))
+    draw_rec(im, color[0]["back"], x, y, width, height, int(item_height * 0.1), draw)
     if middle:
-        draw_text(im, x, y, width, height, middle, 0, color[0]["front"])
+        draw_text(im, x, y, width, height, middle, 0, color[0]["front"], draw)
     if left:
-        draw_text(im, x, y, width, height, left, 1, color[0]["front"])
+        draw_text(im, x, y, width, height, left, 1, color[0]["front"], draw)
     if right:
-        draw_text(im, x, y, width, height, right, 2, color[0]["front"])
+        draw_text(im, x, y, width, height, right, 2, color[0]["front"], draw)
 
 
 translate_list = {
@@ -304,9 +307,10 @@ lock = {
 
 async def query_data(url):
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                return await resp.json()
+        with metrics_service.upstream("calendar"):
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url) as resp:
+                    return await resp.json()
     except Exception:
         pass
     return None
@@ -315,12 +319,13 @@ async def query_data(url):
 async def load_event_bilibili():
     data = ""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                "https://static.biligame.com/pcr/gw/calendar.js"
-            ) as resp:
-                data = await resp.text("utf-8")
-                data = transform_bilibili_calendar(data)
+        with metrics_service.upstream("calendar_bilibili"):
+            async with aiohttp.ClientSession() as session:
+                async with session.get(
+                    "https://static.biligame.com/pcr/gw/calendar.js"
+                ) as resp:
+                    data = await resp.text("utf-8")
+        data = transform_bilibili_calendar(data)
     except Exception:
         print("解析B站日程表失败")
         return 1
@@ -432,10 +437,11 @@ async def load_event_jp():
 async def load_event_gamewith():
     data = ""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://gamewith.jp/pricone-re/") as resp:
-                data = await resp.text("utf-8")
-                data = transform_gamewith_calendar(data)
+        with metrics_service.upstream("calendar_gamewith"):
+            async with aiohttp.ClientSession() as session:
+                async with session.get("https://gamewith.jp/pricone-re/") as resp:
+                    data = await resp.text("utf-8")
+        data = transform_gamewith_calendar(data)
     except Exception:
         print("解析gamewith日程表失败")
         return 1
@@ -543,7 +549,11 @@ async def generate_day_schedule(server="cn"):
             events = event_sb
     else:
         events = await get_events(server, 0, 7)
+    with metrics_service.stage("render", "calendar"):
+        return draw_schedule(server, events)
+
 
+def draw_schedule(server, events):
     has_prediction = False
     title_len = 25
     for event in events:
@@ -2,10 +2,13 @@
 
 import asyncio
 import difflib
+import hashlib
 import json
+from collections import Counter
+from dataclasses import dataclass, field
 from io import BytesIO
 from pathlib import Path
-from typing import Any, Literal, Optional
+from typing import Any, Callable, Literal, Optional, Union
 
 import httpx
 from fuzzywuzzy import fuzz
@@ -15,6 +18,10 @@ from ..config import pcr_config
 from ..logger import PCRLogger as Logger
 from ..models import Chara
 from ..utils import merge_dicts, normalize_str
+from .manifest_service import manifest_service, parse_name
+from .metrics_service import metrics_service
+from .pack_service import pack_service
+from .watch_service import ChangeEvent, watch_service
 
 pcr_data_path: Path = pcr_config.pcr_data_path
 """PCR数据存放路径"""
@@ -30,6 +37,8 @@ online_chara_profile_url = "https://ghproxy.com/https://github.com/Ice9Coffee/La
 """默认PCR角色档案数据url"""
 online_unavailable_chara_url = "https://ghproxy.com/https://github.com/Ice9Coffee/LandosolRoster/blob/master/unavailable_chara.json"
 """默认PCR不可用角色数据url"""
+ICON_SIZES = (64, 80, 128)
+"""头像派生图尺寸"""
 online_pcr_data_url = {
     "chara_name": online_chara_name_url,  # PCR角色名字数据url
     "chara_profile": online_chara_profile_url,  # PCR角色档案数据url
@@ -39,8 +48,61 @@ online_pcr_data_url = {
 }
 
 
+@dataclass
+class DataChange:
+    """一次PCR数据变化"""
+
+    version: int
+    """变化后的数据版本"""
+    names: dict[str, tuple[list[str], list[str]]] = field(default_factory=dict)
+    """角色id -> (移除的名字, 新增的名字), 新增或删除的角色也在其中"""
+    profiles: set[str] = field(default_factory=set)
+    """档案变化的角色id"""
+    pools: set[str] = field(default_factory=set)
+    """内容变化的卡池"""
+    unavailable: bool = False
+    """不可用角色列表是否变化"""
+    roster: set[str] = field(default_factory=set)
+    """花名册中指向的角色发生变化(含新增、删除)的规范化名字"""
+
+    def __bool__(self) -> bool:
+        return bool(self.names or self.profiles or self.pools or self.unavailable)
+
+
+DataCallback = Callable[[DataChange], Any]
+
+
+def diff_names(
+    old: dict[str, list[str]], new: dict[str, list[str]]
+) -> dict[str, tuple[list[str], list[str]]]:
+    """
+    按角色对比名字列表, 返回 角色id -> (移除的名字, 新增的名字)。
+    """
+    changes = {}
+    for id_ in old.keys() | new.keys():
+        before, after = old.get(id_, []), new.get(id_, [])
+        if before == after:
+            continue
+        removed = Counter(before) - Counter(after)
+        added = Counter(after) - Counter(before)
+        if removed or added:
+            changes[id_] = (list(removed.elements()), list(added.elements()))
+    return changes
+
+
+def diff_keys(old: dict, new: dict) -> set[str]:
+    """
+    值有变化(含新增、删除)的键。
+    """
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
 class PCRDataService:
-    """PCR数据服务"""
+    """PCR数据服务
+
+    每次载入数据后与上一版本对比, 将变化的角色、名字、档案与卡池
+    作为 DataChange 通知订阅者, 花名册等派生数据只按变化部分更新。
+    """
 
     CHARA_NAME: dict[str, list[str]] = {}
     """角色名字dict"""
@@ -54,11 +116,24 @@ class PCRDataService:
     """本地卡池dict"""
     LOCAL_POOL_VER: dict[str, str] = {}
     """本地卡池版本号dict"""
+    gadget_path: Path = pcr_res_path / "priconne" / "gadget"
+    """星级、装备等角标图片路径"""
 
     def __init__(self) -> None:
+        self.version = 0
+        """数据版本, 每次数据变化后加一"""
+        self.applied: dict[str, Any] = {}
+        """上一次应用的数据, 用于对比变化"""
+        self.subscribers: list[DataCallback] = []
+        self.CHARA_ROSTER = {}
+        self.roster_owners: dict[str, list[str]] = {}
+        """规范化名字 -> 使用该名字的角色id"""
         pcr_res_path.mkdir(parents=True, exist_ok=True)
         pcr_data_path.mkdir(parents=True, exist_ok=True)
         self.load_pcr_res()
+        # 手动修改本地数据文件后重新载入
+        watch_service.subscribe(pcr_data_path, self.on_change)
+        watch_service.subscribe(self.gadget_path, self.on_gadget_change)
 
     def __repr__(self) -> str:
         return f"CHARA_NAME:{len(self.CHARA_NAME)}, PROFILE:{len(self.CHARA_PROFILE)}, ROSTER:{len(self.CHARA_ROSTER)}, POOL_VER:{self.LOCAL_POOL_VER.get('ver')}"
@@ -83,13 +158,102 @@ class PCRDataService:
                 await self.update_pcr_data(key)
                 self._dict[key] = await self.get_local_pcr_data(key)
             self.CHARA_NAME = self._dict["chara_name"]
+        self.apply_pcr_data()
+        Logger("PCR_DATA").success("Succeeded to load PCR_DATA")
+
+    def apply_pcr_data(self) -> None:
+        """
+        将已读取的数据设置到各属性, 按变化部分更新花名册并通知订阅者。
+        """
+        # 载入过程中 CHARA_NAME 已提前替换, 以上一次应用的数据为准
+        old, new = self.applied, self._dict
+        change = DataChange(
+            version=self.version + 1,
+            names=diff_names(old.get("chara_name", {}), new["chara_name"]),
+            profiles=diff_keys(old.get("chara_profile", {}), new["chara_profile"]),
+            pools=diff_keys(old.get("local_pool", {}), new["local_pool"]),
+            unavailable=old.get("unavailable_chara") != new["unavailable_chara"],
+        )
+        self.applied = dict(new)
+        self.CHARA_NAME = self._dict["chara_name"]
         self.CHARA_PROFILE = self._dict["chara_profile"]
         self.UNAVAILABLE_CHARA = self._dict["unavailable_chara"]
         self.LOCAL_POOL = self._dict["local_pool"]
         self.LOCAL_POOL_VER = self._dict["local_pool_ver"]
-        self.CHARA_ROSTER = self.get_chara_roster()
         Logger("PCR_DATA").info(f"{self}")
-        Logger("PCR_DATA").success("Succeeded to load PCR_DATA")
+        if not change:
+            return
+        change.roster = self.update_roster(change.names)
+        self.version = change.version
+        Logger("PCR_DATA").info(
+            f"数据版本 {change.version}: 角色 {len(change.names)} 档案 {len(change.profiles)}"
+            f" 卡池 {len(change.pools)} 花名册 {len(change.roster)}"
+        )
+        self.publish(change)
+
+    def subscribe(self, callback: DataCallback) -> None:
+        """
+        订阅数据变化, 订阅时已有数据的会立即以全部数据作为变化调用一次。
+        """
+        self.subscribers.append(callback)
+        if self.version:
+            change = DataChange(
+                version=self.version,
+                names={id_: ([], names) for id_, names in self.CHARA_NAME.items()},
+                profiles=set(self.CHARA_PROFILE),
+                pools=set(self.LOCAL_POOL),
+                unavailable=True,
+                roster=set(self.CHARA_ROSTER),
+            )
+            self.notify(callback, change)
+
+    def unsubscribe(self, callback: DataCallback) -> None:
+        self.subscribers = [s for s in self.subscribers if s != callback]
+
+    def publish(self, change: DataChange) -> None:
+        for callback in list(self.subscribers):
+            self.notify(callback, change)
+
+    @staticmethod
+    def notify(callback: DataCallback, change: DataChange) -> None:
+        try:
+            callback(change)
+        except Exception as e:
+            Logger("PCR_DATA").error(f"处理数据版本 {change.version} 的变化失败: {e}")
+
+    async def on_change(self, events: list[ChangeEvent]) -> None:
+        """
+        本地数据文件变化时只重新读取变化的部分, 读取失败或为空时保留原数据。
+        """
+        if not hasattr(self, "_dict"):
+            # 尚未完成首次加载
+            return
+        if any(event.kind == "rescan" for event in events):
+            keys = set(online_pcr_data_url)
+        else:
+            keys = {
+                event.path.stem
+                for event in events
+                if event.kind != "deleted"
+                and event.path.parent == pcr_data_path
+                and event.path.suffix == ".json"
+                and event.path.stem in online_pcr_data_url
+            }
+        changed = False
+        for key in keys:
+            data = await self.get_local_pcr_data(key)  # type: ignore
+            if data and data != self._dict.get(key):
+                self._dict[key] = data
+                changed = True
+        if changed:
+            Logger("PCR_DATA").info(f"本地数据已变化, 重新载入 {', '.join(keys)}")
+            self.apply_pcr_data()
+
+    def on_gadget_change(self, events: list[ChangeEvent]) -> None:
+        """
+        角标图片变化后重新载入。
+        """
+        self.load_pcr_res()
 
     async def get_online_pcr_data(
         self,
@@ -107,19 +271,20 @@ class PCRDataService:
         url = online_pcr_data_url[types]
         Logger(f"{types.upper()}").info(f"开始获取在线PCR数据:{types.upper()}")
         try:
-            async with httpx.AsyncClient(verify=False) as client:
-                response = await client.get(url=url, follow_redirects=True, timeout=30)
-                if response.status_code == 200:
-                    online_pcr_data = response.json()
-                    Logger(f"{types.upper()}").info(
-                        f"获取在线PCR数据:{types.upper()}成功"
-                    )
-                    return online_pcr_data
-                else:
-                    Logger(f"{types.upper()}").error(
-                        f"获取在线PCR数据:{types.upper()}时发生错误{response.status_code}"
+            with metrics_service.upstream("pcr_data"):
+                async with httpx.AsyncClient(verify=False) as client:
+                    response = await client.get(
+                        url=url, follow_redirects=True, timeout=30
                     )
-                    return {}
+            if response.status_code == 200:
+                online_pcr_data = response.json()
+                Logger(f"{types.upper()}").info(f"获取在线PCR数据:{types.upper()}成功")
+                return online_pcr_data
+            else:
+                Logger(f"{types.upper()}").error(
+                    f"获取在线PCR数据:{types.upper()}时发生错误{response.status_code}"
+                )
+                return {}
         except Exception as e:
             Logger(f"{types.upper()}").error(f"获取在线PCR数据时发生错误 {type(e)}")
             raise e
@@ -226,6 +391,49 @@ class PCRDataService:
             json.dump(new_data, file, indent=4, ensure_ascii=False)
         Logger(f"{types.upper()}").info(f"PCR_{types.upper()} 更新完成")
 
+    def update_roster(self, names: dict[str, tuple[list[str], list[str]]]) -> set[str]:
+        """
+        按名字的变化更新花名册, 返回指向的角色有变化的规范化名字。
+
+        重名时与 get_chara_roster 一致, 归属于在角色名字dict中靠前的角色。
+        """
+        touched = set()
+        for id_, (removed, added) in names.items():
+            for n in removed:
+                n = normalize_str(n)
+                owners = self.roster_owners.get(n)
+                if owners and id_ in owners:
+                    owners.remove(id_)
+                    touched.add(n)
+            for n in added:
+                n = normalize_str(n)
+                self.roster_owners.setdefault(n, []).append(id_)
+                touched.add(n)
+        roster = self.CHARA_ROSTER
+        order: Optional[dict[str, int]] = None
+        changed = set()
+        for n in touched:
+            owners = self.roster_owners.get(n)
+            if not owners:
+                self.roster_owners.pop(n, None)
+                owner = None
+            elif len(owners) == 1:
+                owner = owners[0]
+            else:
+                if order is None:
+                    # 只有重名时才需要角色的先后顺序
+                    order = {id_: i for i, id_ in enumerate(self.CHARA_NAME)}
+                positions = order
+                owner = min(owners, key=lambda id_: positions.get(id_, len(positions)))
+            if roster.get(n) == owner:
+                continue
+            if owner is None:
+                del roster[n]
+            else:
+                roster[n] = owner
+            changed.add(n)
+        return changed
+
     def get_chara_roster(self) -> dict:
         """
         生成chara_roster数据
@@ -296,6 +504,32 @@ class CharaDataService:
         self.card_path.mkdir(parents=True, exist_ok=True)
         self.icon_path.mkdir(parents=True, exist_ok=True)
         self.voice_path.mkdir(parents=True, exist_ok=True)
+        # 手动放入、替换或删除原图时更新资源清单与派生图
+        watch_service.subscribe(self.icon_path, self.on_change)
+        watch_service.subscribe(self.card_path, self.on_change)
+        self.choices: list[str] = []
+        """模糊匹配的候选名字, 与花名册同步"""
+        self.choice_set: set[str] = set()
+        pcr_data.subscribe(self.on_data_change)
+
+    def on_data_change(self, change: DataChange) -> None:
+        """
+        花名册变化时只增删变化的候选名字。
+        """
+        roster = pcr_data.CHARA_ROSTER
+        if not self.choices:
+            # 首次载入保持花名册的顺序, 无匹配时以第一个名字兜底
+            self.choices = list(roster)
+            self.choice_set = set(roster)
+            return
+        removed = {n for n in change.roster if n not in roster}
+        if removed:
+            self.choice_set -= removed
+            self.choices = [n for n in self.choices if n not in removed]
+        for n in change.roster:
+            if n in roster and n not in self.choice_set:
+                self.choice_set.add(n)
+                self.choices.append(n)
 
     async def get_chara(
         self,
@@ -322,11 +556,12 @@ class CharaDataService:
         """
         if (id is None) and (name is None):
             raise ValueError("需要提供角色ID或角色名称")
-        if id:
-            c = Chara(id, star, equip, name=pcr_data.CHARA_NAME[id][0])
-        elif name:
-            id = self.name2id(name)
-            c = Chara(id, star, equip, name=pcr_data.CHARA_NAME[id][0])
+        with metrics_service.stage("data", "get_chara"):
+            if id:
+                c = Chara(id, star, equip, name=pcr_data.CHARA_NAME[id][0])
+            elif name:
+                id = self.name2id(name)
+                c = Chara(id, star, equip, name=pcr_data.CHARA_NAME[id][0])
         c.icon = await self.get_chara_icon(c.id, c.star) if need_icon else None
         c.card = (
             await self.get_chara_card(c.id, c.star)
@@ -335,72 +570,236 @@ class CharaDataService:
         )
         return c
 
-    async def get_chara_icon(self, id: str, star: Optional[int] = None) -> BytesIO:
+    async def get_chara_icon(
+        self, id: str, star: Optional[int] = None, size: int = 128
+    ) -> BytesIO:
+        """
+        获取角色头像的PNG派生图。
+
+        参数:
+            star: 星级, 为None时按6星、3星、1星的顺序取本地已有的头像
+            size: 派生图尺寸, 取值见 ICON_SIZES
+        """
+        if size not in ICON_SIZES:
+            raise ValueError(f"不支持的头像尺寸: {size}")
         if id == self.UNKNOWN:
             return BytesIO(pcr_data.unknown_path.read_bytes())
         if star is None:
             # 先从本地缓存中获取
-            icon_path = self.icon_path / f"icon_unit_{id}61.png"
-            if not icon_path.exists():
-                icon_path = self.icon_path / f"icon_unit_{id}31.png"
-            if not icon_path.exists():
-                icon_path = self.icon_path / f"icon_unit_{id}11.png"
-            if not icon_path.exists():
+            star = self.local_icon_star(id)
+            if star is None:
                 # 本地没有，则从网络下载
                 await asyncio.gather(
                     self.download_chara_img(id=id, star=6, type_="icon"),
                     self.download_chara_img(id=id, star=3, type_="icon"),
                     self.download_chara_img(id=id, star=1, type_="icon"),
                 )
-                icon_path = self.icon_path / f"icon_unit_{id}61.png"
-            if not icon_path.exists():
-                icon_path = self.icon_path / f"icon_unit_{id}31.png"
-            if not icon_path.exists():
-                icon_path = self.icon_path / f"icon_unit_{id}11.png"
-            if not icon_path.exists():
+                star = self.local_icon_star(id)
+            if star is None:
                 # 下载失败，使用缺省图标
-                icon_path = pcr_data.unknown_path
-            with open(icon_path, "rb") as f:
-                # 返回图标数据
-                return BytesIO(f.read())
+                return BytesIO(pcr_data.unknown_path.read_bytes())
         else:
             star = 3 if star not in (1, 3, 6) else star
             # 从指定的星级获取图标
-            icon_path = self.icon_path / f"icon_unit_{id}{star}1.png"
-            if icon_path.exists():
-                with open(icon_path, "rb") as f:
-                    return BytesIO(f.read())
-            else:
+            if self.original_name("icon", id, star) is None:
                 # 本地没有，则从网络下载
                 await self.download_chara_img(id=id, star=star, type_="icon")
-                if not icon_path.exists():
-                    return await self.get_chara_icon(id=id)
-            return await self.get_chara_icon(id=id, star=star)
+                if self.original_name("icon", id, star) is None:
+                    return await self.get_chara_icon(id=id, size=size)
+        icon = await self.read_variant("icon", id, star, size)
+        if icon is None:
+            return BytesIO(pcr_data.unknown_path.read_bytes())
+        return BytesIO(icon)
 
-    async def get_chara_card(self, id: str, star: Optional[int] = None) -> BytesIO:
+    def local_icon_star(self, id: str) -> Optional[int]:
+        """
+        按6星、3星、1星的顺序查找本地已有头像的星级。
+        """
+        for star in (6, 3, 1):
+            if self.original_name("icon", id, star) is not None:
+                return star
+        return None
+
+    async def get_chara_card(
+        self,
+        id: str,
+        star: Optional[int] = None,
+        variant: Literal["full", "chat"] = "full",
+    ) -> BytesIO:
         """
         根据指定的ID和星级获取角色卡面。
+
+        参数:
+            variant: full 为上游原图, chat 为适合直接发送的缩小JPEG
         """
         star = 3 if star not in (3, 6) else star
-        card_path = self.card_path / f"card_full_{id}{star}1.png"
+        name = self.original_name("card", id, star)
         # 检查图片是否已经下载
-        if card_path.exists():
-            # 打开图片并返回BytesIO
-            with open(card_path, "rb") as f:
-                return BytesIO(f.read())
+        if name is not None:
+            if variant == "full":
+                card = pack_service.read("card", name)
+            else:
+                card = await self.read_variant("card", id, star, variant)
+            assert card is not None
+            return BytesIO(card)
         else:
             # 如果没有下载,则先下载再返回
             await self.download_chara_img(id=id, star=star, type_="card")
-            if not card_path.exists():
+            if self.original_name("card", id, star) is None:
                 # TODO: 这里应该返回一个默认卡面
-                return await self.get_chara_card(id=id, star=3)
-            # 重新打开图片并返回BytesIO
-            return await self.get_chara_card(id=id, star=star)
+                return await self.get_chara_card(id=id, star=3, variant=variant)
+            # 重新获取图片并返回BytesIO
+            return await self.get_chara_card(id=id, star=star, variant=variant)
+
+    @staticmethod
+    def original_name(
+        type_: Literal["card", "icon"], id: str, star: int
+    ) -> Optional[str]:
+        """
+        本地原图的文件名, 上游WebP原图优先, 其次是旧版本保存的PNG, 都没有时返回None。
+        """
+        entry = manifest_service.get(type_, id, star)
+        if entry is not None:
+            return entry.name
+        if manifest_service.complete:
+            return None
+        # 清单尚未补全时直接查找文件
+        prefix = "icon_unit" if type_ == "icon" else "card_full"
+        for ext in ("webp", "png"):
+            name = f"{prefix}_{id}{star}1.{ext}"
+            if pack_service.exists(type_, name):
+                return name
+        return None
+
+    @staticmethod
+    def variant_name(
+        type_: Literal["card", "icon"], id: str, star: int, variant: Union[int, str]
+    ) -> str:
+        """
+        派生图的文件名。
+        """
+        if type_ == "icon":
+            return f"icon_unit_{id}{star}1_{variant}.png"
+        return f"card_full_{id}{star}1_{variant}.jpg"
+
+    @classmethod
+    def save_original(
+        cls,
+        type_: Literal["card", "icon"],
+        id: str,
+        star: int,
+        name: str,
+        data: bytes,
+    ) -> None:
+        """
+        保存原图, 记录其哈希并生成派生图, 会阻塞, 应在线程中调用。
+        """
+        pack_service.write(type_, name, data)
+        manifest_service.add(name, data)
+        cls.make_variants(type_, id, star, data)
+
+    @classmethod
+    def make_variants(
+        cls,
+        type_: Literal["card", "icon"],
+        id: str,
+        star: int,
+        data: Union[bytes, memoryview],
+    ) -> None:
+        """
+        由原图生成全部派生图, 会阻塞, 应在线程中调用。
+        """
+        img = Image.open(BytesIO(data))
+        if type_ == "icon":
+            img = img.convert("RGBA")
+            for size in ICON_SIZES:
+                out = BytesIO()
+                img.resize((size, size), Image.Resampling.LANCZOS).save(out, "PNG")
+                name = cls.variant_name(type_, id, star, size)
+                pack_service.write("variant", name, out.getvalue())
+        else:
+            width = min(img.width, pcr_config.pcr_card_chat_width)
+            height = round(img.height * width / img.width)
+            out = BytesIO()
+            img.convert("RGB").resize((width, height), Image.Resampling.LANCZOS).save(
+                out, "JPEG", quality=85, optimize=True
+            )
+            name = cls.variant_name(type_, id, star, "chat")
+            pack_service.write("variant", name, out.getvalue())
+
+    async def read_variant(
+        self,
+        type_: Literal["card", "icon"],
+        id: str,
+        star: int,
+        variant: Union[int, str],
+    ) -> Optional[Union[bytes, memoryview]]:
+        """
+        读取派生图, 旧版本保存的原图没有派生图时在线程中补充生成。
+        """
+        name = self.variant_name(type_, id, star, variant)
+        with metrics_service.stage("asset", "read_variant"):
+            data = pack_service.read("variant", name)
+        metrics_service.cache("variant", data is not None)
+        if data is None:
+            original = self.original_name(type_, id, star)
+            if original is None:
+                return None
+            source = pack_service.read(type_, original)
+            if source is None:
+                return None
+            await asyncio.to_thread(self.make_variants, type_, id, star, source)
+            data = pack_service.read("variant", name)
+        return data
+
+    async def on_change(self, events: list[ChangeEvent]) -> None:
+        for event in events:
+            if event.kind == "rescan":
+                manifest_service.scan_in_background()
+                continue
+            parsed = parse_name(event.path.name)
+            if parsed is None or event.path.parent not in (
+                self.icon_path,
+                self.card_path,
+            ):
+                continue
+            type_, _, _ = parsed
+            if pack_service.enabled and event.path.name in pack_service.get_pack(type_):
+                # 资源包中的原图优先, 原文件的变化不影响读取
+                continue
+            if event.kind == "deleted":
+                await asyncio.to_thread(manifest_service.discard, event.path.name)
+            else:
+                await asyncio.to_thread(self.refresh_original, event.path)
+
+    @classmethod
+    def refresh_original(cls, path: Path) -> None:
+        """
+        原图被放入或替换后重新记录哈希并生成派生图, 内容与清单一致时跳过,
+        会阻塞, 应在线程中调用。
+        """
+        parsed = parse_name(path.name)
+        if parsed is None:
+            return
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return
+        entry = manifest_service.names.get(path.name)
+        if entry is not None and entry.sha256 == hashlib.sha256(data).hexdigest():
+            # 本插件自己保存的原图
+            return
+        type_, id_, star = parsed
+        manifest_service.add(path.name, data)
+        current = manifest_service.get(type_, id_, star)
+        if current is not None and current.name == path.name:
+            cls.make_variants(type_, id_, star, data)
+        Logger("CHARA_DATA").info(f"原图 {path.name} 已变化, 重新生成派生图")
 
     @staticmethod
     async def download_chara_img(id: str, star: int, type_: Literal["card", "icon"]):
         """
-        从指定的URL下载角色图像并将其保存到本地。
+        从指定的URL下载角色图像, 保存上游的WebP原图、记录哈希并生成派生图。
 
         参数:
             id (str): 角色的ID。
@@ -412,26 +811,29 @@ class CharaDataService:
         """
         if type_ == "icon":
             url = f"https://redive.estertion.win/icon/unit/{id}{star}1.webp"
-            save_path = (
-                pcr_res_path / "priconne" / "icon" / f"icon_unit_{id}{star}1.png"
-            )
+            save_name = f"icon_unit_{id}{star}1.webp"
         elif type_ == "card":
             url = f"https://redive.estertion.win/card/full/{id}{star}1.webp"
-            save_path = (
-                pcr_res_path / "priconne" / "card" / f"card_full_{id}{star}1.png"
-            )
+            save_name = f"card_full_{id}{star}1.webp"
 
-        if save_path.exists():
+        if CharaDataService.original_name(type_, id, star) is not None:
             Logger(f"CHARA_{type_.upper()}").debug(f"Chara {id} {type_}已存在")
             return
         Logger(f"CHARA_{type_.upper()}").info(f"Downloading Chara {type_} from {url}")
         try:
-            async with httpx.AsyncClient(verify=False) as client:
-                rsp = await client.get(url, timeout=10)
+            with metrics_service.upstream("chara_img"):
+                async with httpx.AsyncClient(verify=False) as client:
+                    rsp = await client.get(url, timeout=10)
             if 200 == rsp.status_code:
-                img = Image.open(BytesIO(rsp.content))
-                img.save(save_path)
-                Logger(f"CHARA_{type_.upper()}").info(f"Saved to {save_path}")
+                await asyncio.to_thread(
+                    CharaDataService.save_original,
+                    type_,
+                    id,
+                    star,
+                    save_name,
+                    rsp.content,
+                )
+                Logger(f"CHARA_{type_.upper()}").info(f"Saved {save_name}")
             else:
                 Logger(f"CHARA_{type_.upper()}").error(
                     f"Failed to download {url}. HTTP {rsp.status_code}"
@@ -482,22 +884,19 @@ class CharaDataService:
         else:
             return not ((1000 < int(id_) < 1214) or (1700 < int(id_) < 1900))
 
-    @staticmethod
-    def match(
-        query: str, choices: list[str] = list(pcr_data.CHARA_ROSTER.keys())
-    ) -> tuple[str, int]:
+    def match(self, query: str, choices: Optional[list[str]] = None) -> tuple[str, int]:
         """
         匹配给定的查询字符串和选项列表，并返回最佳匹配项及其相似度评分。
 
         参数：
             query (str)：要匹配的查询字符串。
-            choices (list)：要与之匹配的选项列表。
+            choices (list)：要与之匹配的选项列表, 默认为花名册中的全部名字。
 
         返回：
             tuple：包含最佳匹配项（str）和相似度评分（int）的元组。
         """
         if not choices:
-            choices = list(pcr_data.CHARA_ROSTER.keys())
+            choices = self.choices
         query = normalize_str(query)
         match = difflib.get_close_matches(query, choices, 1, cutoff=0.6)
         if match:
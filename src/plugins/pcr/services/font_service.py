@@ -0,0 +1,95 @@
+import os
+from pathlib import Path
+from typing import Any, Literal, Union
+
+from PIL import ImageFont
+
+from ..config import pcr_config
+from ..logger import PCRLogger
+from .cache_service import cache_service
+from .watch_service import ChangeEvent, watch_service
+
+logger = PCRLogger("PCR_FONT")
+
+FONT_SUFFIXES = {".ttf", ".ttc", ".otf"}
+
+
+class FontService:
+    """字体服务
+
+    按 (字体路径, 字号) 缓存已加载的字体, 并缓存文本测量结果,
+    避免每次绘图都重新解析字体文件。
+    """
+
+    def __init__(self) -> None:
+        self.font_cache = cache_service.register(
+            "font", weight=4, sizeof=lambda font: os.path.getsize(font.path)
+        )
+        """字体缓存, 占用按字体文件大小估算"""
+        self.metrics_cache = cache_service.register("font_metrics", sizeof=lambda _: 64)
+        """文本测量结果缓存"""
+        # 字体文件被替换时清除对应缓存
+        watch_service.subscribe(pcr_config.pcr_resources_path, self.on_change)
+
+    def get_font(self, path: Union[str, Path], size: int) -> ImageFont.FreeTypeFont:
+        """
+        获取指定路径与字号的字体, 首次获取时加载。
+        """
+
+        def load() -> ImageFont.FreeTypeFont:
+            logger.debug(f"加载字体 {path} 字号 {size}")
+            return ImageFont.truetype(str(path), size)
+
+        return self.font_cache.load((str(path), size), load)
+
+    def get_bbox(
+        self, path: Union[str, Path], size: int, text: str
+    ) -> tuple[float, float, float, float]:
+        """
+        获取文本以左上角为锚点时的包围盒 (left, top, right, bottom)。
+        """
+        return self._measure("bbox", path, size, text)
+
+    def get_length(self, path: Union[str, Path], size: int, text: str) -> float:
+        """
+        获取文本的绘制宽度。
+        """
+        return self._measure("length", path, size, text)
+
+    def _measure(
+        self,
+        kind: Literal["bbox", "length"],
+        path: Union[str, Path],
+        size: int,
+        text: str,
+    ) -> Any:
+        key = (kind, str(path), size, text)
+
+        def measure() -> Any:
+            font = self.get_font(path, size)
+            return font.getbbox(text) if kind == "bbox" else font.getlength(text)
+
+        return self.metrics_cache.load(key, measure)
+
+    def clear(self, path: Union[str, Path, None] = None) -> None:
+        """
+        清除字体缓存, 指定路径时仅清除该字体的缓存。
+        """
+        if path is None:
+            self.font_cache.clear()
+            self.metrics_cache.clear()
+            return
+        path = str(path)
+        self.font_cache.discard(lambda k: k[0] == path)
+        self.metrics_cache.discard(lambda k: k[1] == path)
+
+    def on_change(self, events: list[ChangeEvent]) -> None:
+        for event in events:
+            if event.kind == "rescan":
+                self.clear()
+            elif event.path.suffix.lower() in FONT_SUFFIXES:
+                logger.info(f"字体 {event.path.name} 已变化, 清除缓存")
+                self.clear(event.path)
+
+
+font_service = FontService()
@@ -1,16 +1,21 @@
 import random
 import sqlite3
+from functools import lru_cache
 from io import BytesIO
 from pathlib import Path
 from typing import List, Optional, Tuple
 
+import numpy as np
 from PIL import Image
 
 from ..config import pcr_config
 from ..logger import PCRLogger
 from ..models import Chara, GachaTenjouResult
-from .data_service import chara_data
+from .data_service import DataChange, chara_data
 from .data_service import pcr_data as pcr
+from .icon_tensor_service import blend, flatten, icon_tensor_service
+from .metrics_service import metrics_service
+from .watch_service import ChangeEvent, watch_service
 
 pcr_res_path: Path = pcr_config.pcr_resources_path
 pcr_data_path: Path = pcr_config.pcr_data_path
@@ -178,7 +183,16 @@ class Gacha:
 
 class GachaService:
     def __init__(self):
-        self.local_pool = pcr.LOCAL_POOL.copy()
+        self.pools: dict[str, Gacha] = {}
+        """卡池名 -> 卡池, 卡池数据变化时只重建变化的卡池"""
+        pcr.subscribe(self.on_data_change)
+
+    def on_data_change(self, change: DataChange) -> None:
+        for pool_name in change.pools:
+            if pool_name in pcr.LOCAL_POOL:
+                self.pools[pool_name] = Gacha(pool_name=pool_name)
+            else:
+                self.pools.pop(pool_name, None)
 
     async def draw_gacha(
         self,
@@ -187,15 +201,11 @@ class GachaService:
         """
         绘制抽卡结果
         """
-        pics = []
-        step = 5
-        length = len(c_list)
-        for i in range(0, length, step):
-            j = min(length, i + step)
-            pics.append(gen_team_pic(c_list[i:j], star_slot_verbose=False))
-        res = concat_pic(pics)
+        with metrics_service.stage("render", "gacha"):
+            res = compose_team_sheet(c_list, step=5, star_slot_verbose=False)
         bytes = BytesIO()
-        res.save(bytes, format="png")
+        with metrics_service.stage("encode", "gacha"):
+            res.save(bytes, format="png")
         bytes.seek(0)
         return bytes
 
@@ -203,10 +213,10 @@ class GachaService:
         """
         获取群组对应的卡池
         """
-        pool_name = self.db.get_pool(gid=gid)
-        if pool_name:
-            return Gacha(pool_name=pool_name)
-        return Gacha()
+        pool_name = self.db.get_pool(gid=gid) or "BL"
+        gacha = self.pools.get(pool_name)
+        # 卡池已被删除时与原先一样退回BL卡池
+        return gacha if gacha is not None else Gacha(pool_name=pool_name)
 
     async def set_gacha(self, gid: str, pool_name: str) -> None:
         """
@@ -251,6 +261,88 @@ def gen_team_pic(team, size=64, star_slot_verbose=True) -> Image.Image:
     return des
 
 
+@lru_cache(maxsize=64)
+def render_badge(
+    size: int, star: int, equip: int, star_slot_verbose: bool = True
+) -> Image.Image:
+    """
+    绘制头像上的星级与装备角标, 返回透明底的图层。
+    """
+    badge = Image.new("RGBA", (size, size), (0, 0, 0, 0))  # type: ignore
+    l_ = size // 6
+    star_lap = round(l_ * 0.15)
+    margin_x = (size - 6 * l_) // 2
+    margin_y = round(size * 0.05)
+    if star:
+        for i in range(5 if star_slot_verbose else min(star, 5)):
+            a = i * (l_ - star_lap) + margin_x
+            b = size - l_ - margin_y
+            s = pcr.gadget_star if star > i else pcr.gadget_star_dis
+            s = s.convert("RGBA").resize((l_, l_), Image.Resampling.LANCZOS)
+            badge.alpha_composite(s, (a, b))
+        if 6 == star:
+            a = 5 * (l_ - star_lap) + margin_x
+            b = size - l_ - margin_y
+            s = pcr.gadget_star_pink
+            s = s.convert("RGBA").resize((l_, l_), Image.Resampling.LANCZOS)
+            badge.alpha_composite(s, (a, b))
+    if equip:
+        l_ = round(l_ * 1.5)
+        a = margin_x
+        b = margin_x
+        s = pcr.gadget_equip.convert("RGBA").resize((l_, l_), Image.Resampling.LANCZOS)
+        badge.alpha_composite(s, (a, b))
+    return badge
+
+
+def on_gadget_change(events: list[ChangeEvent]) -> None:
+    """
+    角标图片变化后清除已绘制的角标。
+    """
+    render_badge.cache_clear()
+
+
+# pcr_data 先订阅, 回调时角标图片已重新载入
+watch_service.subscribe(pcr.gadget_path, on_gadget_change)
+
+
+def compose_team_sheet(
+    c_list: List[Chara],
+    size: int = 64,
+    step: int = 5,
+    border: int = 5,
+    star_slot_verbose: bool = False,
+) -> Image.Image:
+    """
+    以数组运算一次拼出抽卡结果, 效果与逐个 gen_team_pic 再 concat_pic 相同。
+
+    头像取自预生成的图块存储, 角标按 (星级, 装备) 缓存, 所有头像与白底的混合、
+    角标的叠加以及排版都在同一批整数数组运算中完成。
+    """
+    tiles = icon_tensor_service.chara_tiles(c_list, size)
+    badges = np.stack(
+        [
+            np.asarray(render_badge(size, c.star, c.equip, star_slot_verbose))
+            for c in c_list
+        ]
+    )
+    rgb = blend(badges, flatten(tiles))
+    # 宽度与首行相同, 不足一行时只有实际的头像数
+    cols = min(len(c_list), step)
+    rows = -(-len(c_list) // cols)
+    # 末行不足时以白色补齐
+    padded = np.full((rows * cols, size, size, 3), 255, dtype=np.uint8)
+    padded[: len(c_list)] = rgb
+    sheet = np.full((rows, size + border, cols * size, 3), 255, dtype=np.uint8)
+    sheet[:, :size] = (
+        padded.reshape(rows, cols, size, size, 3)
+        .transpose(0, 2, 1, 3, 4)
+        .reshape(rows, size, cols * size, 3)
+    )
+    sheet = sheet.reshape(rows * (size + border), cols * size, 3)[:-border]
+    return Image.fromarray(sheet)
+
+
 def render_icon(c: Chara, size: int, star_slot_verbose: bool = True) -> Image.Image:
     """
     Renders an icon for the given character with the specified size.
@@ -268,27 +360,5 @@ def render_icon(c: Chara, size: int, star_slot_verbose: bool = True) -> Image.Im
         .convert("RGBA")
         .resize((size, size), Image.Resampling.LANCZOS)
     )
-    l_ = size // 6
-    star_lap = round(l_ * 0.15)
-    margin_x = (size - 6 * l_) // 2
-    margin_y = round(size * 0.05)
-    if c.star:
-        for i in range(5 if star_slot_verbose else min(c.star, 5)):
-            a = i * (l_ - star_lap) + margin_x
-            b = size - l_ - margin_y
-            s = pcr.gadget_star if c.star > i else pcr.gadget_star_dis
-            s = s.resize((l_, l_), Image.Resampling.LANCZOS)
-            pic.paste(s, (a, b, a + l_, b + l_), s)
-        if 6 == c.star:
-            a = 5 * (l_ - star_lap) + margin_x
-            b = size - l_ - margin_y
-            s = pcr.gadget_star_pink
-            s = s.resize((l_, l_), Image.Resampling.LANCZOS)
-            pic.paste(s, (a, b, a + l_, b + l_), s)
-    if c.equip:
-        l_ = round(l_ * 1.5)
-        a = margin_x
-        b = margin_x
-        s = pcr.gadget_equip.resize((l_, l_), Image.Resampling.LANCZOS)
-        pic.paste(s, (a, b, a + l_, b + l_), s)
+    pic.alpha_composite(render_badge(size, c.star, c.equip, star_slot_verbose))
     return pic
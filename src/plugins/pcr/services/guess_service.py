@@ -1,14 +1,24 @@
+import asyncio
+import heapq
+import itertools
 import random
 import sqlite3
+import time
+from collections import deque
+from functools import partial
 from io import BytesIO
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Hashable, Literal, Optional
 
 from PIL import Image
 
+from ..config import pcr_config
 from ..logger import PCRLogger as Logger
-from ..models import GuessGame
+from ..models import Chara, GuessGame
 from .data_service import chara_data, pcr_data
+from .metrics_service import Gauge, metrics_service
+from .pack_service import pack_service
+from .saliency_service import saliency_service
 
 logger = Logger("PCR_GUESS")
 
@@ -65,10 +75,196 @@ class Dao:
             return r
 
 
+class GuessTimer:
+    """
+    猜谜游戏计时器。
+
+    所有游戏的超时共用一个最小堆, 事件循环上始终只挂一个定时回调(最早的截止时间)。
+    """
+
+    def __init__(self) -> None:
+        self.heap: list[tuple[float, int, Hashable]] = []
+        """(截止时间, 序号, key) 最小堆"""
+        self.callbacks: dict[Hashable, tuple[int, Callable[[], Awaitable[Any]]]] = {}
+        """key -> (序号, 回调), 序号不一致的堆元素视为已取消"""
+        self.counter = itertools.count()
+        self.handle: Optional[asyncio.TimerHandle] = None
+        self.tasks: set[asyncio.Task] = set()
+
+    def schedule(
+        self, key: Hashable, delay: float, callback: Callable[[], Awaitable[Any]]
+    ) -> None:
+        """
+        在delay秒后执行回调, 同一key重复设置时覆盖之前的回调。
+        """
+        loop = asyncio.get_running_loop()
+        seq = next(self.counter)
+        self.callbacks[key] = (seq, callback)
+        heapq.heappush(self.heap, (loop.time() + delay, seq, key))
+        self._arm(loop)
+
+    def cancel(self, key: Hashable) -> None:
+        """
+        取消回调, 堆中的元素在到期时惰性丢弃。
+        """
+        self.callbacks.pop(key, None)
+
+    def _is_alive(self, seq: int, key: Hashable) -> bool:
+        entry = self.callbacks.get(key)
+        return entry is not None and entry[0] == seq
+
+    def _arm(self, loop: asyncio.AbstractEventLoop) -> None:
+        # 丢弃堆顶已取消的元素
+        while self.heap and not self._is_alive(self.heap[0][1], self.heap[0][2]):
+            heapq.heappop(self.heap)
+        if self.handle:
+            if self.heap and self.handle.when() <= self.heap[0][0]:
+                return
+            self.handle.cancel()
+            self.handle = None
+        if self.heap:
+            self.handle = loop.call_at(self.heap[0][0], self._fire, loop)
+
+    def _fire(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.handle = None
+        now = loop.time()
+        while self.heap and self.heap[0][0] <= now:
+            _, seq, key = heapq.heappop(self.heap)
+            if not self._is_alive(seq, key):
+                continue
+            _, callback = self.callbacks.pop(key)
+            task = loop.create_task(self._run(key, callback))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        self._arm(loop)
+
+    @staticmethod
+    async def _run(key: Hashable, callback: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            await callback()
+        except Exception as e:
+            logger.exception(f"猜谜游戏计时回调 {key} 执行失败: {e}")
+
+
+guess_timer = GuessTimer()
+
+
+class QuestionQueue:
+    """
+    题目预生成队列。
+
+    队列中保持若干道已生成好的题目(答案角色 + 编码后的裁剪图片),
+    取出题目后在后台补充, 冷启动时也能立即出题。
+    """
+
+    depth: int = pcr_config.pcr_guess_prefetch
+    """预生成题目数"""
+
+    def __init__(
+        self, name: str, factory: Callable[[], Awaitable[tuple[Chara, bytes]]]
+    ) -> None:
+        self.name = name
+        self.factory = factory
+        self.questions: deque[tuple[Chara, bytes]] = deque()
+        self.task: Optional[asyncio.Task] = None
+        self.hits = 0
+        """直接从队列取出题目的次数"""
+        self.misses = 0
+        """队列为空时现场生成题目的次数"""
+        self.refill_latency = 0.0
+        """最近一次生成题目耗时(秒)"""
+
+    async def get(self, blacklist: Optional[list] = None) -> tuple[Chara, bytes]:
+        """
+        取出一道题目, 队列为空时现场生成。
+        """
+        question = None
+        for i, (c, _) in enumerate(self.questions):
+            # 答案在黑名单中的题目留在队列里, 供其他群使用
+            if not blacklist or c.id not in blacklist:
+                question = self.questions[i]
+                del self.questions[i]
+                break
+        metrics_service.cache(f"guess_{self.name}", question is not None)
+        if question is None:
+            self.misses += 1
+            question = await self.factory()
+            while blacklist and question[0].id in blacklist:
+                question = await self.factory()
+        else:
+            self.hits += 1
+        self.refill()
+        return question
+
+    def refill(self) -> None:
+        """
+        在后台补充题目。
+        """
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._refill())
+
+    async def _refill(self) -> None:
+        while len(self.questions) < self.depth:
+            start = time.perf_counter()
+            try:
+                question = await self.factory()
+            except Exception as e:
+                logger.error(f"预生成题目 {self.name} 失败: {e}")
+                return
+            self.refill_latency = time.perf_counter() - start
+            self.questions.append(question)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        队列状态。
+        """
+        return {
+            "depth": len(self.questions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refill_latency": self.refill_latency,
+        }
+
+
+question_queues: dict[tuple[str, int], QuestionQueue] = {}
+"""(题目类型, 裁剪尺寸) -> 题目队列"""
+
+
+@metrics_service.collector
+def collect_question_queues() -> list[Gauge]:
+    gauges: list[Gauge] = []
+    for queue in question_queues.values():
+        stats = queue.stats()
+        labels = {"queue": queue.name}
+        gauges.append(("pcr_guess_queue_depth", labels, stats["depth"]))
+        gauges.append(("pcr_guess_refill_seconds", labels, stats["refill_latency"]))
+    return gauges
+
+
+def report_question_queues() -> str:
+    """
+    各题目队列的当前深度、命中与最近一次生成耗时。
+    """
+    if not question_queues:
+        return ""
+    lines = ["[猜谜题目队列]"]
+    for queue in question_queues.values():
+        stats = queue.stats()
+        total = stats["hits"] + stats["misses"]
+        lines.append(
+            f"  {queue.name}: {stats['depth']}/{queue.depth}题"
+            f" 命中{stats['hits'] / total if total else 0:.0%}"
+            f" ({stats['hits']}/{total})"
+            f" 生成耗时{stats['refill_latency'] * 1000:.0f}ms"
+        )
+    return "\n".join(lines)
+
+
 class GuessService:
     def __init__(self, db_path: Path):
         self.db_path = db_path
-        self.playing = {}
+        self.playing: dict[str, GuessGame] = {}
+        self.index_task: Optional[asyncio.Task] = None
 
     def is_playing(self, gid: str) -> bool:
         """
@@ -76,11 +272,29 @@ class GuessService:
         """
         return gid in self.playing
 
-    def end_game(self, gid: str) -> None:
+    def end_game(self, gid: str) -> Optional[GuessGame]:
         """
-        结束指定gid的游戏。
+        结束指定gid的游戏并取消其计时, 返回被结束的游戏, 游戏已结束时返回None。
         """
-        del self.playing[gid]
+        guess_timer.cancel((self.db_path, gid))
+        return self.playing.pop(gid, None)
+
+    def set_timeout(
+        self, gid: str, seconds: float, callback: Callable[[], Awaitable[Any]]
+    ) -> None:
+        """
+        为指定gid的游戏设置计时回调, 覆盖之前的计时。
+        """
+        guess_timer.schedule((self.db_path, gid), seconds, callback)
+
+    async def check_message(self, gid: str, user_answer: str) -> bool:
+        """
+        检查消息是否答对了指定gid正在进行的游戏, 只查找该群的游戏。
+        """
+        game = self.playing.get(gid)
+        if game is None or game.winner:
+            return False
+        return await self.check_answer(user_answer, game)
 
     def get_game(self, gid: str) -> Optional[GuessGame]:
         """
@@ -115,27 +329,13 @@ class GuessService:
         返回:
             AvatarGuessGame: 猜头像游戏对象。
         """
-        # 随机选择一个角色作为答案
-        ids = list(pcr_data.CHARA_NAME.keys())
-        id_ = random.choice(ids)
-        while chara_data.is_npc(id_) or id_ in blacklist:
-            id_ = random.choice(ids)
-        c = await chara_data.get_chara(
-            id=id_, star=random.choice((1, 3, 6)), need_icon=True
-        )
-        answer = c
-        # 生成题目图片
-        img = Image.open(c.icon)
-        w, h = img.size
-        l = random.randint(0, w - patch_size)  # noqa: E741
-        u = random.randint(0, h - patch_size)
-        img = img.crop((l, u, l + patch_size, u + patch_size))
-        img_bytes = BytesIO()
-        img.save(img_bytes, format="PNG")
-        img_bytes.seek(0)
-        question = img_bytes
+        # 从预生成队列中取出题目
+        queue = self.get_question_queue("avatar", patch_size)
+        answer, question = await queue.get(blacklist)
         # 创建游戏
-        game = GuessGame(gid=gid, winner=None, answer=answer, question=question)
+        game = GuessGame(
+            gid=gid, winner=None, answer=answer, question=BytesIO(question)
+        )
         self.playing[gid] = game
         return game
 
@@ -151,29 +351,111 @@ class GuessService:
         返回:
             CardGuessGame: 猜卡面游戏对象。
         """
-        # 随机选择一个角色作为答案
+        # 从预生成队列中取出题目
+        queue = self.get_question_queue("card", pic_side_length)
+        answer, question = await queue.get(blacklist)
+        # 创建游戏
+        game = GuessGame(
+            gid=gid, winner=None, answer=answer, question=BytesIO(question)
+        )
+        self.playing[gid] = game
+        return game
+
+    def get_question_queue(
+        self, type_: Literal["avatar", "card"], side_length: int
+    ) -> "QuestionQueue":
+        """
+        获取指定类型与裁剪尺寸的题目队列, 所有群共用。
+        """
+        key = (type_, side_length)
+        if key not in question_queues:
+            if type_ == "avatar":
+                factory = partial(self.make_avatar_question, side_length)
+            else:
+                factory = partial(self.make_card_question, side_length)
+            question_queues[key] = QuestionQueue(f"{type_}_{side_length}", factory)
+        return question_queues[key]
+
+    @staticmethod
+    def random_chara_id(blacklist: Optional[list] = None) -> str:
+        """
+        随机选择一个非NPC角色的ID。
+        """
         ids = list(pcr_data.CHARA_NAME.keys())
         id_ = random.choice(ids)
-        while chara_data.is_npc(id_) or id_ in blacklist:
+        while chara_data.is_npc(id_) or (blacklist and id_ in blacklist):
             id_ = random.choice(ids)
+        return id_
+
+    def build_saliency_index(
+        self, type_: Literal["avatar", "card"], side_length: int
+    ) -> None:
+        """
+        在后台线程中为全部头像或卡面建立裁剪索引。
+        """
+        # 猜头像使用128px派生图出题, 猜卡面使用原图出题
+        if type_ == "avatar":
+            pack_type = "variant"
+            names = [
+                name
+                for name in pack_service.names(pack_type)
+                if name.startswith("icon_unit_") and name.endswith("_128.png")
+            ]
+        else:
+            pack_type = "card"
+            names = pack_service.names(pack_type)
+        assets = ((name, pack_service.read(pack_type, name) or b"") for name in names)
+        self.index_task = asyncio.create_task(
+            asyncio.to_thread(saliency_service.build_all, assets, side_length)
+        )
+
+    @staticmethod
+    def crop_question(name: str, image: BytesIO, side_length: int) -> bytes:
+        """
+        从图片的高信息量区域中随机裁剪一块正方形并编码为PNG。
+
+        参数:
+            name: 图片在资源包中的名称, 用作裁剪索引的键
+        """
+        positions = saliency_service.get_positions(name, image, side_length)
+        x, y = positions[random.randrange(len(positions))]
+        l, u = int(x), int(y)  # noqa: E741
+        img = Image.open(image)
+        img = img.crop((l, u, l + side_length, u + side_length))
+        img_bytes = BytesIO()
+        with metrics_service.stage("encode", "guess"):
+            img.save(img_bytes, format="PNG")
+        return img_bytes.getvalue()
+
+    async def make_avatar_question(self, patch_size: int) -> tuple[Chara, bytes]:
+        """
+        生成一道猜头像题目。
+        """
+        # 随机选择一个角色作为答案
         c = await chara_data.get_chara(
-            id=id_, star=random.choice((3, 6)), need_card=True
+            id=self.random_chara_id(), star=random.choice((1, 3, 6)), need_icon=True
         )
-        answer = c
+        assert c.icon is not None
         # 生成题目图片
-        img = Image.open(c.card)
-        w, h = img.size
-        l = random.randint(0, w - pic_side_length)  # noqa: E741
-        u = random.randint(0, h - pic_side_length)
-        img = img.crop((l, u, l + pic_side_length, u + pic_side_length))
-        img_bytes = BytesIO()
-        img.save(img_bytes, format="PNG")
-        img_bytes.seek(0)
-        q_image = img_bytes
-        # 创建游戏
-        game = GuessGame(gid=gid, winner=None, answer=answer, question=q_image)
-        self.playing[gid] = game
-        return game
+        name = chara_data.variant_name("icon", c.id, c.star, 128)
+        question = await asyncio.to_thread(self.crop_question, name, c.icon, patch_size)
+        return c, question
+
+    async def make_card_question(self, pic_side_length: int) -> tuple[Chara, bytes]:
+        """
+        生成一道猜卡面题目。
+        """
+        # 随机选择一个角色作为答案
+        c = await chara_data.get_chara(
+            id=self.random_chara_id(), star=random.choice((3, 6)), need_card=True
+        )
+        assert c.card is not None
+        # 生成题目图片
+        name = chara_data.original_name("card", c.id, c.star) or ""
+        question = await asyncio.to_thread(
+            self.crop_question, name, c.card, pic_side_length
+        )
+        return c, question
 
     async def start_desc_game(self, gid: str) -> GuessGame:
         """
@@ -0,0 +1,295 @@
+import asyncio
+import json
+import os
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+from ..config import pcr_config
+from ..logger import PCRLogger
+from ..models import Chara
+from .pack_service import PackType, pack_service
+from .watch_service import ChangeEvent, watch_service
+
+pcr_data_path: Path = pcr_config.pcr_data_path
+"""PCR数据存放路径"""
+
+logger = PCRLogger("PCR_TENSOR")
+
+
+def decode_tile(data: Union[bytes, memoryview, BytesIO], size: int) -> np.ndarray:
+    """
+    解码图片并缩放为 size x size 的 RGBA 数组。
+    """
+    fp = data if isinstance(data, BytesIO) else BytesIO(data)
+    img = Image.open(fp).convert("RGBA").resize((size, size), Image.Resampling.LANCZOS)
+    return np.asarray(img, dtype=np.uint8)
+
+
+def div255(x: np.ndarray) -> np.ndarray:
+    """
+    整数数组除以255并四舍五入, 输入不超过 255 * 255。
+    """
+    x = x + 128
+    return ((x + (x >> 8)) >> 8).astype(np.uint8)
+
+
+def flatten(tiles: np.ndarray, background: int = 255) -> np.ndarray:
+    """
+    将 RGBA 数组按透明度混合到纯色背景上, 返回 RGB 数组。
+    """
+    a = tiles[..., 3:].astype(np.uint16)
+    return div255(tiles[..., :3] * a + background * (255 - a))
+
+
+def blend(top: np.ndarray, bottom: np.ndarray) -> np.ndarray:
+    """
+    将 RGBA 数组 top 按透明度叠加到不透明的 RGB 数组 bottom 上。
+    """
+    a = top[..., 3:].astype(np.uint16)
+    return div255(top[..., :3] * a + bottom * (255 - a))
+
+
+def to_grey(rgb: np.ndarray) -> np.ndarray:
+    """
+    与 PIL 的 convert("L") 相同的灰度转换, 返回与输入形状相同的 RGB 数组。
+    """
+    r, g, b = (rgb[..., i].astype(np.uint32) for i in range(3))
+    grey = ((r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16).astype(np.uint8)
+    return np.repeat(grey[..., None], 3, axis=-1)
+
+
+class TileStore:
+    """图块存储
+
+    将同一类资源统一缩放为 size x size 后连续存放在一个 N x size x size x 4 的
+    uint8 数组中, 以原始字节文件保存并通过 mmap 读写, 另存 名称 -> 行号 的索引。
+    资源增删或变化时只解码涉及的资源, 写入空闲行或追加到文件末尾。
+    """
+
+    def __init__(self, path: Path, kind: PackType, size: int):
+        self.kind = kind
+        self.size = size
+        self.array_path = path / f"{kind}_{size}.bin"
+        """数组文件路径"""
+        self.index_path = path / f"{kind}_{size}.json"
+        """索引文件路径"""
+        self.rows: np.ndarray = np.zeros((0, size, size, 4), dtype=np.uint8)
+        self.index: dict[str, int] = {}
+        """名称 -> 行号, 每次更新整体替换, 不在原字典上修改"""
+        self.stale: set[str] = set()
+        """更新期间被移除的资源, 本次更新的结果不再写入"""
+        self.lock = threading.Lock()
+        """保护索引的读改写"""
+        self.updating = threading.Lock()
+        """同一时间只进行一次更新"""
+
+    def open(self) -> np.ndarray:
+        """
+        以可写 mmap 打开数组文件。
+        """
+        tile = self.size * self.size * 4
+        num = self.array_path.stat().st_size // tile
+        if num == 0:
+            return np.zeros((0, self.size, self.size, 4), dtype=np.uint8)
+        return np.memmap(
+            self.array_path,
+            dtype=np.uint8,
+            mode="r+",
+            shape=(num, self.size, self.size, 4),
+        )
+
+    def load(self) -> None:
+        """
+        加载图块, 只解码新增或变化的资源, 文件缺失或损坏时重新生成。
+        """
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            rows = self.open()
+            if any(row >= len(rows) for row in index.values()):
+                raise ValueError("图块文件不完整")
+        except (OSError, ValueError):
+            self.array_path.parent.mkdir(parents=True, exist_ok=True)
+            # 旧版以 .npy 保存的图块
+            self.array_path.with_suffix(".npy").unlink(missing_ok=True)
+            self.array_path.write_bytes(b"")
+            index, rows = {}, self.open()
+        self.rows = rows
+        self.index = index
+        self.update(pack_service.names(self.kind))
+
+    def decode(self, name: str) -> np.ndarray:
+        data = pack_service.read(self.kind, name)
+        try:
+            return decode_tile(data, self.size)  # type: ignore
+        except Exception as e:
+            logger.error(f"解码 {name} 失败: {e}")
+            return np.zeros((self.size, self.size, 4), dtype=np.uint8)
+
+    def update(self, names: list[str]) -> None:
+        """
+        使图块与资源列表一致: 移除已删除的资源, 解码缺少的资源。
+        """
+        with self.updating:
+            with self.lock:
+                wanted = set(names)
+                removed = [name for name in self.index if name not in wanted]
+                missing = [name for name in names if name not in self.index]
+                self.stale.clear()
+            if not removed and not missing:
+                return
+            # 解码耗时较长, 不持有锁
+            tiles = {name: self.decode(name) for name in missing}
+            with self.lock:
+                index = {
+                    name: row for name, row in self.index.items() if name in wanted
+                }
+                used = set(index.values())
+                free = [row for row in range(len(self.rows)) if row not in used]
+                appended = []
+                for name, tile in tiles.items():
+                    if name in self.stale:
+                        continue
+                    if free:
+                        row = free.pop(0)
+                        self.rows[row] = tile
+                    else:
+                        row = len(self.rows) + len(appended)
+                        appended.append(tile)
+                    index[name] = row
+                if isinstance(self.rows, np.memmap):
+                    self.rows.flush()
+                if appended:
+                    with open(self.array_path, "ab") as f:
+                        for tile in appended:
+                            f.write(tile.tobytes())
+                    self.rows = self.open()
+                # 先写入图块再写入索引, 中途退出时索引不会指向不完整的行
+                tmp = self.index_path.with_suffix(".json.tmp")
+                tmp.write_text(json.dumps(index), encoding="utf-8")
+                os.replace(tmp, self.index_path)
+                self.index = index
+        logger.info(
+            f"更新 {self.kind} {self.size}px 图块: 解码 {len(missing)} 个,"
+            f" 移除 {len(removed)} 个, 共 {len(index)} 个"
+        )
+
+    def discard(self, names: Iterable[str]) -> None:
+        """
+        移除已变化资源的图块, 同时更新索引文件, 下次更新时重新解码。
+        """
+        with self.lock:
+            names = set(names)
+            self.stale |= names
+            if not names & self.index.keys():
+                return
+            self.index = {
+                name: row for name, row in self.index.items() if name not in names
+            }
+            self.index_path.write_text(json.dumps(self.index), encoding="utf-8")
+
+    def get(self, name: str) -> Optional[np.ndarray]:
+        """
+        获取单个图块, 不存在时返回None。
+        """
+        row = self.index.get(name)
+        return None if row is None else self.rows[row]
+
+    def take(self, names: list[str]) -> np.ndarray:
+        """
+        按名称顺序取出多个图块, 返回 (len(names), size, size, 4) 的数组。
+        """
+        rows = [self.index[name] for name in names]
+        # 先取行号再取数组, 追加后的数组总是包含之前的所有行
+        return self.rows[rows]
+
+
+class IconTensorService:
+    """图块存储服务, 为抽卡结果与收集册提供整块拼接所需的图块"""
+
+    cache_path: Path = pcr_data_path / "tiles"
+    """图块存放路径"""
+
+    def __init__(self) -> None:
+        self.stores: dict[tuple[PackType, int], TileStore] = {}
+        self.tasks: set[asyncio.Task] = set()
+        # 资源变化后移除对应图块并在后台重新生成
+        for kind in ("icon", "stamp"):
+            watch_service.subscribe(
+                pack_service.source_path[kind], self.on_change_handler(kind)
+            )
+
+    def on_change_handler(self, kind: PackType):
+        def on_change(events: list[ChangeEvent]) -> None:
+            self.invalidate(kind, [event.path for event in events])
+
+        return on_change
+
+    def invalidate(self, kind: PackType, paths: list[Path]) -> None:
+        """
+        让已加载的图块中变化的资源失效, 在后台只重新解码这些资源。
+        """
+        source = pack_service.source_path[kind]
+        rescan = source in paths
+        names = [p.relative_to(source).as_posix() for p in paths if p != source]
+        for key, store in list(self.stores.items()):
+            if key[0] != kind:
+                continue
+            store.discard(list(store.index) if rescan else names)
+            self.preload_in_background(*key)
+
+    def preload_in_background(self, kind: PackType, size: int) -> None:
+        """
+        在后台线程中加载图块, 完成前拼图时退回逐张解码。
+        """
+        task = asyncio.create_task(asyncio.to_thread(self.preload, kind, size))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def preload(self, kind: PackType, size: int) -> TileStore:
+        """
+        加载(必要时生成)图块, 已加载时只更新变化的资源, 应在后台线程中调用。
+        """
+        store = self.stores.get((kind, size))
+        if store is not None:
+            store.update(pack_service.names(kind))
+            return store
+        store = TileStore(self.cache_path, kind, size)
+        store.load()
+        self.stores[(kind, size)] = store
+        return store
+
+    def get_store(self, kind: PackType, size: int) -> Optional[TileStore]:
+        """
+        获取已加载的图块存储, 尚未加载时返回None。
+        """
+        return self.stores.get((kind, size))
+
+    def chara_tiles(self, charas: list[Chara], size: int) -> np.ndarray:
+        """
+        获取角色头像图块, 未预生成的头像从 Chara.icon 现场解码。
+        """
+        store = self.get_store("icon", size)
+        tiles = np.empty((len(charas), size, size, 4), dtype=np.uint8)
+        for i, c in enumerate(charas):
+            tile = None
+            if store is not None:
+                # 只取与 get_chara_icon 相同星级的图块, 该星级缺失时
+                # Chara.icon 可能来自其他星级或缺省图标, 以其为准
+                star = 3 if c.star not in (1, 3, 6) else c.star
+                tile = store.get(f"icon_unit_{c.id}{star}1.webp")
+                if tile is None:
+                    tile = store.get(f"icon_unit_{c.id}{star}1.png")
+            if tile is None:
+                assert c.icon is not None
+                c.icon.seek(0)
+                tile = decode_tile(c.icon, size)
+            tiles[i] = tile
+        return tiles
+
+
+icon_tensor_service = IconTensorService()
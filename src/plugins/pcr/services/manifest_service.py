@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, Literal, NamedTuple, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+from ..config import pcr_config
+from ..logger import PCRLogger
+from .pack_service import pack_service
+
+pcr_data_path: Path = pcr_config.pcr_data_path
+"""PCR数据存放路径"""
+
+logger = PCRLogger("PCR_MANIFEST")
+
+AssetType = Literal["icon", "card"]
+
+NAME_PATTERN = re.compile(r"^(icon_unit|card_full)_(\d+)(\d)1\.(webp|png)$")
+"""原图文件名: 前缀_角色ID星级1.扩展名"""
+
+
+class AssetEntry(NamedTuple):
+    """原图记录"""
+
+    name: str
+    type: str
+    id: str
+    star: int
+    sha256: str
+    dhash: int
+
+
+def parse_name(name: str) -> Optional[tuple[AssetType, str, int]]:
+    """
+    从原图文件名解析 (类型, 角色ID, 星级), 不是原图时返回None。
+    """
+    m = NAME_PATTERN.match(name)
+    if m is None:
+        return None
+    type_: AssetType = "icon" if m.group(1) == "icon_unit" else "card"
+    return type_, m.group(2), int(m.group(3))
+
+
+def dhash(images: Union[Image.Image, list[Image.Image]]) -> np.ndarray:
+    """
+    计算64位差异哈希, 多张图片缩放后在一次数组运算中完成比较。
+    """
+    if isinstance(images, Image.Image):
+        images = [images]
+    grey = np.stack(
+        [
+            np.asarray(
+                img.convert("L").resize((9, 8), Image.Resampling.LANCZOS),
+                dtype=np.int16,
+            )
+            for img in images
+        ]
+    )
+    bits = (grey[:, :, 1:] > grey[:, :, :-1]).reshape(len(images), 64)
+    return np.packbits(bits, axis=1).view(">u8").ravel()
+
+
+def to_signed(h: int) -> int:
+    """
+    SQLite 整数为有符号64位, 存储前转换。
+    """
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def hamming(a: int, b: int) -> int:
+    """
+    两个哈希之间不同的位数。
+    """
+    return bin(a ^ b).count("1")
+
+
+class ManifestService:
+    """资源清单服务
+
+    下载原图时计算内容哈希(sha256)与感知哈希(dHash)并记录在清单中,
+    之后查询某角色有哪些星级的原图、哪些星级的画面实际相同都只需查清单,
+    不必读取或哈希图片。清单常驻内存, 同时保存在SQLite中。
+    """
+
+    db_path: Path = pcr_data_path / "asset_manifest.db"
+    """清单数据库路径"""
+    similar_bits: int = 5
+    """dHash 相差不超过此位数时视为同一张画面"""
+
+    def __init__(self) -> None:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.entries: dict[tuple[str, str, int], AssetEntry] = {}
+        """(类型, 角色ID, 星级) -> 原图记录"""
+        self.names: dict[str, AssetEntry] = {}
+        """原图文件名 -> 原图记录"""
+        self.complete = False
+        """是否已为本地全部原图建立记录, 之后未记录即视为不存在"""
+        self.task: Optional[asyncio.Task] = None
+        self._create_table()
+        self._load()
+
+    def connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def _create_table(self):
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS asset "
+                "(name TEXT NOT NULL PRIMARY KEY, type TEXT NOT NULL, id TEXT NOT NULL, "
+                "star INT NOT NULL, sha256 TEXT NOT NULL, dhash INT NOT NULL)"
+            )
+
+    def _load(self) -> None:
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT name, type, id, star, sha256, dhash FROM asset"
+            ).fetchall()
+        for row in rows:
+            entry = AssetEntry(*row[:5], row[5] & 0xFFFFFFFFFFFFFFFF)
+            self._put(entry)
+
+    def _put(self, entry: AssetEntry) -> None:
+        self.names[entry.name] = entry
+        key = (entry.type, entry.id, entry.star)
+        old = self.entries.get(key)
+        # 同一星级同时存在WebP与旧版PNG时以WebP为准
+        if old is None or old.name == entry.name or entry.name.endswith(".webp"):
+            self.entries[key] = entry
+
+    def add_many(self, assets: Iterable[tuple[str, Union[bytes, memoryview]]]) -> int:
+        """
+        为一批原图计算哈希并写入清单, 会阻塞, 应在线程中调用。
+        """
+        entries = []
+        images = []
+        for name, data in assets:
+            parsed = parse_name(name)
+            if parsed is None:
+                continue
+            try:
+                images.append(Image.open(BytesIO(data)))
+            except Exception as e:
+                logger.error(f"读取 {name} 失败: {e}")
+                continue
+            type_, id_, star = parsed
+            sha256 = hashlib.sha256(data).hexdigest()
+            entries.append((name, type_, id_, star, sha256))
+        if not entries:
+            return 0
+        hashes = dhash(images)
+        new = [AssetEntry(*e, int(h)) for e, h in zip(entries, hashes)]
+        with self.lock:
+            with self.connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO asset (name, type, id, star, sha256, dhash) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(*e[:5], to_signed(e.dhash)) for e in new],
+                )
+            for entry in new:
+                self._put(entry)
+        return len(new)
+
+    def add(self, name: str, data: Union[bytes, memoryview]) -> None:
+        """
+        记录单张原图, 会阻塞, 应在线程中调用。
+        """
+        self.add_many(((name, data),))
+
+    def discard(self, name: str) -> None:
+        """
+        移除原图记录, 同星级另一种格式的原图仍有记录时改用该记录。
+        """
+        with self.lock:
+            entry = self.names.pop(name, None)
+            if entry is None:
+                return
+            with self.connect() as conn:
+                conn.execute("DELETE FROM asset WHERE name = ?", (name,))
+            key = (entry.type, entry.id, entry.star)
+            if self.entries.get(key) == entry:
+                del self.entries[key]
+                for other in self.names.values():
+                    if (other.type, other.id, other.star) == key:
+                        self._put(other)
+
+    def get(self, type_: AssetType, id: str, star: int) -> Optional[AssetEntry]:
+        """
+        获取原图记录。
+        """
+        return self.entries.get((type_, id, star))
+
+    def distinct_stars(
+        self, type_: AssetType, id: str, stars: Iterable[int]
+    ) -> list[int]:
+        """
+        按给定顺序返回画面互不相同的星级, 内容或感知哈希相同的星级只保留第一个。
+        """
+        result: list[AssetEntry] = []
+        for star in stars:
+            entry = self.get(type_, id, star)
+            if entry is None:
+                continue
+            if any(
+                entry.sha256 == e.sha256
+                or hamming(entry.dhash, e.dhash) <= self.similar_bits
+                for e in result
+            ):
+                continue
+            result.append(entry)
+        return [e.star for e in result]
+
+    def scan(self) -> int:
+        """
+        为尚未记录的本地原图建立记录, 返回新记录数, 会阻塞, 应在线程中调用。
+        """
+        count = 0
+        for type_ in ("icon", "card"):
+            names = [
+                name
+                for name in pack_service.names(type_)
+                if name not in self.names and parse_name(name) is not None
+            ]
+            # 分批读取, 避免一次性载入全部图片
+            for i in range(0, len(names), 64):
+                batch = names[i : i + 64]
+                count += self.add_many(
+                    (name, pack_service.read(type_, name) or b"") for name in batch
+                )
+        self.complete = True
+        if count:
+            logger.info(f"资源清单新增 {count} 条记录")
+        return count
+
+    def scan_in_background(self) -> None:
+        """
+        在后台线程中补全清单。
+        """
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(asyncio.to_thread(self.scan))
+
+
+manifest_service = ManifestService()
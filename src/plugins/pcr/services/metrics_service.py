@@ -0,0 +1,307 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+
+from ..config import pcr_config
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+"""直方图各桶的上限(秒)"""
+
+HELP = {
+    "pcr_command_seconds": "PCR指令从匹配到处理结束的耗时",
+    "pcr_command_errors_total": "PCR指令处理时抛出异常的次数",
+    "pcr_rate_limited_total": "被限流拒绝的请求数",
+    "pcr_stage_seconds": "PCR内部各阶段的耗时",
+    "pcr_api_seconds": "调用机器人API(发送消息等)的耗时",
+    "pcr_upstream_seconds": "请求外部数据源的耗时",
+    "pcr_upstream_errors_total": "请求外部数据源失败的次数",
+    "pcr_cache_requests_total": "PCR缓存的查询次数",
+    "pcr_cache_evictions_total": "超出内存预算时淘汰的缓存条目数",
+    "pcr_cache_bytes": "PCR缓存占用的内存(估算)",
+    "pcr_cache_entries": "PCR缓存的条目数",
+    "pcr_cache_budget_bytes": "PCR缓存的内存预算",
+    "pcr_guess_queue_depth": "猜谜题目队列中已生成的题目数",
+    "pcr_guess_refill_seconds": "猜谜题目队列最近一次生成题目的耗时",
+    "pcr_loop_lag_seconds": "事件循环的调度延迟",
+    "pcr_loop_stalls_total": "事件循环阻塞超过阈值的次数",
+}
+"""指标说明"""
+
+Labels = tuple[tuple[str, str], ...]
+Gauge = tuple[str, dict[str, str], float]
+
+
+class Histogram:
+    """固定分桶的直方图"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        按桶估计分位数, 返回所在桶的上限。
+        """
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+
+class Timer:
+    """计时上下文, 退出时记录耗时, 抛出异常时另记一次错误"""
+
+    __slots__ = ("service", "name", "labels", "error_name", "start")
+
+    def __init__(
+        self,
+        service: "MetricsService",
+        name: str,
+        labels: Labels,
+        error_name: Optional[str] = None,
+    ) -> None:
+        self.service = service
+        self.name = name
+        self.labels = labels
+        self.error_name = error_name
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.service._observe(self.name, self.labels, time.perf_counter() - self.start)
+        if exc_type is not None and self.error_name is not None:
+            self.service._inc(self.error_name, self.labels, 1)
+
+
+class MetricsService:
+    """性能统计服务
+
+    在进程内累计指令耗时、内部各阶段耗时、外部请求耗时与缓存命中次数,
+    可导出为 Prometheus 文本格式, 也可生成简要的文字报告。
+    每次记录只有一次计时与一次加锁的计数, 可常驻开启。
+    """
+
+    enabled: bool = pcr_config.pcr_metrics
+    """是否记录"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.started = time.time()
+        """开始统计的时间"""
+        self.collectors: list[Callable[[], Iterable[Gauge]]] = []
+        """导出时调用, 返回 (指标名, 标签, 当前值) 的瞬时值"""
+
+    @staticmethod
+    def labels(**labels: str) -> Labels:
+        return tuple(sorted(labels.items()))
+
+    def _observe(self, name: str, labels: Labels, value: float) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram()
+            histogram.observe(value)
+
+    def _inc(self, name: str, labels: Labels, value: float) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        记录一次耗时(秒)。
+        """
+        self._observe(name, self.labels(**labels), value)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """
+        计数加一。
+        """
+        self._inc(name, self.labels(**labels), value)
+
+    def stage(self, stage: str, op: str) -> Timer:
+        """
+        统计内部阶段的耗时, stage 为 data/asset/render/encode 之一。
+        """
+        return Timer(self, "pcr_stage_seconds", self.labels(stage=stage, op=op))
+
+    def upstream(self, source: str) -> Timer:
+        """
+        统计外部请求的耗时, 抛出异常时计为一次失败。
+        """
+        return Timer(
+            self,
+            "pcr_upstream_seconds",
+            self.labels(source=source),
+            "pcr_upstream_errors_total",
+        )
+
+    def cache(self, cache: str, hit: bool) -> None:
+        """
+        记录一次缓存查询。
+        """
+        result = "hit" if hit else "miss"
+        self._inc(
+            "pcr_cache_requests_total", self.labels(cache=cache, result=result), 1
+        )
+
+    def collector(
+        self, func: Callable[[], Iterable[Gauge]]
+    ) -> Callable[[], Iterable[Gauge]]:
+        """
+        注册瞬时值的采集函数, 可作为装饰器使用。
+        """
+        self.collectors.append(func)
+        return func
+
+    def reset(self) -> None:
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.started = time.time()
+
+    @staticmethod
+    def format_labels(labels: Labels, extra: str = "") -> str:
+        items = [f'{k}="{v}"' for k, v in labels]
+        if extra:
+            items.append(extra)
+        return "{" + ",".join(items) + "}" if items else ""
+
+    def export(self) -> str:
+        """
+        导出为 Prometheus 文本格式。
+        """
+        with self.lock:
+            histograms = {
+                k: (list(v.counts), v.sum, v.count) for k, v in self.histograms.items()
+            }
+            counters = dict(self.counters)
+        lines = []
+        for name in sorted({k[0] for k in histograms}):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (n, labels), (counts, total, count) in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, c in zip((*BUCKETS, "+Inf"), counts):
+                    cumulative += c
+                    le = self.format_labels(labels, f'le="{bound}"')
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                lines.append(f"{name}_sum{self.format_labels(labels)} {total}")
+                lines.append(f"{name}_count{self.format_labels(labels)} {count}")
+        for name in sorted({k[0] for k in counters}):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{self.format_labels(labels)} {value}")
+        gauges: dict[str, list[tuple[Labels, float]]] = {}
+        for collect in self.collectors:
+            for name, labels, value in collect():
+                gauges.setdefault(name, []).append((self.labels(**labels), value))
+        for name, rows in sorted(gauges.items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(rows):
+                lines.append(f"{name}{self.format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def report(self, limit: int = 10) -> str:
+        """
+        生成文字报告: 指令与耗时最多的阶段的次数、平均与P95耗时, 以及缓存命中率。
+        """
+        with self.lock:
+            histograms = list(self.histograms.items())
+            counters = dict(self.counters)
+        minutes = (time.time() - self.started) / 60
+        lines = [f"统计时长 {minutes:.0f} 分钟"]
+
+        def section(title: str, name: str, key: str) -> None:
+            rows = [(dict(labels), h) for (n, labels), h in histograms if n == name]
+            if not rows:
+                return
+            rows.sort(key=lambda r: r[1].sum, reverse=True)
+            lines.append(title)
+            for labels, h in rows[:limit]:
+                label = "/".join(labels[k] for k in key.split("/") if k in labels)
+                avg = h.sum / h.count * 1000
+                p95 = h.quantile(0.95) * 1000
+                lines.append(f"  {label}: {h.count}次 平均{avg:.0f}ms P95≤{p95:.0f}ms")
+
+        section("[指令]", "pcr_command_seconds", "matcher")
+        section("[阶段]", "pcr_stage_seconds", "stage/op")
+        section("[外部请求]", "pcr_upstream_seconds", "source")
+        for (name, labels), h in histograms:
+            if name == "pcr_loop_lag_seconds":
+                lines.append(
+                    f"[事件循环] 延迟P95≤{h.quantile(0.95) * 1000:.0f}ms"
+                    f" P99≤{h.quantile(0.99) * 1000:.0f}ms"
+                )
+        stalls = [
+            (dict(labels), value)
+            for (name, labels), value in counters.items()
+            if name == "pcr_loop_stalls_total"
+        ]
+        if stalls:
+            lines.append("[事件循环阻塞]")
+            stalls.sort(key=lambda r: r[1], reverse=True)
+            for labels, value in stalls[:limit]:
+                lines.append(
+                    f"  {labels['matcher']}/{labels['service']}: {value:.0f}次"
+                )
+        caches: dict[str, list[float]] = {}
+        for (name, labels), value in counters.items():
+            if name != "pcr_cache_requests_total":
+                continue
+            d = dict(labels)
+            stat = caches.setdefault(d["cache"], [0, 0])
+            stat[0 if d["result"] == "hit" else 1] += value
+        if caches:
+            lines.append("[缓存命中率]")
+            for cache, (hit, miss) in sorted(caches.items()):
+                lines.append(
+                    f"  {cache}: {hit / (hit + miss):.0%} ({hit:.0f}/{hit + miss:.0f})"
+                )
+        limited = [
+            (dict(labels), value)
+            for (name, labels), value in counters.items()
+            if name == "pcr_rate_limited_total"
+        ]
+        if limited:
+            lines.append("[限流拒绝]")
+            limited.sort(key=lambda r: r[1], reverse=True)
+            for labels, value in limited[:limit]:
+                lines.append(f"  {labels['rule']}/{labels['kind']}: {value:.0f}次")
+        errors = {
+            dict(labels).get("matcher") or dict(labels).get("source"): value
+            for (name, labels), value in counters.items()
+            if name in ("pcr_command_errors_total", "pcr_upstream_errors_total")
+        }
+        if errors:
+            lines.append("[错误]")
+            for key, value in sorted(errors.items()):
+                lines.append(f"  {key}: {value:.0f}次")
+        return "\n".join(lines)
+
+
+metrics_service = MetricsService()
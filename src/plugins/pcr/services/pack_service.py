@@ -0,0 +1,370 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Iterable, Literal, Optional, Union
+
+from ..config import pcr_config
+from ..logger import PCRLogger
+
+pcr_res_path: Path = pcr_config.pcr_resources_path
+"""PCR资源存放路径"""
+
+logger = PCRLogger("PCR_PACK")
+
+PackType = Literal["icon", "card", "stamp", "variant"]
+
+MAGIC = b"PCRPACK1"
+RECORD = struct.Struct("<HI")
+"""记录头: 名称长度, 数据长度"""
+
+
+class AssetPack:
+    """资源包
+
+    数据文件以 MAGIC 开头, 之后依次存放 [记录头][名称][数据], 只追加不修改,
+    同名记录以最后一条为准。数据文件本身即是追加日志, 索引文件只是其检查点,
+    保存每个名称的 (偏移, 长度) 与检查点时的数据文件大小; 加载时只需扫描检查点之后
+    追加的记录, 检查点无效时(如整理中途退出)重新扫描整个数据文件。
+    读取时通过 mmap 直接返回 memoryview, 不产生拷贝。
+    """
+
+    checkpoint_bytes: int = 4 << 20
+    """检查点之后追加的数据超过该字节数时重写索引文件"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        """数据文件路径"""
+        self.index_path = path.with_suffix(".idx")
+        """索引文件路径"""
+        self.index: dict[str, tuple[int, int]] = {}
+        """名称 -> (数据偏移, 数据长度)"""
+        self.size = 0
+        """数据文件中有效内容的大小"""
+        self.indexed = 0
+        """索引文件覆盖的数据文件大小"""
+        self.mm: Optional[mmap.mmap] = None
+        self.mapped = 0
+        """当前映射的大小, 读取超出该范围的记录时重新映射"""
+        self.lock = threading.Lock()
+        """派生图在线程中生成, 追加与整理需要互斥"""
+        self.load()
+
+    def load(self) -> None:
+        """
+        加载索引并映射数据文件。
+        """
+        if not self.path.exists():
+            self.index, self.size, self.indexed = {}, 0, 0
+            self._map()
+            return
+        size = self.path.stat().st_size
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if not len(MAGIC) <= data["size"] <= size:
+                raise ValueError("索引超出数据文件大小")
+            self.index = {k: (v[0], v[1]) for k, v in data["index"].items()}
+            self.size = self.indexed = data["size"]
+        except (OSError, ValueError, KeyError):
+            self.scan()
+            self.save_index()
+        else:
+            if self.size < size and not self.scan(self.size):
+                # 检查点之后的内容无法解析, 索引与数据文件不匹配
+                self.scan()
+                self.save_index()
+        self._map()
+
+    def scan(self, offset: int = 0) -> bool:
+        """
+        扫描数据文件更新索引, 丢弃末尾不完整的记录。
+
+        参数:
+            offset: 从该位置开始扫描追加的记录, 为0时重建整个索引
+
+        返回:
+            从 offset 开始扫描时, 遇到无法解析的记录则返回False且不修改索引
+        """
+        file_size = self.path.stat().st_size
+        index: dict[str, tuple[int, int]] = {}
+        tail = offset > 0
+        with open(self.path, "rb") as f:
+            if not tail:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{self.path.name} 不是有效的资源包")
+                offset = len(MAGIC)
+                self.index = {}
+            else:
+                f.seek(offset)
+            while offset + RECORD.size <= file_size:
+                name_len, data_len = RECORD.unpack(f.read(RECORD.size))
+                start = offset + RECORD.size + name_len
+                if start + data_len > file_size:
+                    break
+                try:
+                    name = f.read(name_len).decode("utf-8")
+                except UnicodeDecodeError:
+                    if tail:
+                        return False
+                    break
+                f.seek(data_len, os.SEEK_CUR)
+                index[name] = (start, data_len)
+                offset = start + data_len
+        if offset != file_size:
+            logger.warning(f"{self.path.name} 末尾存在不完整的记录, 已忽略")
+        self.index.update(index)
+        self.size = offset
+        return True
+
+    def save_index(self) -> None:
+        """
+        写入索引文件, 先写临时文件再替换。
+        """
+        tmp = self.index_path.with_suffix(".idx.tmp")
+        tmp.write_text(
+            json.dumps({"size": self.size, "index": self.index}), encoding="utf-8"
+        )
+        os.replace(tmp, self.index_path)
+        self.indexed = self.size
+
+    def _map(self) -> None:
+        self._unmap()
+        if self.size <= len(MAGIC):
+            return
+        with open(self.path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ)
+        self.mapped = self.size
+
+    def _unmap(self) -> None:
+        if self.mm is None:
+            return
+        try:
+            self.mm.close()
+        except BufferError:
+            # 仍有 memoryview 引用旧的映射, 交给垃圾回收关闭
+            pass
+        self.mm = None
+        self.mapped = 0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def names(self) -> list[str]:
+        """
+        包内全部资源名称。
+        """
+        return sorted(self.index)
+
+    def read(self, name: str) -> Optional[memoryview]:
+        """
+        读取资源, 不存在时返回None。
+        """
+        # 追加与整理会重新映射数据文件, 取得 memoryview 前不能关闭旧的映射
+        with self.lock:
+            return self._read(name)
+
+    def _read(self, name: str) -> Optional[memoryview]:
+        if name not in self.index:
+            return None
+        offset, length = self.index[name]
+        if offset + length > self.mapped:
+            # 追加后不立即重新映射, 读到新记录时才映射
+            self._map()
+        assert self.mm is not None
+        return memoryview(self.mm)[offset : offset + length]
+
+    def add(self, items: Iterable[tuple[str, bytes]]) -> int:
+        """
+        追加一批资源, 返回追加的数量。
+
+        记录写入数据文件即视为完成, 检查点之后追加的数据超过 checkpoint_bytes
+        时才重写索引文件。
+        """
+        with self.lock:
+            return self._add(items)
+
+    def _add(self, items: Iterable[tuple[str, bytes]]) -> int:
+        count = 0
+        mode = "r+b" if self.path.exists() else "w+b"
+        with open(self.path, mode) as f:
+            if self.size == 0:
+                f.write(MAGIC)
+                self.size = len(MAGIC)
+            f.seek(self.size)
+            # 截掉可能残留的不完整记录
+            f.truncate()
+            for name, data in items:
+                raw = name.encode("utf-8")
+                f.write(RECORD.pack(len(raw), len(data)))
+                f.write(raw)
+                f.write(data)
+                start = self.size + RECORD.size + len(raw)
+                self.index[name] = (start, len(data))
+                self.size = start + len(data)
+                count += 1
+        if self.size - self.indexed >= self.checkpoint_bytes:
+            self.save_index()
+        return count
+
+    def append(self, name: str, data: bytes) -> None:
+        """
+        追加单个资源。
+        """
+        self.add(((name, data),))
+
+    @property
+    def garbage(self) -> int:
+        """
+        被覆盖的旧记录占用的字节数。
+        """
+        live = sum(
+            RECORD.size + len(name.encode("utf-8")) + length
+            for name, (_, length) in self.index.items()
+        )
+        return max(0, self.size - len(MAGIC) - live)
+
+    def compact(self) -> int:
+        """
+        只保留每个名称的最新记录并按名称重写数据文件, 返回回收的字节数。
+        """
+        with self.lock:
+            return self._compact()
+
+    def _compact(self) -> int:
+        saved = self.garbage
+        if not self.index:
+            return saved
+        tmp_path = self.path.with_suffix(".pack.tmp")
+        tmp_path.unlink(missing_ok=True)
+        tmp = AssetPack(tmp_path)
+        tmp.add((name, self._read(name)) for name in self.names())  # type: ignore
+        tmp.save_index()
+        tmp._unmap()
+        self._unmap()
+        # 先删除旧索引, 替换中途退出时重新扫描而不是误用旧索引
+        self.index_path.unlink(missing_ok=True)
+        os.replace(tmp.path, self.path)
+        os.replace(tmp.index_path, self.index_path)
+        self.load()
+        return saved
+
+
+class PackService:
+    """资源包服务
+
+    开启 pcr_asset_pack 后, 头像、卡面、派生图与签到印章优先从资源包读取,
+    新下载的资源也追加到资源包中; 未开启时仍按原目录结构读写单个文件。
+    """
+
+    pack_path: Path = pcr_res_path / "pack"
+    """资源包存放路径"""
+    source_path: dict[PackType, Path] = {
+        "icon": pcr_res_path / "priconne" / "icon",
+        "card": pcr_res_path / "priconne" / "card",
+        "stamp": pcr_res_path / "sign" / "stamp",
+        "variant": pcr_res_path / "priconne" / "variant",
+    }
+    """各类资源原本的目录"""
+    enabled: bool = pcr_config.pcr_asset_pack
+    """是否启用资源包"""
+
+    def __init__(self) -> None:
+        self.packs: dict[PackType, AssetPack] = {}
+
+    def get_pack(self, type_: PackType) -> AssetPack:
+        """
+        获取资源包, 首次获取时加载。
+        """
+        if type_ not in self.packs:
+            self.pack_path.mkdir(parents=True, exist_ok=True)
+            self.packs[type_] = AssetPack(self.pack_path / f"{type_}.pack")
+        return self.packs[type_]
+
+    def exists(self, type_: PackType, name: str) -> bool:
+        """
+        资源是否存在。
+        """
+        if self.enabled and name in self.get_pack(type_):
+            return True
+        return (self.source_path[type_] / name).exists()
+
+    def read(self, type_: PackType, name: str) -> Optional[Union[bytes, memoryview]]:
+        """
+        读取资源, 资源包中的资源以 memoryview 返回, 不存在时返回None。
+        """
+        if self.enabled:
+            data = self.get_pack(type_).read(name)
+            if data is not None:
+                return data
+        path = self.source_path[type_] / name
+        return path.read_bytes() if path.exists() else None
+
+    def write(self, type_: PackType, name: str, data: bytes) -> None:
+        """
+        保存资源, 启用资源包时追加到资源包中。
+        """
+        if self.enabled:
+            self.get_pack(type_).append(name, data)
+            return
+        path = self.source_path[type_] / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    def names(self, type_: PackType) -> list[str]:
+        """
+        全部资源名称, 子目录中的资源以相对路径表示。
+        """
+        source = self.source_path[type_]
+        names = {
+            p.relative_to(source).as_posix() for p in source.rglob("*.*") if p.is_file()
+        }
+        if self.enabled:
+            names.update(self.get_pack(type_).names())
+        return sorted(names)
+
+    def import_dir(self, type_: PackType, remove: bool = False) -> int:
+        """
+        将原目录中尚未打包的文件导入资源包, 返回导入的数量。
+
+        参数:
+            remove: 导入后是否删除原文件
+        """
+        pack = self.get_pack(type_)
+        source = self.source_path[type_]
+        paths = sorted(p for p in source.rglob("*.*") if p.is_file())
+        new = [p for p in paths if p.relative_to(source).as_posix() not in pack]
+        count = pack.add(
+            (p.relative_to(source).as_posix(), p.read_bytes()) for p in new
+        )
+        if remove:
+            imported = set(new)
+            kept = 0
+            for p in paths:
+                # 包内已有同名资源而内容不同的文件未被导入, 予以保留
+                name = p.relative_to(source).as_posix()
+                if p in imported or p.read_bytes() == pack.read(name):
+                    p.unlink()
+                else:
+                    kept += 1
+            if kept:
+                logger.warning(
+                    f"{type_} 有 {kept} 个文件与包内同名资源不同, 未导入也未删除"
+                )
+        logger.info(f"{type_} 导入 {count} 个文件, 共 {len(pack)} 个")
+        return count
+
+    def compact(self, type_: PackType) -> int:
+        """
+        整理资源包, 返回回收的字节数。
+        """
+        saved = self.get_pack(type_).compact()
+        logger.info(f"{type_} 整理完成, 回收 {saved} 字节")
+        return saved
+
+
+pack_service = PackService()
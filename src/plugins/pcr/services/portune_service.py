@@ -1,18 +1,38 @@
+import asyncio
 import json
+import math
 import random
-from collections import defaultdict
-from datetime import datetime, timedelta
+from dataclasses import dataclass
 from io import BytesIO
 from pathlib import Path
+from typing import Optional
 
-import pytz
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 
 from ..config import pcr_config
+from ..logger import PCRLogger
+from .cache_service import cache_service
+from .font_service import FONT_SUFFIXES, font_service
+from .metrics_service import metrics_service
+from .watch_service import ChangeEvent, watch_service
 
 pcr_res_path: Path = pcr_config.pcr_resources_path
 pcr_data_path: Path = pcr_config.pcr_data_path
 
+logger = PCRLogger("PCR_PORTUNE")
+
+
+@dataclass
+class PortuneOverlay:
+    """预渲染的运势文字"""
+
+    color: str
+    """文字颜色"""
+    xy: tuple[int, int]
+    """遮罩在底图上的位置"""
+    mask: Image.Image
+    """文字遮罩"""
+
 
 class PortuneService:
     """PCR运势服务"""
@@ -24,6 +44,19 @@ class PortuneService:
 
     def __init__(self) -> None:
         self.res_path = pcr_res_path / "portune"
+        self.font_path = {
+            "title": self.res_path / "font/Mamelon.otf",
+            "text": self.res_path / "font/sakura.ttf",
+        }
+        self.frame_cache = cache_service.register("portune_frame")
+        """已解码的底图缓存"""
+        self.overlay_cache = cache_service.register("portune_overlay", weight=2)
+        """(标题, 运势内容) -> 预渲染的文字遮罩"""
+        self.desc_index_cache: Optional[dict[str, list[dict]]] = None
+        self.luck_type_index_cache: Optional[dict[int, str]] = None
+        self.preload_task: Optional[asyncio.Task] = None
+        # 资源被替换时只清除受影响的缓存
+        watch_service.subscribe(self.res_path, self.on_change)
 
     @property
     def luck_type(self) -> list:
@@ -41,6 +74,27 @@ class PortuneService:
                 self.luck_desc_cache = json.load(file)
         return self.luck_desc_cache
 
+    @property
+    def desc_index(self) -> dict[str, list[dict]]:
+        """角色id -> 运势描述列表"""
+        if self.desc_index_cache is None:
+            index = {}
+            for i in self.luck_desc:
+                for charaid in i["charaid"]:
+                    index.setdefault(charaid, i["type"])
+            self.desc_index_cache = index
+        return self.desc_index_cache
+
+    @property
+    def luck_type_index(self) -> dict[int, str]:
+        """good-luck -> 运势名称"""
+        if self.luck_type_index_cache is None:
+            index = {}
+            for i in self.luck_type:
+                index.setdefault(i["good-luck"], i["name"])
+            self.luck_type_index_cache = index
+        return self.luck_type_index_cache
+
     def drawing_pic(self) -> BytesIO:
         """
         生成运势图片
@@ -48,47 +102,76 @@ class PortuneService:
         Returns:
             BytesIO: 图片的BytesIO
         """
-        fontPath = {
-            "title": self.res_path / "font/Mamelon.otf",
-            "text": self.res_path / "font/sakura.ttf",
-        }
-
         charaid = str(random.randint(1, 66))
-        filename = "frame_" + charaid + ".jpg"
+        desc, title = self.get_info(charaid)
+        with metrics_service.stage("render", "portune"):
+            # 底图 + 预渲染文字
+            img = self.get_frame(charaid).copy()
+            for overlay in self.get_overlay(title, desc["content"]):
+                img.paste(overlay.color, overlay.xy, overlay.mask)
+        # 创建一个新的 BytesIO 对象
+        bytes_io = BytesIO()
+        # 将图像保存到 BytesIO 对象中
+        with metrics_service.stage("encode", "portune"):
+            img.save(bytes_io, format="JPEG")
+        # 将光标移动到字节流的起始位置
+        bytes_io.seek(0)
+        return bytes_io
+
+    def get_frame(self, charaid: str) -> Image.Image:
+        """
+        获取已解码的底图
+        """
 
-        img = Image.open(self.res_path / "imgbase" / filename)
-        # Draw title
-        draw = ImageDraw.Draw(img)
-        text, title = self.get_info(charaid)
+        def load() -> Image.Image:
+            with Image.open(self.res_path / "imgbase" / f"frame_{charaid}.jpg") as img:
+                return img.convert("RGB")
 
-        text = text["content"]
+        return self.frame_cache.load(charaid, load)
+
+    def get_overlay(self, title: str, text: str) -> list[PortuneOverlay]:
+        """
+        获取运势文字的预渲染遮罩, 文字排版与底图无关, 按 (标题, 内容) 缓存
+        """
+        return self.overlay_cache.load(
+            (title, text),
+            lambda: [
+                self.render_overlay(*layout) for layout in self.layout(title, text)
+            ],
+        )
+
+    def layout(self, title: str, text: str) -> list[tuple[Path, int, str, tuple, str]]:
+        """
+        计算运势文字排版
+
+        Returns:
+            list: (字体路径, 字号, 颜色, 坐标, 文字) 列表
+        """
+        layouts = []
+        # Title
         font_size = 45
-        color = "#F5F5F5"
         image_font_center = (140, 99)
-        ttfront = ImageFont.truetype(str(fontPath["title"]), font_size)
-        font_length = ttfront.getlength(title)
-
-        draw.text(
+        font_length = font_service.get_length(self.font_path["title"], font_size, title)
+        layouts.append(
             (
-                image_font_center[0] - font_length / 2,
-                image_font_center[1] - font_size / 2,
-            ),
-            title,
-            fill=color,
-            font=ttfront,
+                self.font_path["title"],
+                font_size,
+                "#F5F5F5",
+                (
+                    image_font_center[0] - font_length / 2,
+                    image_font_center[1] - font_size / 2,
+                ),
+                title,
+            )
         )
-        # Text rendering
+        # Text
         font_size = 25
-        color = "#323232"
         image_font_center = [140, 297]
-        ttfront = ImageFont.truetype(str(fontPath["text"]), font_size)
         result = self.decrement(text)
         if not result[0]:
             raise Exception("Unknown error in daily luck")
-        textVertical = []
         for i in range(0, result[0]):
             font_height = len(result[i + 1]) * (font_size + 4)
-            textVertical = self.vertical(result[i + 1])
             x = int(
                 image_font_center[0]
                 + (result[0] - 2) * font_size / 2
@@ -96,28 +179,96 @@ class PortuneService:
                 - i * (font_size + 4)
             )
             y = int(image_font_center[1] - font_height / 2)
-            draw.text((x, y), textVertical, fill=color, font=ttfront)
-        # 创建一个新的 BytesIO 对象
-        bytes_io = BytesIO()
-        # 将图像保存到 BytesIO 对象中
-        img.save(bytes_io, format="JPEG")
-        # 将光标移动到字节流的起始位置
-        bytes_io.seek(0)
-        return bytes_io
+            layouts.append(
+                (
+                    self.font_path["text"],
+                    font_size,
+                    "#323232",
+                    (x, y),
+                    self.vertical(result[i + 1]),
+                )
+            )
+        return layouts
+
+    @staticmethod
+    def render_overlay(
+        font_path: Path, font_size: int, color: str, xy: tuple, text: str
+    ) -> PortuneOverlay:
+        """
+        将文字渲染为裁剪到文字范围的灰度遮罩
+        """
+        font = font_service.get_font(font_path, font_size)
+        x, y = xy
+        left, top, right, bottom = ImageDraw.Draw(
+            Image.new("L", (1, 1))
+        ).multiline_textbbox((x, y), text, font=font)
+        left, top = math.floor(left), math.floor(top)
+        mask = Image.new("L", (math.ceil(right) - left, math.ceil(bottom) - top), 0)
+        ImageDraw.Draw(mask).multiline_text((x - left, y - top), text, 255, font)
+        return PortuneOverlay(color=color, xy=(left, top), mask=mask)
+
+    def preload(self) -> None:
+        """
+        预加载底图与全部运势文字遮罩, 单个资源加载失败时跳过, 抽签时再按需加载
+        """
+        failed = 0
+        for charaid, types in self.desc_index.items():
+            try:
+                self.get_frame(charaid)
+                for desc in types:
+                    self.get_overlay(self.get_luck_type(desc), desc["content"])
+            except Exception as e:
+                failed += 1
+                logger.warning(f"预加载运势 {charaid} 失败: {e}")
+        if failed:
+            logger.error(f"运势预加载有 {failed} 个角色失败, 请检查 {self.res_path}")
+
+    def preload_in_background(self) -> None:
+        """
+        在后台线程中预加载, 不阻塞启动, 出错时只记录日志
+        """
+        if self.preload_task is None or self.preload_task.done():
+            self.preload_task = asyncio.create_task(self._preload())
+
+    async def _preload(self) -> None:
+        try:
+            await asyncio.to_thread(self.preload)
+        except Exception as e:
+            logger.error(f"预加载运势资源失败: {e}")
+
+    def on_change(self, events: list[ChangeEvent]) -> None:
+        for event in events:
+            name = event.path.name
+            if event.kind == "rescan":
+                self.frame_cache.clear()
+                self.clear_luck()
+            elif name.startswith("frame_") and event.path.parent.name == "imgbase":
+                self.frame_cache.remove(event.path.stem[len("frame_") :])
+            elif name in ("luck_type.json", "luck_desc.json"):
+                self.clear_luck()
+            elif event.path.suffix.lower() in FONT_SUFFIXES:
+                self.overlay_cache.clear()
+
+    def clear_luck(self) -> None:
+        """
+        清除运势数据与文字遮罩缓存
+        """
+        self.luck_type_cache = None
+        self.luck_desc_cache = None
+        self.desc_index_cache = None
+        self.luck_type_index_cache = None
+        self.overlay_cache.clear()
 
     def get_luck_type(self, desc) -> str:
-        target_luck_type = desc["good-luck"]
-        for i in self.luck_type:
-            if i["good-luck"] == target_luck_type:
-                return i["name"]
-        raise Exception("luck type not found")
+        try:
+            return self.luck_type_index[desc["good-luck"]]
+        except KeyError:
+            raise Exception("luck type not found")
 
     def get_info(self, charaid):
-        for i in self.luck_desc:
-            if charaid in i["charaid"]:
-                typewords = i["type"]
-                desc = random.choice(typewords)
-                return desc, self.get_luck_type(desc)
+        if charaid in self.desc_index:
+            desc = random.choice(self.desc_index[charaid])
+            return desc, self.get_luck_type(desc)
         raise Exception("luck description not found")
 
     def decrement(self, text) -> list:
@@ -166,29 +317,3 @@ class PortuneService:
 
 
 portune_service = PortuneService()
-
-
-class DailyNumberLimiter:
-    tz = pytz.timezone("Asia/Shanghai")
-
-    def __init__(self, max_num):
-        self.today = -1
-        self.count = defaultdict(int)
-        self.max = max_num
-
-    def check(self, key) -> bool:
-        now = datetime.now(self.tz)
-        day = (now - timedelta(hours=0)).day
-        if day != self.today:
-            self.today = day
-            self.count.clear()
-        return bool(self.count[key] < self.max)
-
-    def get_num(self, key):
-        return self.count[key]
-
-    def increase(self, key, num=1):
-        self.count[key] += num
-
-    def reset(self, key):
-        self.count[key] = 0
@@ -0,0 +1,215 @@
+import asyncio
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Optional
+
+from ..config import pcr_config
+from ..logger import PCRLogger
+
+pcr_data_path: Path = pcr_config.pcr_data_path
+"""PCR数据存放路径"""
+
+logger = PCRLogger("PCR_PROFILE")
+
+PACKAGE = __name__.rsplit(".services.", 1)[0]
+"""PCR插件包名, 用于将采样归属到指令与服务"""
+
+IDLE_LEAVES = (
+    "selectors:",
+    "concurrent.futures.thread:_worker",
+    "threading:Condition.wait",
+    "threading:Event.wait",
+    "queue:Queue.get",
+)
+"""栈顶为这些函数的采样视为空闲等待"""
+
+
+def frame_label(frame: FrameType, cache: dict[CodeType, str]) -> str:
+    """
+    帧的标签, 形如 模块:限定名, PCR插件包内的模块以 pcr 开头。
+    """
+    code = frame.f_code
+    label = cache.get(code)
+    if label is None:
+        module = frame.f_globals.get("__name__", "?")
+        if module.startswith(PACKAGE):
+            module = "pcr" + module[len(PACKAGE) :]
+        name = getattr(code, "co_qualname", code.co_name)
+        if code.co_name in ("_", "<lambda>"):
+            # 匿名的处理函数以定义所在行区分
+            name = f"{name}@{code.co_firstlineno}"
+        label = cache[code] = f"{module}:{name}"
+    return label
+
+
+def stack_labels(frame: FrameType, cache: dict[CodeType, str]) -> list[str]:
+    """
+    从最外层到最内层的帧标签。
+    """
+    labels = []
+    f: Optional[FrameType] = frame
+    while f is not None:
+        labels.append(frame_label(f, cache))
+        f = f.f_back
+    labels.reverse()
+    return labels
+
+
+def attribute(labels: list[str]) -> tuple[Optional[str], Optional[str]]:
+    """
+    从调用栈中找出最外层的PCR指令函数与最内层的PCR服务方法。
+    """
+    matcher = service = None
+    for label in labels:
+        if label.startswith("pcr.plugins.") and matcher is None:
+            matcher = label[len("pcr.plugins.") :]
+        elif label.startswith("pcr.services."):
+            service = label[len("pcr.services.") :]
+    return matcher, service
+
+
+@dataclass
+class Profile:
+    """一次采样的结果"""
+
+    seconds: float
+    interval: float
+    stacks: Counter[tuple[str, ...]] = field(default_factory=Counter)
+    """折叠后的调用栈 -> 采样数, 首个元素为线程名"""
+    matchers: Counter[str] = field(default_factory=Counter)
+    """最外层的PCR指令函数 -> 采样数"""
+    services: Counter[str] = field(default_factory=Counter)
+    """最内层的PCR服务方法 -> 采样数"""
+    samples: int = 0
+    idle: int = 0
+    path: Optional[Path] = None
+
+    def collapsed(self) -> str:
+        """
+        折叠栈格式, 可直接用 flamegraph.pl 或 speedscope 打开。
+        """
+        return "".join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in sorted(self.stacks.items())
+        )
+
+    def report(self, limit: int = 8) -> str:
+        busy = self.samples - self.idle
+        lines = [
+            f"采样 {self.seconds:.0f}s, 共 {self.samples} 个样本, 忙碌 {busy} 个",
+        ]
+        for title, counter in (("[指令]", self.matchers), ("[服务]", self.services)):
+            if not counter:
+                continue
+            lines.append(title)
+            for label, count in counter.most_common(limit):
+                lines.append(f"  {label}: {count / max(busy, 1):.0%}")
+        if self.path is not None:
+            lines.append(f"折叠栈已保存至 {self.path}")
+        return "\n".join(lines)
+
+
+class Sampler(threading.Thread):
+    """
+    定时读取所有线程的调用栈并计数, 只在采样期间存在。
+    """
+
+    def __init__(self, profile: Profile) -> None:
+        super().__init__(name="pcr-profiler", daemon=True)
+        self.profile = profile
+        self.stopped = threading.Event()
+        self.labels: dict[CodeType, str] = {}
+        self.names: dict[Optional[int], str] = {}
+        """线程id -> 线程名"""
+
+    def sample(self) -> None:
+        profile = self.profile
+        for ident, frame in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+            if ident not in self.names:
+                # 线程池按需创建线程, 出现新线程时刷新线程名
+                self.names = {t.ident: t.name for t in threading.enumerate()}
+            labels = stack_labels(frame, self.labels)
+            profile.samples += 1
+            if labels and labels[-1].startswith(IDLE_LEAVES):
+                profile.idle += 1
+                continue
+            # 线程池中的线程合并显示
+            thread = re.sub(r"_\d+$", "", self.names.get(ident, str(ident)))
+            profile.stacks[(thread, *labels)] += 1
+            matcher, service = attribute(labels)
+            if matcher is not None:
+                profile.matchers[matcher] += 1
+            if service is not None:
+                profile.services[service] += 1
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.profile.interval):
+            self.sample()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+
+class ProfilerService:
+    """性能采样服务
+
+    按需启动采样线程, 周期性记录事件循环线程与图像处理线程池的调用栈,
+    结束后保存折叠栈文件并按PCR指令与服务方法汇总。
+    未采样时不存在任何额外的线程或钩子。
+    """
+
+    profile_path: Path = pcr_data_path / "profile"
+    """折叠栈文件的保存目录"""
+    interval: float = pcr_config.pcr_profile_interval
+    """采样间隔(秒)"""
+    max_seconds: int = pcr_config.pcr_profile_max_seconds
+    """单次采样的最长时长(秒)"""
+
+    def __init__(self) -> None:
+        self.sampler: Optional[Sampler] = None
+
+    @property
+    def running(self) -> bool:
+        return self.sampler is not None
+
+    def save(self, profile: Profile) -> Path:
+        self.profile_path.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = self.profile_path / f"pcr_{stamp}_{profile.seconds:.0f}s.folded"
+        path.write_text(profile.collapsed(), encoding="utf-8")
+        return path
+
+    async def profile(self, seconds: float) -> Profile:
+        """
+        采样指定的时长并保存结果, 同一时间只能进行一次采样。
+        """
+        if self.sampler is not None:
+            raise RuntimeError("已有性能采样正在进行")
+        seconds = min(max(seconds, 1), self.max_seconds)
+        profile = Profile(seconds=seconds, interval=self.interval)
+        self.sampler = sampler = Sampler(profile)
+        logger.info(f"开始性能采样 {seconds:.0f}s")
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+            await asyncio.to_thread(sampler.join)
+            self.sampler = None
+        profile.seconds = time.perf_counter() - start
+        profile.path = await asyncio.to_thread(self.save, profile)
+        logger.info(f"性能采样结束, 已保存至 {profile.path}")
+        return profile
+
+
+profiler_service = ProfilerService()
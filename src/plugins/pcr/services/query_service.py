@@ -1,9 +1,13 @@
+import asyncio
 import json
+import os
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal, Optional
 
 from ..config import pcr_config
 from ..logger import PCRLogger as Logger
+from .watch_service import ChangeEvent, watch_service
 
 logger = Logger("PCR_QUERY")
 type_list = [
@@ -28,27 +32,67 @@ rank
 更新攻略缓存
 """
 
+RankServer = Literal["cn", "jp", "tw"]
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+
+@dataclass(frozen=True)
+class QueryEntry:
+    """一条攻略: 文字与按顺序排列的图片数据"""
+
+    text: str = ""
+    images: tuple[bytes, ...] = ()
+
+
+@dataclass(frozen=True)
+class QueryBundle:
+    """
+    查询资源包, 一次性载入全部攻略与rank表的文字和图片。
+
+    生成后不再修改, 目录变化时整体替换。
+    """
+
+    routes: dict[str, tuple[QueryEntry, ...]] = field(default_factory=dict)
+    """攻略类型 -> 攻略列表"""
+    ranks: dict[str, tuple[QueryEntry, ...]] = field(default_factory=dict)
+    """服务器 -> rank表"""
+    signature: tuple = ()
+    """生成时的目录签名"""
+
 
 class QueryService:
     res_path = pcr_config.pcr_resources_path / "query"
+    rank_path = pcr_config.pcr_resources_path / "rank"
 
     def __init__(self):
-        pass
+        self.bundle = self.build_bundle()
+        # 资源目录变化时自动重新载入
+        watch_service.subscribe(self.res_path, self.on_change)
+        watch_service.subscribe(self.rank_path, self.on_change)
 
-    async def get_gocha(self) -> tuple[Any, list[Path]]:
-        path = self.res_path / "gocha"
-        data = self.load_config(path)
-        text: str = ""
-        image_path_list: list[Path] = []
-        for strategy in data:
-            if strategy["text"]:
-                text += strategy["text"]
-            for image in strategy["image"]:
-                image_path_list.append(path / image)
-        return text, image_path_list
+    async def get_gocha(self) -> tuple[str, list[bytes]]:
+        return self.join(self.bundle.routes.get("gocha", ()))
+
+    async def get_rank(
+        self, server: RankServer = "jp"
+    ) -> Optional[tuple[str, list[bytes]]]:
+        """
+        获取指定服务器的rank表, 没有时返回None。
+        """
+        entries = self.bundle.ranks.get(server)
+        if not entries:
+            return None
+        return self.join(entries)
 
-    async def get_rank(self):
-        return None
+    @staticmethod
+    def join(entries: tuple[QueryEntry, ...]) -> tuple[str, list[bytes]]:
+        text = ""
+        images: list[bytes] = []
+        for entry in entries:
+            text += entry.text
+            images.extend(entry.images)
+        return text, images
 
     def load_config(self, path: Path) -> Any:
         try:
@@ -58,3 +102,67 @@ class QueryService:
         except Exception as e:
             logger.exception(f"{e}")
             return {}
+
+    def load_entries(self, path: Path) -> tuple[QueryEntry, ...]:
+        """
+        读取目录中的攻略, 没有 route.json 时按文件名顺序收录全部图片。
+        """
+        if (path / "route.json").exists():
+            data = self.load_config(path)
+        else:
+            images = sorted(
+                p.name for p in path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES
+            )
+            data = [{"text": "", "image": images}] if images else []
+        entries = []
+        for strategy in data:
+            images = []
+            for image in strategy.get("image", []):
+                try:
+                    images.append((path / image).read_bytes())
+                except OSError as e:
+                    logger.error(f"读取 {path.name}/{image} 失败: {e}")
+            entries.append(QueryEntry(strategy.get("text") or "", tuple(images)))
+        return tuple(entries)
+
+    def signature(self) -> tuple:
+        """
+        资源目录签名, 任一文件增删或修改后都会变化。
+        """
+        result = []
+        for root in (self.res_path, self.rank_path):
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    stat = os.stat(os.path.join(dirpath, filename))
+                    result.append((dirpath, filename, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(result))
+
+    def build_bundle(self) -> QueryBundle:
+        """
+        读取全部攻略与rank表生成资源包, 会阻塞。
+        """
+        signature = self.signature()
+        routes = {}
+        if self.res_path.exists():
+            for path in sorted(p for p in self.res_path.iterdir() if p.is_dir()):
+                routes[path.name] = self.load_entries(path)
+        ranks = {}
+        if self.rank_path.exists():
+            for path in sorted(p for p in self.rank_path.iterdir() if p.is_dir()):
+                ranks[path.name] = self.load_entries(path)
+        return QueryBundle(routes=routes, ranks=ranks, signature=signature)
+
+    async def reload(self, force: bool = False) -> bool:
+        """
+        资源目录有变化时在线程中重新生成资源包并整体替换, 返回是否替换。
+        """
+        if not force:
+            signature = await asyncio.to_thread(self.signature)
+            if signature == self.bundle.signature:
+                return False
+        self.bundle = await asyncio.to_thread(self.build_bundle)
+        logger.info("查询资源已重新载入")
+        return True
+
+    async def on_change(self, events: list[ChangeEvent]) -> None:
+        await self.reload()
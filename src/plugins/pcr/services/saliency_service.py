@@ -0,0 +1,142 @@
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, Union
+
+import numpy as np
+from PIL import Image
+
+from ..config import pcr_config
+from ..logger import PCRLogger
+from .cache_service import cache_service
+
+pcr_res_path: Path = pcr_config.pcr_resources_path
+"""PCR资源存放路径"""
+
+logger = PCRLogger("PCR_SALIENCY")
+
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float64)
+
+
+class SaliencyService:
+    """
+    裁剪区域信息量索引。
+
+    对每张图片用积分图一次性算出所有裁剪窗口的亮度方差与不透明度,
+    只保留信息量高的窗口左上角坐标, 出题时从中随机取一个即可。
+    """
+
+    cache_path: Path = pcr_res_path / "priconne" / "saliency"
+    """索引缓存路径, 按图片名称、字节数与裁剪尺寸命名"""
+    keep_ratio: float = 0.3
+    """保留信息量最高的窗口比例"""
+    min_alpha: float = 0.9
+    """窗口内的最低平均不透明度"""
+
+    def __init__(self) -> None:
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.positions_cache = cache_service.register("saliency", weight=2)
+        """(图片名称, 字节数, 裁剪尺寸) -> 候选裁剪位置"""
+
+    @staticmethod
+    def integral(x: np.ndarray) -> np.ndarray:
+        """
+        积分图, 首行首列补零。
+        """
+        return np.pad(x.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+
+    @staticmethod
+    def window_sum(integral: np.ndarray, side_length: int) -> np.ndarray:
+        """
+        利用积分图求所有 side_length 窗口内的和。
+        """
+        s = side_length
+        return (
+            integral[s:, s:]
+            - integral[:-s, s:]
+            - integral[s:, :-s]
+            + integral[:-s, :-s]
+        )
+
+    def score_map(self, img: Image.Image, side_length: int) -> np.ndarray:
+        """
+        计算每个裁剪窗口的信息量, 结果形状为 (H - s + 1, W - s + 1)。
+        """
+        arr = np.asarray(img.convert("RGBA"), dtype=np.float64)
+        lum = arr[..., :3] @ LUMA
+        alpha = arr[..., 3] / 255
+        n = side_length * side_length
+        mean = self.window_sum(self.integral(lum * alpha), side_length) / n
+        sq = self.window_sum(self.integral(lum * lum * alpha), side_length) / n
+        opacity = self.window_sum(self.integral(alpha), side_length) / n
+        score = np.maximum(sq - mean * mean, 0)
+        score[opacity < self.min_alpha] = 0
+        return score
+
+    def build_positions(self, img: Image.Image, side_length: int) -> np.ndarray:
+        """
+        计算信息量高的窗口左上角坐标, 返回形状为 (k, 2) 的 (x, y) 数组。
+        """
+        w, h = img.size
+        if w < side_length or h < side_length:
+            return np.zeros((1, 2), dtype=np.int32)
+        score = self.score_map(img, side_length)
+        # 窗口大量重叠, 按步长抽样以减小索引体积
+        stride = max(1, side_length // 8)
+        sampled = score[::stride, ::stride]
+        valid = sampled[sampled > 0]
+        if valid.size == 0:
+            ys, xs = np.indices(sampled.shape)
+        else:
+            threshold = np.quantile(valid, 1 - self.keep_ratio)
+            ys, xs = np.nonzero(sampled >= threshold)
+        return np.stack((xs.ravel(), ys.ravel()), axis=1).astype(np.int32) * stride
+
+    def index_path(self, name: str, size: int, side_length: int) -> Path:
+        """
+        磁盘索引路径。
+        """
+        return self.cache_path / f"{name}_{size}_{side_length}.npy"
+
+    def get_positions(
+        self, name: str, image: Union[BytesIO, bytes, memoryview], side_length: int
+    ) -> np.ndarray:
+        """
+        获取图片的候选裁剪位置, 依次查找内存缓存、磁盘缓存, 都没有时现场计算。
+
+        以图片名称与字节数作为键, 替换图片后字节数随之变化即会重新计算,
+        无需每次出题都对整张图片求哈希。
+        """
+        data = image.getbuffer() if isinstance(image, BytesIO) else image
+        size = len(data)
+        path = self.index_path(name, size, side_length)
+
+        def load() -> np.ndarray:
+            if path.exists():
+                return np.load(path)
+            positions = self.build_positions(Image.open(BytesIO(data)), side_length)
+            np.save(path, positions)
+            return positions
+
+        return self.positions_cache.load((name, size, side_length), load)
+
+    def build_all(
+        self, assets: Iterable[tuple[str, Union[bytes, memoryview]]], side_length: int
+    ) -> int:
+        """
+        批量为 (名称, 图片数据) 建立索引, 返回新建立的索引数。
+        """
+        count = 0
+        for name, data in assets:
+            if self.index_path(name, len(data), side_length).exists():
+                continue
+            try:
+                self.get_positions(name, data, side_length)
+                count += 1
+            except Exception as e:
+                logger.error(f"建立 {name} 的裁剪索引失败: {e}")
+        if count:
+            logger.info(f"新建立 {count} 个 {side_length}px 裁剪索引")
+        return count
+
+
+saliency_service = SaliencyService()
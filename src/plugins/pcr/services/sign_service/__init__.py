@@ -2,19 +2,29 @@ import json
 import random
 import textwrap
 import time
+from dataclasses import dataclass
+from functools import cached_property
 from io import BytesIO
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 
 import httpx
+import numpy as np
 from nonebot.adapters import Bot, Event
 from nonebot_plugin_userinfo import get_user_info
-from PIL import Image, ImageDraw, ImageFilter, ImageFont
+from PIL import Image, ImageDraw
 
 from ...config import pcr_config
 from ...logger import PCRLogger
 from ...models import CollectionResult
-from .base import CardRecordDAO
+from ..cache_service import cache_service
+from ..font_service import font_service
+from ..icon_tensor_service import TileStore, icon_tensor_service, to_grey
+from ..metrics_service import metrics_service
+from ..pack_service import pack_service
+from ..watch_service import ChangeEvent, watch_service
+from .background import BackgroundPool
+from .base import CardRecordDAO, CardSet
 
 pcr_res_path: Path = pcr_config.pcr_resources_path
 pcr_data_path: Path = pcr_config.pcr_data_path
@@ -73,6 +83,23 @@ todo_list = [
 
 logger = PCRLogger("PCR_SIGN")
 
+STAMP_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp"}
+"""印章图片的扩展名, 文件名为印章id"""
+
+
+@dataclass
+class CollectionImage:
+    """已绘制的收集册"""
+
+    canvas: np.ndarray
+    """收集册的RGB像素"""
+    bits: bytes
+    """绘制时的收集位图"""
+    jpeg: bytes
+    """编码后的图片"""
+    cost: float
+    """完整绘制一次的耗时(秒)"""
+
 
 class SignService:
     """签到服务"""
@@ -90,13 +117,11 @@ class SignService:
     col_num = pcr_config.pcr_sign_col_num
     """查看仓库时每行显示的卡片个数"""
     is_preload: bool = pcr_config.pcr_sign_is_preload
-    """是否启动时直接将所有图片加载到内存中以提高查看仓库的速度(增加约几M内存消耗)"""
+    """是否启动时直接将所有图片加载到缓存中以提高查看仓库的速度(受缓存总预算限制)"""
     bg_mode: int = pcr_config.pcr_sign_bg_mode
     """背景模式"""
-    card_file_names_all: list = []
+    card_file_names_all: list
     """卡片列表"""
-    image_list = stamp_path.rglob("*.*")
-    """图片列表"""
 
     def __init__(self):
         if not self.goodwill_path.exists():
@@ -106,18 +131,119 @@ class SignService:
             with open(self.goodwill_path, "w") as file:
                 json.dump({}, file)
 
-        self.image_cache = {}
-        for image in self.image_list:
+        self.image_cache = cache_service.register("stamp")
+        """印章id -> 收集册使用的80px印章"""
+        self.card_cache = cache_service.register("sign_stamp", weight=2)
+        """印章id -> 签到卡片使用的502px印章"""
+        self.collection_cache = cache_service.register("collection", weight=2)
+        """(gid, uid) -> 已绘制的收集册, 收集变化时只重绘变化的格子"""
+        self.frame_cache = cache_service.register("collection_frame", weight=4)
+        """收集册尺寸 -> 缩放后的底图"""
+        self.background_pool = BackgroundPool(pcr_data_path / "sign" / "background")
+        """预先处理好的网络背景"""
+        self.scan()
+        if self.is_preload:
             # 图像缓存
-            if self.is_preload:
-                image_path = image
-                img = Image.open(image_path)
-                c_id = (str(image)[:-4]).split("\\")[-1]
-                self.image_cache[c_id] = (
-                    img.convert("RGBA") if img.mode != "RGBA" else img
-                )
-            self.card_file_names_all.append(image)
-            self.len_card = len(self.card_file_names_all)
+            for name in self.card_file_names_all:
+                self.cache_stamp(name)
+        # 放入新印章后无需重启
+        watch_service.subscribe(self.stamp_path, self.on_change)
+
+    def scan(self) -> None:
+        """
+        扫描印章目录(或资源包), 建立按印章id索引的目录。
+        """
+        self.card_file_names_all = self.stamp_names(pack_service.names("stamp"))
+        self.len_card = len(self.card_file_names_all)
+        self.card_ids = self.stamp_ids(self.card_file_names_all)
+        """与印章列表顺序一致的印章id"""
+        self.catalog = dict(zip(self.card_ids.tolist(), self.card_file_names_all))
+        """印章id -> 印章文件名"""
+
+    def cache_stamp(self, name: str) -> Image.Image:
+        """
+        收集册使用的80px印章, 只缓存缩小后的图像。
+        """
+
+        def load() -> Image.Image:
+            img = self.open_stamp(name)
+            img = img.convert("RGBA") if img.mode != "RGBA" else img
+            return img.resize((80, 80), Image.Resampling.LANCZOS)
+
+        return self.image_cache.load(Path(name).stem, load)
+
+    def card_stamp(self, name: str) -> Image.Image:
+        """
+        签到卡片使用的502px印章, 粘贴时配合 stamp_mask 裁成圆形。
+        """
+        return self.card_cache.load(
+            Path(name).stem, lambda: self.open_stamp(name).resize((502, 502))
+        )
+
+    @cached_property
+    def stamp_mask(self) -> Image.Image:
+        """
+        所有印章共用的圆形蒙版。
+        """
+        mask = Image.new("L", (502, 502), 0)
+        ImageDraw.Draw(mask).ellipse((0, 0, 502, 502), fill=255)
+        return mask
+
+    def on_change(self, events: list[ChangeEvent]) -> None:
+        """
+        印章增删或替换后刷新印章列表与预加载的图像。
+        """
+        self.scan()
+        # 印章增减或替换后排版与图案都可能变化
+        self.collection_cache.clear()
+        if any(event.kind == "rescan" for event in events):
+            self.image_cache.clear()
+            self.card_cache.clear()
+            names = self.card_file_names_all
+        else:
+            names = [
+                event.path.relative_to(self.stamp_path).as_posix() for event in events
+            ]
+        for name in names:
+            self.image_cache.remove(Path(name).stem)
+            self.card_cache.remove(Path(name).stem)
+            if self.is_preload and name in self.card_file_names_all:
+                try:
+                    self.cache_stamp(name)
+                except Exception as e:
+                    logger.error(f"加载印章 {name} 失败: {e}")
+
+    @staticmethod
+    def stamp_names(names: list[str]) -> list[str]:
+        """
+        筛选出印章图片并按印章id排序, 跳过无法识别的文件与重复的id。
+        """
+        stamps: dict[int, str] = {}
+        for name in names:
+            path = Path(name)
+            if path.suffix.lower() not in STAMP_SUFFIXES or not path.stem.isdigit():
+                logger.warning(f"跳过无法识别的印章文件 {name}")
+                continue
+            id_ = int(path.stem)
+            if id_ in stamps:
+                logger.warning(f"印章 {name} 与 {stamps[id_]} 的id重复, 已跳过")
+                continue
+            stamps[id_] = name
+        return [stamps[id_] for id_ in sorted(stamps)]
+
+    @staticmethod
+    def stamp_ids(names: list[str]) -> np.ndarray:
+        return np.array([int(Path(name).stem) for name in names], dtype=np.int64)
+
+    @staticmethod
+    def open_stamp(name: str) -> Image.Image:
+        """
+        打开印章图片, 启用资源包时从资源包读取。
+        """
+        data = pack_service.read("stamp", name)
+        if data is None:
+            raise FileNotFoundError(f"印章 {name} 不存在")
+        return Image.open(BytesIO(data))
 
     async def get_sign_card(
         self, gid: str, uid: str, bot: Bot, event: Event
@@ -142,7 +268,7 @@ class SignService:
         stamp = random.choice(self.card_file_names_all)
         # 生成卡片
         result = await self.draw_card(
-            path=stamp,
+            stamp=stamp,
             gid=gid,
             uid=uid,
             todo=todo,
@@ -152,8 +278,8 @@ class SignService:
             event=event,
         )
         # 收集册
-        card_id = (str(stamp)[:-4]).split("\\")[-1]
-        self.db.add_card_num(gid, uid, int(card_id))
+        card_id = Path(stamp).stem
+        self.db.add_card(gid, uid, int(card_id))
         return result
 
     async def get_collection(
@@ -170,7 +296,7 @@ class SignService:
 
         with open(self.goodwill_path, "r", encoding="utf-8") as f:
             data = json.load(f)
-        data = data[f"{gid}"]
+        data = data.get(str(gid), {})
         new_dictionary = {}
         rank_text = ""
         rank_num = 1
@@ -203,13 +329,13 @@ class SignService:
         # result["rank_text"] = f"第{rank_num}位"
         result["ranking_desc"] = f"第{ranking}位" if ranking != -1 else "未上榜"
         result["cards_num"] = (
-            f"{self.normalize_digit_format(len(self.db.get_cards_num(gid, uid)))}/{self.normalize_digit_format(len(self.card_file_names_all))}"
+            f"{self.normalize_digit_format(self.db.get_cards_count(gid, uid))}/{self.normalize_digit_format(len(self.card_file_names_all))}"
         )
         return result
 
     async def draw_card(
         self,
-        path: Path,
+        stamp: str,
         gid: str,
         uid: str,
         todo: str,
@@ -220,73 +346,13 @@ class SignService:
     ) -> BytesIO:
         """绘制卡片"""
         # 背景
-        if self.bg_mode == 1:
-            bg_bytes = await self.get_background()
-            # 调整大小
-            sign_bg: Image.Image = Image.open(bg_bytes).convert("RGBA")
-            weight, height = sign_bg.size
-            if (weight / height) >= (928 / 1133):
-                print(">>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>")
-                sign_bg = sign_bg.resize((int(weight * (1133 / height)), 1133))
-                print(sign_bg.size)
-                print(
-                    (
-                        int((int(weight * (1133 / height)) - 928) / 2),
-                        0,
-                        int((int(weight * (1133 / height)) - 928) / 2 + 928),
-                        1133,
-                    )
-                )
-                sign_bg = sign_bg.crop(
-                    (
-                        int((int(weight * (1133 / height)) - 928) / 2),
-                        0,
-                        int((int(weight * (1133 / height)) - 928) / 2 + 928),
-                        1133,
-                    )
-                )
-            elif (weight / height) < (928 / 1133):
-                print("<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<")
-                sign_bg = sign_bg.resize((928, int(height * (928 / weight))))
-                print(sign_bg.size)
-                print(
-                    (
-                        0,
-                        int((int(height * (928 / weight)) - 1133) / 2),
-                        928,
-                        int((int(height * (928 / weight)) - 1133) / 2 + 1133),
-                    )
-                )
-                sign_bg = sign_bg.crop(
-                    (
-                        0,
-                        int((int(height * (928 / weight)) - 1133) / 2),
-                        928,
-                        int((int(height * (928 / weight)) - 1133) / 2 + 1133),
-                    )
-                )
-            sign_bg = sign_bg.resize((928, 1133))
-            # 模糊背景
-            sign_bg = sign_bg.filter(ImageFilter.GaussianBlur(8))
-            # 背景阴影
-            shadow = Image.open(self.sign_res_path / "image" / "shadow.png").convert(
-                "RGBA"
-            )
-        else:
-            sign_bg_list = []
-            for sign in (self.sign_res_path / "image" / "sign_bg").rglob("*.*"):
-                sign_bg_list.append(sign)
-            sign_bg = random.choice(sign_bg_list)
-            sign_bg = Image.open(sign_bg)
+        sign_bg = self.background_pool.take() if self.bg_mode == 1 else None
+        online = sign_bg is not None
+        if not online:
+            sign_bg = Image.open(random.choice(self.local_backgrounds))
         draw = ImageDraw.Draw(sign_bg)
         # 调整样式
-        stamp_img = Image.open(path)
-        stamp_img = stamp_img.resize((502, 502))
-        w, h = stamp_img.size
-        mask = Image.new("RGBA", (w, h), color=(0, 0, 0, 0))  # type: ignore
-        mask_draw = ImageDraw.Draw(mask)
-        mask_draw.ellipse((0, 0, w, h), fill=(0, 0, 0, 255))
-        sign_bg.paste(stamp_img, (208, 43, 208 + w, 43 + h), mask)
+        sign_bg.paste(self.card_stamp(stamp), (208, 43), self.stamp_mask)
         # 更新好感
         data = await self.update_goodwill(
             gid=gid, uid=uid, last_time=last_time, goodwill=goodwill
@@ -310,9 +376,7 @@ class SignService:
                 pass
         response_text = await self.get_yi_yan()
         # 绘制文字
-        with open(self.font_path, "rb") as draw_font:
-            bytes_font = BytesIO(draw_font.read())
-            text_font = ImageFont.truetype(font=bytes_font, size=45)
+        text_font = font_service.get_font(self.font_path, 45)
         draw.text(xy=(98, 580), text=f"欢迎回来，{rank_user}~!", font=text_font)
         draw.text(
             xy=(98, 633), text=f"好感 + {goodwill} !  当前好感: {g}", font=text_font
@@ -337,42 +401,113 @@ class SignService:
             draw.text((98, 53 * i + 898), line, "white", text_font)
 
         output = BytesIO()
-        if self.bg_mode == 1:
-            # 合并图片
-            final = Image.new("RGBA", (928, 1133))
-            final = Image.alpha_composite(final, sign_bg)
-            final = Image.alpha_composite(final, shadow)
-            final.save(output, format="png")
+        if online:
+            # 网络背景需叠加阴影, 阴影包含印章的边框, 须在印章与文字之后合并
+            final = Image.alpha_composite(sign_bg, self.shadow)
         else:
-            sign_bg.save(output, format="png")
+            final = sign_bg
+        with metrics_service.stage("encode", "sign_card"):
+            final.save(output, format="png")
         return output
 
     async def draw_collection(self, gid: str, uid: str) -> BytesIO:
         # 收集册
+        with metrics_service.stage("data", "sign_cards"):
+            cards = self.db.get_cards(gid, uid)
+        image: Optional[CollectionImage] = self.collection_cache.get((gid, uid))
+        if image is not None and image.bits == cards.bits:
+            return BytesIO(image.jpeg)
+        start = time.perf_counter()
+        if image is not None:
+            # 只重绘收集状态变化的格子
+            with metrics_service.stage("render", "collection_repaint"):
+                owned = cards.mask(self.card_ids)
+                before = CardSet(image.bits).mask(self.card_ids)
+                self.repaint_collection(image.canvas, owned, owned != before)
+        else:
+            with metrics_service.stage("render", "collection"):
+                canvas = np.array(self.render_collection(cards).convert("RGB"))
+            image = CollectionImage(canvas, cards.bits, b"", 0)
+        bytes_io = BytesIO()
+        with metrics_service.stage("encode", "collection"):
+            Image.fromarray(image.canvas).save(bytes_io, format="JPEG")
+        image.bits = cards.bits
+        image.jpeg = bytes_io.getvalue()
+        image.cost = image.cost or time.perf_counter() - start
+        self.collection_cache.put((gid, uid), image, image.cost)
+        bytes_io.seek(0)
+        return bytes_io
+
+    def collection_frame(self) -> Image.Image:
+        """
+        按印章数量缩放后的收集册底图。
+        """
         row_num = (
             self.len_card // self.col_num
             if self.len_card % self.col_num != 0
             else self.len_card // self.col_num - 1
         )
-        base = Image.open(self.sign_res_path / "image" / "frame.png")
-        base = base.resize(
-            (
-                40 + self.col_num * 80 + (self.col_num - 1) * 10,
-                150 + row_num * 80 + (row_num - 1) * 10,
-            ),
-            Image.Resampling.LANCZOS,
+        size = (
+            40 + self.col_num * 80 + (self.col_num - 1) * 10,
+            150 + row_num * 80 + (row_num - 1) * 10,
         )
-        cards_num = self.db.get_cards_num(gid, uid)
+
+        def load() -> Image.Image:
+            with Image.open(self.sign_res_path / "image" / "frame.png") as base:
+                return base.resize(size, Image.Resampling.LANCZOS)
+
+        return self.frame_cache.load(size, load)
+
+    def render_collection(self, cards: CardSet) -> Image.Image:
+        """
+        完整绘制收集册。
+        """
+        base = self.collection_frame().copy()
+        store = icon_tensor_service.get_store("stamp", 80)
+        if store is None or any(
+            name not in store.index for name in self.card_file_names_all
+        ):
+            # 图块尚未生成或印章刚有变化
+            metrics_service.cache("stamp_tiles", False)
+            self.paste_collection(base, cards)
+            return base
+        metrics_service.cache("stamp_tiles", True)
+        return self.compose_collection(base, store, cards)
+
+    def repaint_collection(
+        self, canvas: np.ndarray, owned: np.ndarray, dirty: np.ndarray
+    ) -> None:
+        """
+        在已绘制的收集册上重绘 dirty 为真的格子, 效果与完整绘制相同。
+        """
+        store = icon_tensor_service.get_store("stamp", 80)
+        for i in np.flatnonzero(dirty):
+            name = self.card_file_names_all[i]
+            tile = store.get(name) if store is not None else None
+            if tile is None:
+                rgb = np.asarray(self.get_pic(Path(name).stem).convert("RGB"))
+            else:
+                rgb = tile[..., :3]
+            row, col = divmod(int(i), self.col_num)
+            # 与 compose_collection 相同的网格: 每格80px, 间隔10px, 首格左上角为 (20, 30)
+            canvas[30 + row * 90 : 110 + row * 90, 20 + col * 90 : 100 + col * 90] = (
+                rgb if owned[i] else to_grey(rgb)
+            )
+
+    def paste_collection(self, base: Image.Image, cards: CardSet) -> None:
+        """
+        逐张粘贴收集册中的印章, 图块尚未生成时使用。
+        """
         row_index_offset = 0
         row_offset = 0
         cards_list = self.card_file_names_all
-        for index, path in enumerate(cards_list):
+        for index, name in enumerate(cards_list):
             row_index = index // self.col_num + row_index_offset
             col_index = index % self.col_num
-            c_id = (str(path)[:-4]).split("\\")[-1]
+            c_id = Path(name).stem
             f = (
                 self.get_pic(c_id, False)
-                if int(c_id) in cards_num
+                if int(c_id) in cards
                 else self.get_pic(c_id, True)
             )
             base.paste(
@@ -383,10 +518,27 @@ class SignService:
                 ),
             )
         row_offset += 30
-        bytes_io = BytesIO()
-        base.save(bytes_io, format="JPEG")
-        bytes_io.seek(0)
-        return bytes_io
+
+    def compose_collection(
+        self, base: Image.Image, store: TileStore, cards: CardSet
+    ) -> Image.Image:
+        """
+        以数组运算一次拼出收集册, 效果与 paste_collection 相同。
+        """
+        names = self.card_file_names_all
+        if not names:
+            return base
+        owned = cards.mask(self.card_ids)
+        rgb = store.take(names)[..., :3]
+        rgb = np.where(owned[:, None, None, None], rgb, to_grey(rgb))
+        rows = -(-len(names) // self.col_num)
+        canvas = np.array(base.convert("RGB"))
+        # 每格80px, 间隔10px, 首格左上角为 (20, 30)
+        grid = canvas[30 : 30 + rows * 90, 20 : 20 + self.col_num * 90]
+        grid = grid.reshape(rows, 90, self.col_num, 90, 3)[:, :80, :, :80]
+        index = np.arange(len(names))
+        grid.transpose(0, 2, 1, 3, 4)[index // self.col_num, index % self.col_num] = rgb
+        return Image.fromarray(canvas)
 
     async def update_goodwill(
         self, gid: str, uid: str, last_time: str, goodwill: int
@@ -408,47 +560,26 @@ class SignService:
         return data
 
     def get_pic(self, c_id: str, grey: bool = False) -> Image.Image:
-        if self.is_preload:
-            sign_image = self.image_cache[c_id]
-        else:
-            pic_path = self.stamp_path / f"{c_id}.png"
-            sign_image = Image.open(pic_path)
-        sign_image = sign_image.resize((80, 80), Image.Resampling.LANCZOS)
+        sign_image = self.cache_stamp(self.catalog[int(c_id)])
         if grey:
             sign_image = sign_image.convert("L")
         return sign_image
 
-    @staticmethod
-    async def get_background() -> BytesIO:
-        # 下载背景
-        res = httpx.get(
-            url="https://dev.iw233.cn/api.php?sort=mp&type=json",
-            headers={"Referer": "http://www.weibo.com/"},
-        )
-        res = res.text
-        pic_url = json.loads(res)["pic"][0]
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{pic_url}",
-                headers={
-                    "Referer": "http://www.weibo.com/",
-                },
-                timeout=10,
-            )
-            return BytesIO(response.content)
-
     @staticmethod
     async def get_yi_yan() -> str:
         # 一言
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get("https://v1.hitokoto.cn/?c=f&encode=text")
-                status_code = response.status_code
-                if status_code == 200:
-                    response_text = response.text
-                else:
-                    response_text = f"请求错误: {status_code}"
-                return response_text
+            with metrics_service.upstream("hitokoto"):
+                async with httpx.AsyncClient() as client:
+                    response = await client.get(
+                        "https://v1.hitokoto.cn/?c=f&encode=text"
+                    )
+            status_code = response.status_code
+            if status_code == 200:
+                response_text = response.text
+            else:
+                response_text = f"请求错误: {status_code}"
+            return response_text
         except Exception as error:
             logger.warning(f"{error}")
             return f"{error}"
@@ -457,8 +588,16 @@ class SignService:
     def normalize_digit_format(n):
         return f"0{n}" if n < 10 else f"{n}"
 
-    @property
-    def db(self):
+    @cached_property
+    def local_backgrounds(self) -> list[Path]:
+        return sorted((self.sign_res_path / "image" / "sign_bg").rglob("*.*"))
+
+    @cached_property
+    def shadow(self) -> Image.Image:
+        return Image.open(self.sign_res_path / "image" / "shadow.png").convert("RGBA")
+
+    @cached_property
+    def db(self) -> CardRecordDAO:
         return CardRecordDAO(self.db_path)
 
 
@@ -0,0 +1,150 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+import httpx
+from PIL import Image, ImageFilter, ImageOps
+
+from ...config import pcr_config
+from ...logger import PCRLogger
+from ..metrics_service import metrics_service
+
+logger = PCRLogger("PCR_SIGN")
+
+SIZE = (928, 1133)
+"""签到卡片尺寸"""
+
+
+def process_background(data: bytes) -> Image.Image:
+    """
+    将下载的图片居中裁剪为签到卡片尺寸并模糊。
+    """
+    with Image.open(BytesIO(data)) as img:
+        bg = ImageOps.fit(img.convert("RGBA"), SIZE)
+    return bg.filter(ImageFilter.GaussianBlur(8))
+
+
+class BackgroundPool:
+    """
+    签到网络背景池。
+
+    后台预先下载、裁剪并模糊若干张背景, 同时保存在内存与磁盘中, 重启后仍可使用。
+    签到时直接取出一张并在后台补充, 池为空时由调用方改用本地背景。
+    """
+
+    api: str = pcr_config.pcr_sign_bg_api
+    """随机图片接口, 返回 {"pic": [图片地址]}"""
+    depth: int = pcr_config.pcr_sign_bg_pool
+    """预生成的背景数"""
+    retry_interval: float = 60
+    """下载失败后再次尝试的间隔(秒)"""
+    headers = {"Referer": "http://www.weibo.com/"}
+
+    def __init__(
+        self, path: Path, transport: Optional[httpx.AsyncBaseTransport] = None
+    ) -> None:
+        self.path = path
+        """背景保存路径"""
+        self.transport = transport
+        """下载使用的传输层, 为None时使用默认连接"""
+        self.backgrounds: deque[tuple[Path, Image.Image]] = deque()
+        self.task: Optional[asyncio.Task] = None
+        self.retry_at = 0.0
+        """在此之前(time.monotonic)不再尝试下载"""
+
+    def __len__(self) -> int:
+        return len(self.backgrounds)
+
+    def load(self) -> list[tuple[Path, Image.Image]]:
+        """
+        读取上次保存在磁盘上的背景, 损坏的文件直接删除。
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        backgrounds = []
+        for file in sorted(self.path.glob("*.png"), key=lambda f: f.stat().st_mtime):
+            try:
+                with Image.open(file) as img:
+                    bg = img.convert("RGBA")
+            except Exception as e:
+                logger.warning(f"签到背景 {file.name} 读取失败: {e}")
+                file.unlink(missing_ok=True)
+                continue
+            if bg.size != SIZE:
+                file.unlink(missing_ok=True)
+                continue
+            backgrounds.append((file, bg))
+        return backgrounds
+
+    def save(self, bg: Image.Image) -> Path:
+        self.path.mkdir(parents=True, exist_ok=True)
+        file = self.path / f"{uuid.uuid4().hex}.png"
+        tmp = file.with_suffix(".tmp")
+        bg.save(tmp, format="png", compress_level=1)
+        tmp.replace(file)
+        return file
+
+    async def fetch(self, client: httpx.AsyncClient) -> bytes:
+        """
+        从随机图片接口下载一张图片。
+        """
+        with metrics_service.upstream("sign_background"):
+            response = await client.get(self.api, headers=self.headers)
+            response.raise_for_status()
+            pic_url = response.json()["pic"][0]
+            response = await client.get(pic_url, headers=self.headers)
+            response.raise_for_status()
+        return response.content
+
+    async def produce(self) -> None:
+        """
+        下载并处理背景直至池满, 失败时等待 retry_interval 后才再次尝试。
+        """
+        async with httpx.AsyncClient(
+            timeout=10, follow_redirects=True, transport=self.transport
+        ) as client:
+            while len(self.backgrounds) < self.depth:
+                try:
+                    data = await self.fetch(client)
+                    bg = await asyncio.to_thread(process_background, data)
+                    file = await asyncio.to_thread(self.save, bg)
+                except Exception as e:
+                    logger.warning(f"预生成签到背景失败: {e}")
+                    self.retry_at = time.monotonic() + self.retry_interval
+                    return
+                self.backgrounds.append((file, bg))
+        logger.debug(f"签到背景池已补充至 {len(self.backgrounds)} 张")
+
+    async def start(self) -> None:
+        """
+        读取磁盘上的背景并开始补充。
+        """
+        backgrounds = await asyncio.to_thread(self.load)
+        # 读取期间可能已有背景被补充进来
+        self.backgrounds.extendleft(reversed(backgrounds))
+        self.refill()
+
+    def refill(self) -> None:
+        """
+        在后台补充背景。
+        """
+        if self.task is not None and not self.task.done():
+            return
+        if len(self.backgrounds) >= self.depth or time.monotonic() < self.retry_at:
+            return
+        self.task = asyncio.create_task(self.produce())
+
+    def take(self) -> Optional[Image.Image]:
+        """
+        取出一张背景, 池为空时返回None。
+        """
+        bg = None
+        if self.backgrounds:
+            file, bg = self.backgrounds.popleft()
+            file.unlink(missing_ok=True)
+        metrics_service.cache("sign_background", bg is not None)
+        self.refill()
+        return bg
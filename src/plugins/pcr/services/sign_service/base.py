@@ -1,9 +1,63 @@
 import sqlite3
-from collections import Counter
 from pathlib import Path
 
+import numpy as np
+
+
+def card_bit(bits: bytes | None, cid: int) -> bytes:
+    """
+    将收集位图中第 cid 位置为1, 位图按小端序存放, 长度只增不减。
+    """
+    value = int.from_bytes(bits or b"", "little") | (1 << cid)
+    return value.to_bytes(max(len(bits or b""), cid // 8 + 1), "little")
+
+
+def card_union(a: bytes | None, b: bytes | None) -> bytes:
+    """
+    合并两个收集位图。
+    """
+    value = int.from_bytes(a or b"", "little") | int.from_bytes(b or b"", "little")
+    return value.to_bytes(max(len(a or b""), len(b or b"")), "little")
+
+
+def card_count(bits: bytes | None) -> int:
+    """
+    收集位图中为1的位数。
+    """
+    return int.from_bytes(bits or b"", "little").bit_count()
+
+
+class CardSet:
+    """一名用户收集到的印章"""
+
+    def __init__(self, bits: bytes = b"") -> None:
+        self.bits = bits
+        """小端序位图, 第 cid 位为1表示已收集"""
+
+    def __contains__(self, cid: int) -> bool:
+        return cid // 8 < len(self.bits) and bool(self.bits[cid // 8] >> cid % 8 & 1)
+
+    def __len__(self) -> int:
+        return card_count(self.bits)
+
+    def mask(self, cids: np.ndarray) -> np.ndarray:
+        """
+        按顺序返回各印章是否已收集。
+        """
+        flags = np.unpackbits(
+            np.frombuffer(self.bits, dtype=np.uint8), bitorder="little"
+        )
+        owned = np.zeros(len(cids), dtype=bool)
+        inside = cids < len(flags)
+        owned[inside] = flags[cids[inside]].astype(bool)
+        return owned
+
 
 class CardRecordDAO:
+    """
+    印章收集记录, 每个 (gid, uid) 一行, 以位图保存收集到的印章并缓存数量。
+    """
+
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
@@ -11,41 +65,97 @@ class CardRecordDAO:
         self._create_table()
 
     def connect(self):
-        return sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path)
+        conn.create_function("card_bit", 2, card_bit, deterministic=True)
+        conn.create_function("card_union", 2, card_union, deterministic=True)
+        conn.create_function("card_count", 1, card_count, deterministic=True)
+        return conn
 
     def _create_table(self):
         with self.connect() as conn:
             conn.execute(
-                "CREATE TABLE IF NOT EXISTS card_record"
-                "(gid TEXT NOT NULL, uid TEXT NOT NULL, cid INT NOT NULL, num INT NOT NULL, PRIMARY KEY(gid, uid, cid))"
+                "CREATE TABLE IF NOT EXISTS card_bitmap"
+                "(gid TEXT NOT NULL, uid TEXT NOT NULL, bits BLOB NOT NULL,"
+                " num INT NOT NULL, PRIMARY KEY(gid, uid))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS card_bitmap_rank ON card_bitmap (gid, num)"
+            )
+        self._migrate()
+
+    def _migrate(self):
+        """
+        将旧版每张印章一行的 card_record 表转换为位图后删除。
+        """
+        with self.connect() as conn:
+            legacy = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='card_record'"
+            ).fetchone()
+            if not legacy:
+                return
+            bitmaps: dict[tuple[str, str], bytes] = {}
+            for gid, uid, cid in conn.execute(
+                "SELECT gid, uid, cid FROM card_record WHERE num>0"
+            ):
+                bitmaps[(gid, uid)] = card_bit(bitmaps.get((gid, uid)), cid)
+            conn.executemany(
+                "INSERT INTO card_bitmap (gid, uid, bits, num) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(gid, uid) DO UPDATE SET"
+                " bits=card_union(bits, excluded.bits),"
+                " num=card_count(card_union(bits, excluded.bits))",
+                [
+                    (gid, uid, bits, card_count(bits))
+                    for (gid, uid), bits in bitmaps.items()
+                ],
             )
+            conn.execute("DROP TABLE card_record")
+        with self.connect() as conn:
+            conn.execute("VACUUM")
 
-    def add_card_num(self, gid: str, uid: str, cid: int) -> int:
-        num = 1
+    def add_card(self, gid: str, uid: str, cid: int) -> int:
+        """
+        记录收集到的印章, 返回该用户已收集的数量。
+        """
         with self.connect() as conn:
+            # 单条语句完成位或与计数, 并发签到不会丢失记录
             conn.execute(
-                "INSERT OR REPLACE INTO card_record (gid, uid, cid, num) VALUES (?, ?, ?, ?)",
-                (gid, uid, cid, num),
+                "INSERT INTO card_bitmap (gid, uid, bits, num)"
+                " VALUES (?1, ?2, card_bit(NULL, ?3), 1)"
+                " ON CONFLICT(gid, uid) DO UPDATE SET"
+                " bits=card_bit(bits, ?3), num=card_count(card_bit(bits, ?3))",
+                (gid, uid, cid),
             )
-        return num
+            r = conn.execute(
+                "SELECT num FROM card_bitmap WHERE gid=? AND uid=?", (gid, uid)
+            ).fetchone()
+        return r[0]
+
+    def get_cards(self, gid: str, uid: str) -> CardSet:
+        with self.connect() as conn:
+            r = conn.execute(
+                "SELECT bits FROM card_bitmap WHERE gid=? AND uid=?", (gid, uid)
+            ).fetchone()
+        return CardSet(r[0] if r else b"")
 
-    def get_cards_num(self, gid: str, uid: str) -> list:
+    def get_cards_count(self, gid: str, uid: str) -> int:
         with self.connect() as conn:
             r = conn.execute(
-                "SELECT cid, num FROM card_record WHERE gid=? AND uid=? AND num>0",
-                (gid, uid),
-            ).fetchall()
-        return [c[0] for c in r] if r else []
+                "SELECT num FROM card_bitmap WHERE gid=? AND uid=?", (gid, uid)
+            ).fetchone()
+        return r[0] if r else 0
 
     def get_group_ranking(self, gid, uid):
+        """
+        按收集数量在群内的排名, 未收集过时返回-1。
+        """
         with self.connect() as conn:
             r = conn.execute(
-                "SELECT uid FROM card_record WHERE gid=? AND num>0", (gid,)
-            ).fetchall()
-        if not r:
-            return -1
-        cards_num = Counter([s[0] for s in r])
-        if uid not in cards_num:
-            return -1
-        user_card_num = cards_num[uid]
-        return sum(n > user_card_num for n in cards_num.values()) + 1
+                "SELECT num FROM card_bitmap WHERE gid=? AND uid=?", (gid, uid)
+            ).fetchone()
+            if not r or r[0] <= 0:
+                return -1
+            # 走 (gid, num) 索引, 无需读取群内全部记录
+            (above,) = conn.execute(
+                "SELECT COUNT(*) FROM card_bitmap WHERE gid=? AND num>?", (gid, r[0])
+            ).fetchone()
+        return above + 1
@@ -0,0 +1,338 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Literal, NamedTuple, Optional, Union
+
+from ..config import pcr_config
+from ..logger import PCRLogger
+
+pcr_res_path: Path = pcr_config.pcr_resources_path
+"""PCR资源存放路径"""
+pcr_data_path: Path = pcr_config.pcr_data_path
+"""PCR数据存放路径"""
+
+logger = PCRLogger("PCR_WATCH")
+
+ChangeKind = Literal["added", "modified", "deleted", "rescan"]
+
+
+class ChangeEvent(NamedTuple):
+    """文件变化事件"""
+
+    kind: ChangeKind
+    """变化类型, rescan 表示事件丢失, 订阅目录下的全部缓存都应失效"""
+    path: Path
+    """发生变化的文件, rescan 时为订阅的目录"""
+
+
+ChangeCallback = Callable[[list[ChangeEvent]], Union[Awaitable[Any], Any]]
+
+IGNORED_SUFFIXES = (
+    ".db",
+    ".db-journal",
+    ".db-wal",
+    ".db-shm",
+    ".tmp",
+    ".npy",
+    ".bin",
+    ".pack",
+    ".idx",
+)
+"""本插件自身频繁写入的数据库、临时文件、索引与资源包, 不产生事件"""
+
+# inotify 常量, 见 <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+)
+EVENT = struct.Struct("iIII")
+"""inotify_event 头: wd, mask, cookie, len"""
+
+
+def is_ignored(path: Path) -> bool:
+    return path.name.startswith(".") or path.name.endswith(IGNORED_SUFFIXES)
+
+
+def merge_kind(old: Optional[ChangeKind], new: ChangeKind) -> Optional[ChangeKind]:
+    """
+    合并同一文件在一次派发前的多次变化, 返回None表示相互抵消。
+    """
+    if old is None:
+        return new
+    if old == "added":
+        return None if new == "deleted" else "added"
+    if old == "deleted" and new == "added":
+        return "modified"
+    return new
+
+
+class InotifyBackend:
+    """基于 inotify 的监听, 仅支持 Linux, 子目录逐个添加监听"""
+
+    def __init__(self, emit: Callable[[ChangeKind, Path], None]) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.libc = libc
+        self.emit = emit
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.watches: dict[int, Path] = {}
+        """监听描述符 -> 目录"""
+
+    @staticmethod
+    def available() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        name = ctypes.util.find_library("c")
+        return name is not None and hasattr(ctypes.CDLL(name), "inotify_init1")
+
+    def add_tree(self, root: Path, report: bool = False) -> None:
+        """
+        监听目录及其全部子目录。
+
+        参数:
+            report: 是否为已存在的文件产生 added 事件, 用于监听建立前就写入的新目录
+        """
+        for dirpath, dirnames, filenames in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                logger.warning(f"无法监听 {dirpath}: {os.strerror(ctypes.get_errno())}")
+                dirnames.clear()
+                continue
+            self.watches[wd] = Path(dirpath)
+            if report:
+                for filename in filenames:
+                    self.emit("added", Path(dirpath) / filename)
+
+    def start(self, roots: list[Path]) -> None:
+        for root in roots:
+            self.add_tree(root)
+        asyncio.get_running_loop().add_reader(self.fd, self.read)
+
+    def stop(self) -> None:
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
+        self.watches.clear()
+
+    def read(self) -> None:
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + EVENT.size <= len(buf):
+            wd, mask, _, length = EVENT.unpack_from(buf, offset)
+            raw = buf[offset + EVENT.size : offset + EVENT.size + length]
+            offset += EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify 事件队列溢出, 全部订阅将重新加载")
+                # 空路径表示全部目录
+                self.emit("rescan", Path())
+                continue
+            base = self.watches.get(wd)
+            if base is None:
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                self.watches.pop(wd, None)
+                continue
+            path = base / os.fsdecode(raw.rstrip(b"\0"))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path, report=True)
+                elif mask & IN_MOVED_FROM:
+                    self.emit("rescan", path)
+                continue
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self.emit("added", path)
+            elif mask & IN_CLOSE_WRITE:
+                self.emit("modified", path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self.emit("deleted", path)
+
+
+class PollingBackend:
+    """定期比较文件的修改时间与大小, 不支持 inotify 时使用"""
+
+    def __init__(self, emit: Callable[[ChangeKind, Path], None], interval: float):
+        self.emit = emit
+        self.interval = interval
+        self.roots: list[Path] = []
+        self.snapshot: dict[Path, tuple[int, int]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def scan(self) -> dict[Path, tuple[int, int]]:
+        result = {}
+        for root in self.roots:
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    path = Path(dirpath) / filename
+                    try:
+                        stat = path.stat()
+                    except OSError:
+                        continue
+                    result[path] = (stat.st_mtime_ns, stat.st_size)
+        return result
+
+    def start(self, roots: list[Path]) -> None:
+        self.roots = roots
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self) -> None:
+        self.snapshot = await asyncio.to_thread(self.scan)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                current = await asyncio.to_thread(self.scan)
+            except Exception as e:
+                logger.error(f"扫描文件变化失败: {e}")
+                continue
+            for path, stat in current.items():
+                old = self.snapshot.get(path)
+                if old is None:
+                    self.emit("added", path)
+                elif old != stat:
+                    self.emit("modified", path)
+            for path in self.snapshot.keys() - current.keys():
+                self.emit("deleted", path)
+            self.snapshot = current
+
+
+class WatchService:
+    """文件监听服务
+
+    监听资源与数据目录, 将文件的增删改合并后按目录派发给订阅者,
+    各服务据此只让受影响的缓存失效, 更新资源后无需重启。
+    Linux 下使用 inotify, 其他平台或 inotify 不可用时退回定期扫描。
+    """
+
+    roots: tuple[Path, ...] = (pcr_res_path, pcr_data_path)
+    """监听的根目录"""
+    backend_name: str = pcr_config.pcr_watch_backend
+    """监听方式"""
+    poll_interval: float = pcr_config.pcr_watch_poll_interval
+    """定期扫描的间隔(秒)"""
+    debounce: float = 0.5
+    """收到事件后等待的时间(秒), 期间的变化合并为一次派发"""
+
+    def __init__(self) -> None:
+        self.subscribers: list[tuple[Path, ChangeCallback]] = []
+        self.pending: dict[Path, ChangeKind] = {}
+        """等待派发的变化"""
+        self.backend: Union[InotifyBackend, PollingBackend, None] = None
+        self.flush_task: Optional[asyncio.Task] = None
+
+    def subscribe(self, path: Path, callback: ChangeCallback) -> None:
+        """
+        订阅目录或文件的变化, 回调以该路径下的变化列表调用, 可以是协程函数。
+        """
+        self.subscribers.append((Path(path), callback))
+
+    def unsubscribe(self, callback: ChangeCallback) -> None:
+        self.subscribers = [s for s in self.subscribers if s[1] != callback]
+
+    def emit(self, kind: ChangeKind, path: Path) -> None:
+        """
+        记录一次变化, 稍后统一派发。
+        """
+        if kind != "rescan" and is_ignored(path):
+            return
+        merged = merge_kind(self.pending.get(path), kind)
+        if merged is None:
+            self.pending.pop(path, None)
+        else:
+            self.pending[path] = merged
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> None:
+        # 回调期间到达的变化只记录在 pending 中, 派发完后继续处理直到没有新的变化
+        while self.pending:
+            await asyncio.sleep(self.debounce)
+            events = [ChangeEvent(kind, path) for path, kind in self.pending.items()]
+            self.pending.clear()
+            await self.dispatch(events)
+
+    async def dispatch(self, events: list[ChangeEvent]) -> None:
+        """
+        将一批变化派发给订阅者。
+        """
+        for path, callback in list(self.subscribers):
+            matched = self.match(path, events)
+            if not matched:
+                continue
+            try:
+                result = callback(matched)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"处理 {path} 的文件变化失败: {e}")
+
+    @staticmethod
+    def match(path: Path, events: list[ChangeEvent]) -> list[ChangeEvent]:
+        """
+        筛选订阅路径下的变化, 覆盖订阅路径的 rescan 转换为该路径的 rescan。
+        """
+        matched = []
+        for event in events:
+            if event.kind == "rescan":
+                if event.path == Path() or event.path in (path, *path.parents):
+                    return [ChangeEvent("rescan", path)]
+                if path in event.path.parents:
+                    matched.append(event)
+            elif event.path == path or path in event.path.parents:
+                matched.append(event)
+        return matched
+
+    def start(self) -> None:
+        """
+        开始监听, 需在事件循环中调用。
+        """
+        if self.backend is not None or self.backend_name == "off":
+            return
+        roots = [root for root in self.roots if root.exists()]
+        if self.backend_name in ("auto", "inotify") and InotifyBackend.available():
+            try:
+                backend = InotifyBackend(self.emit)
+                backend.start(roots)
+                self.backend = backend
+                logger.info(f"使用 inotify 监听 {len(backend.watches)} 个目录")
+                return
+            except OSError as e:
+                logger.warning(f"inotify 不可用, 改为定期扫描: {e}")
+        backend = PollingBackend(self.emit, self.poll_interval)
+        backend.start(roots)
+        self.backend = backend
+        logger.info(f"每 {self.poll_interval} 秒扫描一次文件变化")
+
+    def stop(self) -> None:
+        if self.backend is not None:
+            self.backend.stop()
+            self.backend = None
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+
+
+watch_service = WatchService()
@@ -0,0 +1,130 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from types import CodeType
+from typing import Optional
+
+from ..config import pcr_config
+from ..logger import PCRLogger
+from .metrics_service import metrics_service
+from .profiler_service import attribute, stack_labels
+
+logger = PCRLogger("PCR_WATCHDOG")
+
+
+@dataclass
+class Stall:
+    """一次事件循环阻塞"""
+
+    matcher: Optional[str]
+    """阻塞时所在的PCR指令函数"""
+    service: Optional[str]
+    """阻塞时所在的PCR服务方法"""
+    stack: str
+    """阻塞时事件循环线程的调用栈"""
+
+
+class WatchdogService:
+    """事件循环看门狗
+
+    事件循环中的任务定时记录心跳并统计调度延迟,
+    另一个线程检查心跳, 心跳超过阈值未更新时读取事件循环线程的调用栈,
+    待事件循环恢复后记录阻塞时长与所在的指令和服务方法。
+    """
+
+    enabled: bool = pcr_config.pcr_loop_watchdog
+    """是否启用"""
+    threshold: float = pcr_config.pcr_loop_lag_threshold
+    """判定为阻塞的时长(秒)"""
+    interval: float = 0.05
+    """心跳间隔(秒)"""
+
+    def __init__(self) -> None:
+        self.heartbeat = time.monotonic()
+        self.loop_thread: Optional[int] = None
+        self.stall: Optional[Stall] = None
+        """检查线程发现、尚未记录的阻塞"""
+        self.task: Optional[asyncio.Task] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+        self.labels: dict[CodeType, str] = {}
+
+    def capture(self) -> Optional[Stall]:
+        """
+        读取事件循环线程当前的调用栈。
+        """
+        frame = sys._current_frames().get(self.loop_thread)  # type: ignore
+        if frame is None:
+            return None
+        matcher, service = attribute(stack_labels(frame, self.labels))
+        stack = "".join(traceback.format_list(traceback.extract_stack(frame)[-8:]))
+        return Stall(matcher, service, stack)
+
+    def check(self) -> None:
+        """
+        检查线程, 每次阻塞只读取一次调用栈。
+        """
+        while not self.stopped.wait(self.interval):
+            if self.stall is not None:
+                continue
+            # 心跳间隔本身不计入延迟
+            if time.monotonic() - self.heartbeat > self.threshold + self.interval:
+                self.stall = self.capture()
+
+    def report(self, lag: float) -> None:
+        stall, self.stall = self.stall, None
+        if stall is None:
+            # 阻塞发生在两次检查之间, 未能取得调用栈
+            stall = Stall(None, None, "")
+        metrics_service.inc(
+            "pcr_loop_stalls_total",
+            matcher=stall.matcher or "-",
+            service=stall.service or "-",
+        )
+        logger.warning(
+            f"事件循环阻塞 {lag * 1000:.0f}ms"
+            f" 指令: {stall.matcher or '-'} 服务: {stall.service or '-'}"
+            + (f"\n{stall.stack.rstrip()}" if stall.stack else "")
+        )
+
+    async def beat(self) -> None:
+        while True:
+            start = time.monotonic()
+            self.heartbeat = start
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - start - self.interval, 0)
+            self.heartbeat = now
+            metrics_service.observe("pcr_loop_lag_seconds", lag)
+            if lag > self.threshold:
+                self.report(lag)
+
+    def start(self) -> None:
+        """
+        在事件循环中启动, 重复调用无效。
+        """
+        if not self.enabled or self.task is not None:
+            return
+        self.loop_thread = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stopped.clear()
+        self.task = asyncio.create_task(self.beat())
+        self.thread = threading.Thread(
+            target=self.check, name="pcr-watchdog", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+
+
+watchdog_service = WatchdogService()
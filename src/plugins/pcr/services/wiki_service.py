@@ -1,11 +1,11 @@
 import asyncio
-import hashlib
-from io import BytesIO
-from typing import Optional
+from typing import Literal, Optional
 import json
 from ..models import Chara
 from .data_service import chara_data as chara
 from .data_service import pcr_data as pcr
+from .manifest_service import manifest_service
+from .pack_service import pack_service
 
 
 class WikiService:
@@ -27,26 +27,49 @@ class WikiService:
 
     async def get_chara_icon(self, name: str) -> list:
         """获取指定角色的头像"""
-        icon_list = []
         id_ = chara.name2id(name=name)
+        stars = await self.distinct_stars("icon", id_, (1, 3, 6))
+        if not stars:
+            return [await chara.get_chara_icon(id=id_)]
         res = await asyncio.gather(
-            chara.get_chara_icon(id=id_, star=1),
-            chara.get_chara_icon(id=id_, star=3),
-            chara.get_chara_icon(id=id_, star=6),
+            *(chara.get_chara_icon(id=id_, star=star) for star in stars)
         )
-        icon_list = self.dedupe_images(list(res))
-        return icon_list
+        return list(res)
 
     async def get_chara_card(self, name: str) -> list:
         """获取指定角色的卡面"""
-        card_list = []
         id_ = chara.name2id(name=name)
+        stars = await self.distinct_stars("card", id_, (3, 6))
         res = await asyncio.gather(
-            chara.get_chara_card(id=id_, star=3),
-            chara.get_chara_card(id=id_, star=6),
+            *(
+                chara.get_chara_card(id=id_, star=star, variant="chat")
+                for star in stars or (3,)
+            )
+        )
+        return list(res)
+
+    @staticmethod
+    async def distinct_stars(
+        type_: Literal["card", "icon"], id_: str, stars: tuple[int, ...]
+    ) -> list[int]:
+        """
+        确保各星级原图已下载, 再从资源清单中取出画面互不相同的星级。
+        """
+        await asyncio.gather(
+            *(
+                chara.download_chara_img(id=id_, star=star, type_=type_)
+                for star in stars
+            )
         )
-        card_list = self.dedupe_images(list(res))
-        return card_list
+        for star in stars:
+            name = chara.original_name(type_, id_, star)
+            if name is None or manifest_service.get(type_, id_, star) is not None:
+                continue
+            # 清单补全之前保存的原图
+            data = pack_service.read(type_, name)
+            if data is not None:
+                await asyncio.to_thread(manifest_service.add, name, data)
+        return manifest_service.distinct_stars(type_, id_, stars)
 
     async def get_chara_profile(self, id_: str) -> str:
         """获取指定角色的档案"""
@@ -59,26 +82,3 @@ class WikiService:
             .replace("}", "")
             .replace(",", "\n")
         )
-
-    def dedupe_images(self, images: list[BytesIO]) -> list[BytesIO]:
-        """
-        去重图片列表
-        """
-        # 创建一个空的集合
-        seen = set()
-        # 创建一个新的列表，用于存储不重复的图片
-        deduped_images = []
-        # 遍历原始列表
-        for image in images:
-            # 使用哈希函数计算图片的哈希值
-            image_hash = hashlib.md5(image.getbuffer()).hexdigest()
-            # 如果哈希值不在集合中，则将图片添加到集合中并将其添加到新列表中
-            if image_hash not in seen:
-                seen.add(image_hash)
-                deduped_images.append(image)
-        return deduped_images
-
-    def get_image_hash(self, image_bytes):
-        hash_object = hashlib.md5()
-        hash_object.update(image_bytes.getbuffer())
-        return hash_object.hexdigest()
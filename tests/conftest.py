@@ -0,0 +1,31 @@
+"""
+测试环境。
+
+与基准测试相同, 不启动机器人, 只初始化 nonebot 配置并以独立包的形式导入 PCR 的服务模块,
+数据与资源目录指向临时目录, 不会改动仓库中的文件。
+"""
+
+import shutil
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import nonebot
+
+PCR_PATH = Path(__file__).resolve().parent.parent / "src" / "plugins" / "pcr"
+
+
+def pytest_configure(config):
+    workdir = Path(tempfile.mkdtemp(prefix="pcr_test_"))
+    for name in ("priconne/gadget", "sign"):
+        shutil.copytree(PCR_PATH / "resources" / name, workdir / "resources" / name)
+    nonebot.init(
+        driver="~none",
+        pcr_data_path=workdir / "data",
+        pcr_resources_path=workdir / "resources",
+    )
+    # 跳过 pcr/__init__.py 中的插件加载, 只暴露包路径
+    pkg = types.ModuleType("pcr")
+    pkg.__path__ = [str(PCR_PATH)]  # type: ignore
+    sys.modules["pcr"] = pkg
@@ -0,0 +1,108 @@
+import time
+from io import BytesIO
+from pathlib import Path
+
+import httpx
+import pytest
+from PIL import Image
+
+from pcr.services.sign_service.background import SIZE, BackgroundPool
+
+PIC_URL = "https://example.com/bg.jpg"
+
+
+def jpeg() -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (1280, 720), (200, 120, 40)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def upstream(status: int = 200) -> httpx.MockTransport:
+    """
+    随机图片接口与图片地址, status 不为200时两者都返回该状态码。
+    """
+    data = jpeg()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if status != 200:
+            return httpx.Response(status)
+        if str(request.url) == PIC_URL:
+            return httpx.Response(200, content=data)
+        return httpx.Response(200, json={"pic": [PIC_URL]})
+
+    return httpx.MockTransport(handler)
+
+
+def make_pool(path: Path, depth: int, status: int = 200) -> BackgroundPool:
+    pool = BackgroundPool(path, transport=upstream(status))
+    pool.depth = depth
+    return pool
+
+
+async def test_produce_fills_to_depth(tmp_path: Path):
+    pool = make_pool(tmp_path, 3)
+    await pool.produce()
+    assert len(pool) == 3
+    assert len(list(tmp_path.glob("*.png"))) == 3
+    assert all(bg.size == SIZE for _, bg in pool.backgrounds)
+
+
+async def test_take(tmp_path: Path):
+    pool = make_pool(tmp_path, 2)
+    await pool.produce()
+    file, _ = pool.backgrounds[0]
+    bg = pool.take()
+    assert bg is not None and bg.size == SIZE
+    assert not file.exists()
+    # 取出后在后台补充
+    assert pool.task is not None
+    await pool.task
+    assert len(pool) == 2
+
+
+async def test_take_empty(tmp_path: Path):
+    pool = make_pool(tmp_path, 2)
+    assert pool.take() is None
+    assert pool.task is not None
+    await pool.task
+    assert len(pool) == 2
+
+
+async def test_retry_after_failure(tmp_path: Path):
+    pool = make_pool(tmp_path, 2, status=500)
+    before = time.monotonic()
+    await pool.produce()
+    assert len(pool) == 0
+    assert pool.retry_at >= before + pool.retry_interval
+    # 等待期间不再尝试下载
+    task = pool.task
+    assert pool.take() is None
+    assert pool.task is task
+    pool.retry_at = 0
+    pool.transport = upstream()
+    pool.refill()
+    assert pool.task is not None
+    await pool.task
+    assert len(pool) == 2
+
+
+async def test_start_reloads_from_disk(tmp_path: Path):
+    await make_pool(tmp_path, 2).produce()
+    (tmp_path / "broken.png").write_bytes(b"not a png")
+    Image.new("RGBA", (64, 64)).save(tmp_path / "small.png")
+    pool = make_pool(tmp_path, 2, status=500)
+    await pool.start()
+    assert len(pool) == 2
+    assert all(bg.size == SIZE for _, bg in pool.backgrounds)
+    # 损坏或尺寸不符的文件被删除, 池已满时不再下载
+    assert sorted(tmp_path.glob("*.png")) == sorted(f for f, _ in pool.backgrounds)
+    assert pool.task is None
+
+
+@pytest.mark.parametrize("depth", [0, 1])
+async def test_start_without_saved(tmp_path: Path, depth: int):
+    pool = make_pool(tmp_path / "empty", depth)
+    await pool.start()
+    if pool.task is not None:
+        await pool.task
+    assert len(pool) == depth
@@ -0,0 +1,113 @@
+import random
+import shutil
+import sqlite3
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from pcr.services.sign_service.base import CardRecordDAO
+
+GROUPS = ("g1", "g2")
+USERS = tuple(f"u{i}" for i in range(12))
+
+
+def legacy_cards(conn: sqlite3.Connection, gid: str, uid: str) -> set[int]:
+    """旧版 get_cards_num"""
+    r = conn.execute(
+        "SELECT cid, num FROM card_record WHERE gid=? AND uid=? AND num>0",
+        (gid, uid),
+    ).fetchall()
+    return {c[0] for c in r}
+
+
+def legacy_ranking(conn: sqlite3.Connection, gid: str, uid: str) -> int:
+    """旧版 get_group_ranking"""
+    r = conn.execute(
+        "SELECT uid FROM card_record WHERE gid=? AND num>0", (gid,)
+    ).fetchall()
+    cards_num = Counter([s[0] for s in r])
+    if uid not in cards_num:
+        return -1
+    return sum(n > cards_num[uid] for n in cards_num.values()) + 1
+
+
+def add_legacy(conn: sqlite3.Connection, gid: str, uid: str, cid: int, num=1):
+    conn.execute(
+        "INSERT OR REPLACE INTO card_record (gid, uid, cid, num) VALUES (?, ?, ?, ?)",
+        (gid, uid, cid, num),
+    )
+
+
+@pytest.fixture
+def migrated(tmp_path: Path):
+    """
+    旧版数据库迁移后的 DAO, 以及加入同样记录的旧版数据库副本。
+    """
+    db_path = tmp_path / "card.db"
+    rng = random.Random(47)
+    # 迁移前已有位图记录的用户, 迁移时应与旧表合并
+    dao = CardRecordDAO(db_path)
+    extra = [("g1", "u0", 7), ("g1", "u0", 300), ("g2", "u11", 1)]
+    for gid, uid, cid in extra:
+        dao.add_card(gid, uid, cid)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE card_record"
+            "(gid TEXT NOT NULL, uid TEXT NOT NULL, cid INT NOT NULL,"
+            " num INT NOT NULL, PRIMARY KEY(gid, uid, cid))"
+        )
+        for gid in GROUPS:
+            # u10 只有 num=0 的记录, 视为未收集
+            add_legacy(conn, gid, "u10", 3, num=0)
+            for uid in USERS[:10]:
+                for cid in rng.sample(range(400), rng.randint(1, 40)):
+                    add_legacy(conn, gid, uid, cid)
+    legacy_path = tmp_path / "legacy.db"
+    shutil.copy(db_path, legacy_path)
+    legacy = sqlite3.connect(legacy_path)
+    for gid, uid, cid in extra:
+        add_legacy(legacy, gid, uid, cid)
+    yield CardRecordDAO(db_path), legacy
+    legacy.close()
+
+
+def test_migration_drops_legacy_table(migrated):
+    dao, _ = migrated
+    with dao.connect() as conn:
+        tables = {
+            r[0]
+            for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        }
+    assert "card_record" not in tables
+
+
+@pytest.mark.parametrize("gid", GROUPS)
+def test_matches_legacy_queries(migrated, gid):
+    dao, legacy = migrated
+    for uid in USERS:
+        expected = legacy_cards(legacy, gid, uid)
+        cards = dao.get_cards(gid, uid)
+        assert {cid for cid in range(512) if cid in cards} == expected
+        assert len(cards) == len(expected)
+        assert dao.get_cards_count(gid, uid) == len(expected)
+        assert dao.get_group_ranking(gid, uid) == legacy_ranking(legacy, gid, uid)
+
+
+def test_add_card_after_migration(migrated):
+    dao, legacy = migrated
+    owned = legacy_cards(legacy, "g1", "u1")
+    old = next(iter(owned))
+    new = next(cid for cid in range(1000) if cid not in owned)
+    assert dao.add_card("g1", "u1", old) == len(owned)
+    assert dao.add_card("g1", "u1", new) == len(owned) + 1
+    add_legacy(legacy, "g1", "u1", new)
+    for uid in USERS:
+        assert dao.get_group_ranking("g1", uid) == legacy_ranking(legacy, "g1", uid)
+
+
+def test_unknown_user(migrated):
+    dao, _ = migrated
+    assert len(dao.get_cards("g3", "u0")) == 0
+    assert dao.get_cards_count("g3", "u0") == 0
+    assert dao.get_group_ranking("g3", "u0") == -1